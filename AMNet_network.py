@@ -8,8 +8,20 @@ Load Hg0 observation data from AMNet dataset
 #%% Import packagres
 import numpy as np
 import pandas as pd
+import time
+from timezone_utc import get_time_utc
+from time_window import select_window
+from instrument_merge import merge_instrument_frames, resample_source
+from site_series import SiteSeries
+from qc_flags import get_valid_mask
+from spike_screen import screen_frame
+from climatology import ClimatologyCube
+from quicklook import QuickLook
+from compressed_io import find_any, read_csv_any
+from shard_batch import (get_shard_arg, select_shard, get_output_dir,
+                         get_file_key, report_entry, write_run_report)
 #%% Functions used for analysis
-def get_data_AMNet(df, station):
+def get_data_AMNet(df, station, start=None, end=None, screen=None, clim=None, quick=None):
     """return daily-averaged value for station
     
     Parameters
@@ -18,6 +30,16 @@ def get_data_AMNet(df, station):
          All AMNET data
     station : str
          Station code
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of hourly data (arguments of spike_screen.screen_spikes), None for no screening
+    clim : ClimatologyCube
+         Cube to add the hourly values to, for diurnal/seasonal climatologies (None for no climatology)
+    quick : QuickLook
+         Collector of the hourly values, for downsampled quick-look series (None for no quick-look)
     """
     # find data of station
     df_station = df[df['SiteID']==station].copy()
@@ -31,25 +53,52 @@ def get_data_AMNet(df, station):
         df_station =  pd.concat([df_station, df_station2]) 
     
     # Find where data is invalid
-    temp = ((df_station['GEMVal']=='B') | (df_station['GEMVal']=='A')) & (df_station['GEM'] >= 0) # these are valid flags
+    temp = get_valid_mask(df_station['GEMVal'], df_station['GEM'], 'AMNet') # flags A, B and GEM >= 0
     
     # filter data
     df_valid = df_station[temp].copy()
 
-    # load times
-    time_start = pd.to_datetime(df_valid['collStart'])
-    time_end = pd.to_datetime(df_valid['collEnd'])
+    # load times, converting to UTC if the file has local times with a time zone
+    if 'TimeZone' in df_valid.columns:
+        time_start = get_time_utc(df_valid, [], ['collStart'], 'TimeZone')
+        time_end = get_time_utc(df_valid, [], ['collEnd'], 'TimeZone')
+    else: # times already in UTC
+        time_start = pd.to_datetime(df_valid['collStart'])
+        time_end = pd.to_datetime(df_valid['collEnd'])
 
     # find midpoint time
     time_mid = ((time_end - time_start)/2 + time_start).values 
     df_valid['time_GEM'] = time_mid
     
-    # get only years from time_mid, so that can use cutoff
-    # resample daily averages
-    df_valid_d = df_valid.set_index('time_GEM').resample('D').mean().dropna()
+    # drop rows without UTC time (unknown time zone), counted in the run report
+    bool_utc = df_valid['time_GEM'].notna().values
+    n_no_utc = int((~bool_utc).sum())
     
-    # sort data by correct time
-    df_valid_d = df_valid_d.sort_index()
+    # select data within time window
+    df_valid = df_valid[bool_utc & select_window(df_valid['time_GEM'], start, end)]
+    
+    # merge instruments on one hourly time index, averaging hours measured by both
+    value_cols = list(df_valid.select_dtypes('number').columns)
+    df_valid = merge_instrument_frames(df_valid, 'time_GEM', 'SiteID', value_cols,
+                                       rule='mean', priority=[station], freq='h')
+
+    # remove spikes from hourly data
+    df_valid, n_spikes = screen_frame(df_valid, 'GEM', screen=screen)
+    
+    # keep only times and numeric data, as compact series for the hourly processing
+    series = SiteSeries.from_frame(df_valid, columns=value_cols)
+    
+    # add hourly data to climatology cube and quick-look, in the same pass
+    if clim is not None:
+        clim.add(series.times.astype('datetime64[ns]'), series.data['GEM'])
+    if quick is not None:
+        quick.add(series.times.astype('datetime64[ns]'), series.data['GEM'])
+
+    # resample daily averages, with instrument that measured most of each day
+    df_valid_d = series.resample('D').to_frame('time_GEM')
+    df_valid_d['SiteID'] = resample_source(df_valid['SiteID'])
+    df_valid_d.attrs['n_spikes'] = n_spikes
+    df_valid_d.attrs['n_no_utc'] = n_no_utc
         
     return df_valid_d
 
@@ -57,6 +106,10 @@ def get_data_AMNet(df, station):
 # file name
 fn_all= '../../obs_datasets/GEM/AMNET-ALL-h.csv' # change relative path to AMNet data
 do = '../misc_Data/' # directory for outputted daily mean files
+start, end = None, None # time window to load, e.g. '2010-01-01', '2016-01-01' (None for all data)
+screen = None # spike screening of hourly data, e.g. {'window': 25, 'n_mad': 5., 'max_rate': 2.} (None for no screening)
+clim_hourly = False # also save climatology cube of hourly data (hour x month x year) as <site>_clim.npz
+quicklook = False # also save downsampled quick-look series of hourly data (zoom levels) as <site>_quick.npz
 
 # Names of long-term sites in the AMNet network 
 site_names = ['Birmingham', 'Pensacola','Yorkville','Mauna Loa','Piney Reservoir',
@@ -68,12 +121,33 @@ site_names = ['Birmingham', 'Pensacola','Yorkville','Mauna Loa','Piney Reservoir
 site_codes = ['AL19','FL96','GA40', 'HI00','MD08','MD98','MS99','NJ30',
               'NY06','NY20','NY43','OH02','OH52','OK99','UT97','VT99','WI07',]
 # read file with all hourly data
-df_all = pd.read_csv(fn_all)
+df_all = read_csv_any(find_any(fn_all)) # also compressed
+
+# select sites of this job when running as a job array (--shard i/N)
+# all sites are in one file, so use the number of rows as size estimate
+shard = get_shard_arg()
+n_rows = df_all['SiteID'].value_counts()
+sizes = [int(n_rows.get(s, 0)) for s in site_codes]
+sites_shard = select_shard('AMNet', site_codes, sizes, shard)
+do_shard = get_output_dir(do, shard)
+report = []
 for i in range(len(site_names)):
+    if site_codes[i] not in sites_shard: # processed by another job
+        continue
+    key = get_file_key('AMNet', site_codes[i]) # output file name, with network if code is shared
+    t_start = time.time()
     print("Loading site: " + site_names[i])
+    clim = ClimatologyCube() if clim_hourly else None
+    quick = QuickLook() if quicklook else None
     # get data from sites at daily time resolution
-    df = get_data_AMNet(df_all, site_codes[i])
+    df = get_data_AMNet(df_all, site_codes[i], start, end, screen, clim, quick)
     # output csv of daily averages
-    fo = do + site_codes[i] + '_d.csv'
+    fo = do_shard + key + '_d.csv'
     df.to_csv(fo)
+    if clim is not None:
+        clim.save(do_shard + key + '_clim.npz')
+    if quick is not None:
+        quick.save(do_shard + key + '_quick.npz')
+    report.append(report_entry(site_codes[i], fo, df, sizes[i], t_start))
+write_run_report(do_shard, 'AMNet', report)
     
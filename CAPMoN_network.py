@@ -9,7 +9,21 @@ Load Hg0 observation data from CAPMoN dataset
 #%% Import packages
 import numpy as np
 import pandas as pd
-import glob
+import os
+import time
+from timezone_utc import get_time_utc
+from time_window import file_in_window, select_window
+from instrument_merge import merge_instrument_frames, resample_source
+from site_series import SiteSeries
+from qc_flags import get_valid_mask
+from spike_screen import screen_frame
+from climatology import ClimatologyCube
+from tail_ingest import read_csv_maybe_tail
+from compressed_io import open_any, read_csv_any, glob_any, strip_compression
+from long_format import screen_long, daily_means_long, daily_source_long, split_sites
+from shard_batch import (get_shard_arg, estimate_input_size, select_shard,
+                         get_output_dir, get_file_key, report_entry,
+                         write_run_report)
 #%% functions
 def get_filenames_CAPMoN(dn, site):
     """Get the data filename(s) for the site
@@ -124,7 +138,7 @@ def find_header_line_CAPMoN(fn):
          Filename
     """
     header_num = -99 # placeholder
-    with open(fn, 'r', encoding='ISO-8859-1') as searchfile:
+    with open_any(fn, 'r', encoding='ISO-8859-1') as searchfile:
     
         # Clear variable names
         right_table = False # change when have found right table
@@ -154,7 +168,7 @@ def find_column_line(fn):
          Filename
     """
     column_num = -99 # placeholder
-    with open(fn, 'r', encoding='ISO-8859-1') as searchfile:
+    with open_any(fn, 'r', encoding='ISO-8859-1') as searchfile:
     
         # Clear variable names
         right_table = False # change when have found right table
@@ -240,7 +254,7 @@ def fix_column_names_CAPMoN(colnames):
             
     return colnames_new
 
-def load_data_CAPMoN(site, dn,  fn_a):
+def load_data_CAPMoN(site, dn,  fn_a, start=None, end=None, tail_cache=None):
     """Load the data over all years for the site
     
     Parameters
@@ -251,6 +265,12 @@ def load_data_CAPMoN(site, dn,  fn_a):
          Path for Canadian mercury files                      
     fn_a : list
          List of file names
+    start : string
+         Start of time window, files of earlier years are skipped (None for all)
+    end : string
+         End of time window (exclusive), files of later years are skipped (None for all)
+    tail_cache : string
+         Directory for offsets and parsed rows of files, to parse only data appended since the last run (None to parse fully)
          
     """
 
@@ -267,15 +287,17 @@ def load_data_CAPMoN(site, dn,  fn_a):
     
     # Loop over all data files, concatenate
     for fn in fn_a: # loop over filenames
-        for f in glob.glob(fn): # loop over the different file years
+        for f in glob_any(fn): # loop over the different file years (also compressed)
+            if not file_in_window(f, start, end): # year of file outside time window
+                continue
             print(f)
             header_row = find_header_line_CAPMoN(f) # find the row number to start data
             column_row = find_column_line(f) # find the row number of column names
             # find the column names from the csv file
-            colnames = pd.read_csv(f, skiprows=column_row, nrows=1, header=None, 
+            colnames = read_csv_any(f, skiprows=column_row, nrows=1, header=None, 
                      encoding='ISO-8859-1').values.flatten().tolist()
             # fix csv issues manually with problematic files
-            if (f in fn_issue):
+            if (os.path.basename(strip_compression(f)) in [os.path.basename(fi) for fi in fn_issue]):
                 colnames = colnames[:-1] # take off last column, not in data
             # can't have multiple columns with same name
             if colnames.count('Mercury') > 1: # have duplicate Mercury entries
@@ -286,7 +308,7 @@ def load_data_CAPMoN(site, dn,  fn_a):
             # standardize column names between different datasets
             colnames_f = fix_column_names_CAPMoN(colnames)
             # load dataset for year
-            df_d_f = pd.read_csv(f, 
+            df_d_f = read_csv_maybe_tail(f, tail_cache,
                     skiprows=header_row, header=0,
                     names = colnames_f,  encoding='ISO-8859-1')
             # Note: DtypeWarnings can be ignored, do not affect performance
@@ -302,12 +324,18 @@ def load_data_CAPMoN(site, dn,  fn_a):
     colnames_list = [item for sublist in colnames_a for item in sublist if item==item] # make sure not nan
     colnames_u = list(set(colnames_list))
     # print(colnames_u)
+    
+    # no files in time window
+    if len(frame) == 0:
+        print('No data files of site ' + str(site) + ' to load')
+        return pd.DataFrame(columns=['SiteID', 'MercuryFlag1', 'Hg_Gaseous_ngm3'])
         
     # concatenate all data frames        
     df = pd.concat(frame)
     return df
 
-def get_data_CAPMoN(site, dn):
+def get_data_CAPMoN(site, dn, start=None, end=None, screen=None, clim=None,
+                    tail_cache=None):
     """Get the daily data for the site
     
     Parameters
@@ -316,27 +344,28 @@ def get_data_CAPMoN(site, dn):
          Site code
     dn : string
          Path for Canadian mercury files             
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of hourly data (arguments of spike_screen.screen_spikes), None for no screening
+    clim : ClimatologyCube
+         Cube to add the hourly values to, for diurnal/seasonal climatologies (None for no climatology)
+    tail_cache : string
+         Directory for offsets and parsed rows of files, to parse only data appended since the last run (None to parse fully)
     """
     
     # get the list of filename formats for the site
     fn_a = get_filenames_CAPMoN(dn, site)
     
     # load data for all years into dataframe
-    df = load_data_CAPMoN(site, dn, fn_a)
-    
-    # Find where data is valid
-    bool_valid1 = df['MercuryFlag1']=='V0' # Valid value 
-    bool_valid2 = df['MercuryFlag1']=='V1' # Valid value but below detection limit. 
-    bool_valid3 = df['MercuryFlag1']=='V4' # Flag not in use
-    
-    # Boolean variable for data validity
-    bool_valid = bool_valid1 | bool_valid2 | bool_valid3 
+    df = load_data_CAPMoN(site, dn, fn_a, start, end, tail_cache)
+    if df.empty: # no hourly or daily data
+        return df, df
     
-    # Check as well that concentrations are non-negative
-    bool_pos = df['Hg_Gaseous_ngm3'] >= 0
-    
-    # Combine these two requirements
-    bool_overall = bool_valid & bool_pos # these are valid data
+    # Find where data is valid (flags V0, V1, V4 and non-negative concentrations)
+    bool_overall = get_valid_mask(df['MercuryFlag1'], df['Hg_Gaseous_ngm3'], 'CAPMoN')
     
     # Filter data for validity
     df = df[bool_overall]
@@ -353,25 +382,129 @@ def get_data_CAPMoN(site, dn):
     # Check whether have multiple instruments with site
     #print(df['Instrument co-location ID'].unique())
     
-    # Create datetime variables for start and end of measurements
-    time_start = pd.to_datetime(df['DateStartLocalTime'] + ' ' + df['TimeStartLocalTime'])
-    time_end = pd.to_datetime(df['DateEndLocalTime'] + ' ' + df['TimeEndLocalTime'])
+    # Create datetime variables for start and end of measurements, in UTC
+    # (use UTC columns where available, otherwise convert local time)
+    time_start = get_time_utc(df, ['DateStartUTC', 'TimeStartUTC'],
+                              ['DateStartLocalTime', 'TimeStartLocalTime'], 'TimeZone')
+    time_end = get_time_utc(df, ['DateEndUTC', 'TimeEndUTC'],
+                            ['DateEndLocalTime', 'TimeEndLocalTime'], 'TimeZone')
     
     # find midpoint time
     time_mid = ((time_end - time_start)/2 + time_start).values
     df['time_mid'] = time_mid
     
-    # sort data by correct time
-    df = df.sort_values(by='time_mid')
-    
-    # Check whether have duplicated dates within dataset, remove these
-    df = df.drop_duplicates(subset=['time_mid','SiteID'])
-    
-    # resample daily averages
-    df_d = df.set_index('time_mid').resample('D').mean().dropna()
+    # drop rows without UTC time (unknown time zone), counted in the run report
+    bool_utc = df['time_mid'].notna().values
+    n_no_utc = int((~bool_utc).sum())
+    
+    # select data within time window
+    df = df[bool_utc & select_window(df['time_mid'], start, end)]
+    
+    # merge co-located instruments on one hourly time index, keeping the instrument with
+    # lowest co-location ID at each hour (also removes duplicated dates from overlapping files)
+    inst_col = 'Instrument co-location ID'
+    if inst_col not in df.columns: # older files without instrument ID
+        inst_col = 'SiteID'
+    value_cols = [c for c in df.select_dtypes('number').columns if c != inst_col]
+    df = merge_instrument_frames(df, 'time_mid', inst_col, value_cols, rule='priority',
+                                 freq='h')
+    
+    # remove spikes from hourly data
+    df, n_spikes = screen_frame(df, 'Hg_Gaseous_ngm3', screen=screen)
+    
+    # keep only times and numeric data, as compact series for the hourly processing
+    series = SiteSeries.from_frame(df, columns=value_cols)
+    
+    # add hourly data to climatology cube, in the same pass
+    if clim is not None:
+        clim.add(series.times.astype('datetime64[ns]'), series.data['Hg_Gaseous_ngm3'])
+    
+    # resample daily averages, with instrument that measured most of each day
+    df_d = series.resample('D').to_frame('time_mid')
+    df_d[inst_col] = resample_source(df[inst_col])
+    df_d.attrs['n_spikes'] = n_spikes
+    df_d.attrs['n_no_utc'] = n_no_utc
         
     return df, df_d
 
+def get_data_CAPMoN_long(sites, dn, start=None, end=None, screen=None, tail_cache=None):
+    """Get the daily data of several sites at once, in long format
+    
+    Each file is read once (also files with all sites), and filtering, merging
+    of instruments and daily averaging run once for all sites. Returns dict of
+    site code -> daily data (as df_d of get_data_CAPMoN).
+    
+    Parameters
+    ----------
+    sites : list
+         Site codes
+    dn : string
+         Path for Canadian mercury files             
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of hourly data (arguments of spike_screen.screen_spikes), None for no screening
+    tail_cache : string
+         Directory for offsets and parsed rows of files, to parse only data appended since the last run (None to parse fully)
+    """
+    
+    # get the list of filename formats of all sites, without repeats
+    fn_a = list(dict.fromkeys([fn for s in sites for fn in get_filenames_CAPMoN(dn, s)]))
+    
+    # load data of all sites and years into dataframe
+    df = load_data_CAPMoN(None, dn, fn_a, start, end, tail_cache)
+    if df.empty: # no data of any site
+        return {}
+    
+    # find the site of each row from its site code, as categorical column
+    code_to_site = {code: s for s in sites for code in get_sitecodes(s)}
+    df['site'] = pd.Categorical(df['SiteID'].map(code_to_site), categories=sites)
+    
+    # Find where data is valid, and of one of the sites
+    bool_overall = get_valid_mask(df['MercuryFlag1'], df['Hg_Gaseous_ngm3'], 'CAPMoN')
+    df = df[bool_overall & df['site'].notna()]
+    
+    # Create datetime variables for start and end of measurements, in UTC
+    time_start = get_time_utc(df, ['DateStartUTC', 'TimeStartUTC'],
+                              ['DateStartLocalTime', 'TimeStartLocalTime'], 'TimeZone')
+    time_end = get_time_utc(df, ['DateEndUTC', 'TimeEndUTC'],
+                            ['DateEndLocalTime', 'TimeEndLocalTime'], 'TimeZone')
+    
+    # find midpoint time
+    df['time_mid'] = ((time_end - time_start)/2 + time_start).values
+    
+    # drop rows without UTC time (unknown time zone), counted in the run report
+    bool_utc = df['time_mid'].notna().values
+    n_no_utc = df.loc[~bool_utc, 'site'].value_counts()
+    
+    # select data within time window
+    df = df[bool_utc & select_window(df['time_mid'], start, end)]
+    
+    # merge co-located instruments of all sites on one hourly time index
+    inst_col = 'Instrument co-location ID'
+    if inst_col not in df.columns: # older files without instrument ID
+        inst_col = 'SiteID'
+    value_cols = [c for c in df.select_dtypes('number').columns if c != inst_col]
+    df = merge_instrument_frames(df, 'time_mid', inst_col, value_cols, rule='priority',
+                                 freq='h', group_col='site').reset_index()
+    
+    # remove spikes from hourly data of each site
+    df, n_spikes = screen_long(df, 'Hg_Gaseous_ngm3', 'time_mid', ['site'], screen)
+    
+    # daily averages of all sites, with instrument that measured most of each day
+    df_d = daily_means_long(df, ['site'], 'time_mid', value_cols)
+    df_d = df_d.merge(daily_source_long(df, ['site'], 'time_mid', inst_col),
+                      on=['site', 'time_mid'], how='left')
+    
+    # split into sites
+    frames = split_sites(df_d, 'time_mid')
+    for site in frames:
+        frames[site].attrs['n_spikes'] = n_spikes.get(site, 0)
+        frames[site].attrs['n_no_utc'] = int(n_no_utc.get(site, 0))
+    return frames
+
 #%% Calling functions
 # Names of sites in the Canadian network 
 site_names = ['Alert', "Bratt's Lake",'Burnt Island','Delta','Egbert','Esther',
@@ -384,10 +517,41 @@ site_codes = ['ALT', 'BRL','BNT','DEL','EGB','EST','FLN','STA','KEJ','LFL',
 
 dn = '../../obs_datasets/CAPMON/' # directory for Candian files, change to your path
 do = '../misc_Data/' # directory for outputted daily mean files
+start, end = None, None # time window to load, e.g. '2010-01-01', '2016-01-01' (None for all data)
+batch = False # process all sites of the job at once in long format (faster for many small sites)
+screen = None # spike screening of hourly data, e.g. {'window': 25, 'n_mad': 5., 'max_rate': 2.} (None for no screening)
+clim_hourly = False # also save climatology cube of hourly data (hour x month x year) as <site>_clim.npz (per-site mode)
+tail_cache = None # directory for offsets/rows of parsed files, to only parse data appended to growing files (None to parse fully)
+
+# select sites of this job when running as a job array (--shard i/N)
+shard = get_shard_arg()
+sizes = [estimate_input_size(get_filenames_CAPMoN(dn, s)) for s in site_codes]
+sites_shard = select_shard('CAPMoN', site_codes, sizes, shard)
+do_shard = get_output_dir(do, shard)
+report = []
+if batch: # all sites at once
+    t_start = time.time()
+    print("Loading sites: " + ', '.join(sites_shard))
+    frames = get_data_CAPMoN_long([s for s in site_codes if s in sites_shard], dn,
+                                  start, end, screen, tail_cache)
 for i in range(len(site_codes)):
-    print("Loading site: " + site_names[i])
-    # get hourly and daily data from sites
-    df, df_d = get_data_CAPMoN(site_codes[i], dn)
+    if site_codes[i] not in sites_shard: # processed by another job
+        continue
+    key = get_file_key('CAPMoN', site_codes[i]) # output file name, with network if code is shared
+    if batch:
+        df_d = frames.get(site_codes[i], pd.DataFrame())
+    else:
+        t_start = time.time()
+        print("Loading site: " + site_names[i])
+        clim = ClimatologyCube() if clim_hourly else None
+        # get hourly and daily data from sites
+        df, df_d = get_data_CAPMoN(site_codes[i], dn, start, end, screen, clim,
+                                   tail_cache)
+        if clim is not None:
+            clim.save(do_shard + key + '_clim.npz')
     # output csv of daily averages
-    fo = do + site_codes[i] + '_d.csv'
-    df_d.to_csv(fo)
\ No newline at end of file
+    fo = do_shard + key + '_d.csv'
+    df_d.to_csv(fo)
+    # (time since start of batch, in batch mode)
+    report.append(report_entry(site_codes[i], fo, df_d, sizes[i], t_start))
+write_run_report(do_shard, 'CAPMoN', report)
\ No newline at end of file
@@ -8,7 +8,18 @@ Load Hg0 observation data courtesy from Experimental Lakes Area courtesy of Vinc
 #%% Import packages
 import numpy as np
 import pandas as pd
+import time
+from time_window import select_window
+from xlsx_cache import read_xlsx_cached
+from spike_screen import screen_frame
+from shard_batch import (get_shard_arg, estimate_input_size, select_shard,
+                         get_output_dir, get_file_key, report_entry,
+                         write_run_report)
 #%% Functions used for analysis
+# columns of the ELA workbook that are used
+cols_ELA = ['Sample date/Time start', 'Sample date/Time end',
+            'GEM (ng/m^3)', 'RGM (pg/m^3)', 'PHg (pg/m^3)']
+
 def load_data_misc(site, fn):
     """Load the data over all years for the site
     
@@ -21,12 +32,12 @@ def load_data_misc(site, fn):
          
     """
         
-    # load dataset for all misc Hg data
-    df = pd.read_excel(fn)            
+    # load dataset for all misc Hg data (cached after the first read of workbook)
+    df = read_xlsx_cached(fn, cols_ELA)
         
     # Create datetime variables for start and end of measurements
-    time_start = df['Sample date/Time start']
-    time_end = df['Sample date/Time end']
+    time_start = pd.to_datetime(df['Sample date/Time start'])
+    time_end = pd.to_datetime(df['Sample date/Time end'])
 
     # find midpoint time
     time_mid = ((time_end - time_start)/2 + time_start).values
@@ -34,7 +45,7 @@ def load_data_misc(site, fn):
     
     return df
 
-def get_data_misc(site, dn):
+def get_data_misc(site, dn, start=None, end=None, screen=None):
     """Get the daily data for the misc site
     
     Parameters
@@ -43,6 +54,12 @@ def get_data_misc(site, dn):
          Site code
     dn : string
          Path for misc mercury files   
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of 3-hourly data (arguments of spike_screen.screen_spikes), None for no screening
     """
     
     # filename of site
@@ -54,13 +71,20 @@ def get_data_misc(site, dn):
     # load data for all years into dataframe
     df = load_data_misc(site, fn)
     
+    # select data within time window
+    df = df[select_window(df['time_mid'], start, end)]
+    
     # Rename columns that have spaces
     df = df.rename(columns={"GEM (ng/m^3)": "GEM", 
                             "RGM (pg/m^3)": "RGM_pg_m3",
                             "PHg (pg/m^3)": "PHg_pg_m3"})
+    
+    # remove spikes from 3-hourly data
+    df, n_spikes = screen_frame(df.sort_values(by='time_mid'), 'GEM', 'time_mid', screen)
             
     # resample daily averages
     df_d = df.set_index('time_mid').resample('D').mean().dropna()
+    df_d.attrs['n_spikes'] = n_spikes
                     
     return df_d
 
@@ -68,12 +92,27 @@ def get_data_misc(site, dn):
 stations_all = ['ELA']
 dn = '../../obs_datasets/GEM/' # directory for misc files, change to your path
 do = '../misc_Data/' # directory for outputted daily mean files
+start, end = None, None # time window to load, e.g. '2010-01-01', '2016-01-01' (None for all data)
+screen = None # spike screening of 3-hourly data, e.g. {'window': 25, 'n_mad': 5., 'max_rate': 2.} (None for no screening)
+
+# select sites of this job when running as a job array (--shard i/N)
+shard = get_shard_arg()
+sizes = [estimate_input_size([dn + 'ELA_TEKRAN_DATA_2005-2013_GEM-PHg-RGM_3-hr_averages.xlsx']) for station in stations_all]
+sites_shard = select_shard('ELA', stations_all, sizes, shard)
+do_shard = get_output_dir(do, shard)
+report = []
 
 # run loop over sites to load and process data
-for station in stations_all:
+for i, station in enumerate(stations_all):
+    if station not in sites_shard: # processed by another job
+        continue
+    key = get_file_key('ELA', station) # output file name, with network if code is shared
+    t_start = time.time()
     print("Loading site: " + station)
     # get daily data from site
-    df = get_data_misc(station, dn)
+    df = get_data_misc(station, dn, start, end, screen)
     # output csv of daily averages
-    fo = do + station + '_d.csv'
-    df.to_csv(fo)
\ No newline at end of file
+    fo = do_shard + key + '_d.csv'
+    df.to_csv(fo)
+    report.append(report_entry(station, fo, df, sizes[i], t_start))
+write_run_report(do_shard, 'ELA', report)
\ No newline at end of file
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: latin-1 -*-
+"""
+Created on Mon Oct 19 2026
+Build a catalog of the EMEP EBAS files from their headers only, so that
+unsuitable files can be skipped before loading the data
+@author: arifeinberg
+"""
+#%% Import packages
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from compressed_io import open_any, glob_any, stat_any
+#%% Functions used for the catalog
+# header keys saved in the catalog, and their column names
+header_keys = {'Station code': 'station_code',
+               'Station name': 'station_name',
+               'Component': 'component',
+               'Startdate': 'start_date',
+               'Resolution code': 'resolution_code',
+               'Matrix': 'matrix',
+               'Instrument type': 'instrument_type',
+               'Instrument name': 'instrument_name'}
+
+catalog_name = 'catalog_EMEP.csv' # file name of catalog, within EMEP directory
+
+def get_suitable_res(f_t_res):
+    """Return the output time resolutions that can be made from a file resolution
+
+    Parameters
+    ----------
+    f_t_res : string
+         Time resolution of the file ('H', 'D', 'W', '2W', 'M')
+    """
+    if f_t_res == 'D': # daily data
+        suitable_res = ['D', 'W', '2W','M']
+    elif f_t_res == 'H': # hourly or multi-hourly data
+        suitable_res = ['H','D', 'W', '2W','M']
+    elif f_t_res == 'W': # weekly data
+        suitable_res = ['W', '2W','M']
+    elif f_t_res == '2W': # biweekly data
+        suitable_res = ['2W','M']
+    elif f_t_res == 'M': # monthly data
+        suitable_res = ['M']
+    else:
+        raise Exception('Correct time resolution not found')
+    return suitable_res
+
+def classify_time_res(d_diff):
+    """Return the time resolution of a file from its averaging time (days)
+
+    Parameters
+    ----------
+    d_diff : float
+         Averaging time of the measurements in days (rounded)
+    """
+    if d_diff == 1: # daily data
+        f_t_res = 'D'
+    elif d_diff == 0: # hourly or multi-hourly data
+        f_t_res = 'H'
+    elif (d_diff > 4) and (d_diff < 10) : # weekly data
+        f_t_res = 'W'
+    elif (d_diff > 10) and (d_diff < 18) : # biweekly data
+        f_t_res = '2W'
+    elif (d_diff > 20) and (d_diff < 40) : # monthly data
+        f_t_res = 'M'
+    else:
+        f_t_res = None # not a resolution that is used
+    return f_t_res
+
+def resolution_code_to_days(res_code):
+    """Convert an EBAS resolution code (e.g. '1h', '1d', '2w', '1mo') to days
+
+    Parameters
+    ----------
+    res_code : string
+         EBAS resolution code
+    """
+    units = {'mn': 1./1440., 'h': 1./24., 'd': 1., 'w': 7., 'mo': 30., 'y': 365.}
+    res_code = str(res_code).strip().lower()
+    for unit in ['mn', 'mo', 'h', 'd', 'w', 'y']: # two letter units first
+        if res_code.endswith(unit):
+            try:
+                return float(res_code[:-len(unit)]) * units[unit]
+            except ValueError:
+                return np.nan
+    return np.nan
+
+def read_header_EMEP(fn, dn=''):
+    """Read the metadata of an EBAS file from its header, and count the data rows
+
+    Parameters
+    ----------
+    fn : string
+         Filename
+    dn : string
+         Path for EMEP mercury files, file is saved relative to this path
+    """
+    size, mtime = stat_any(fn)
+    entry = {'file': os.path.relpath(fn, dn) if dn else fn, 'size': size, 'mtime': mtime}
+    for key in header_keys:
+        entry[header_keys[key]] = np.nan
+
+    with open_any(fn, 'r', encoding='ISO-8859-1') as searchfile:
+        # first line gives number of header lines (NASA Ames format)
+        n_header = int(searchfile.readline().split()[0])
+        for ll in range(n_header - 1):
+            line = searchfile.readline()
+            if ':' not in line:
+                continue
+            key, value = line.split(':', 1)
+            if key.strip() in header_keys:
+                entry[header_keys[key.strip()]] = value.strip()
+        # count data rows and keep the last one, without parsing the data
+        n_rows = 0
+        last_line = ''
+        for line in searchfile:
+            if line.strip():
+                n_rows += 1
+                last_line = line
+
+    entry['n_rows'] = n_rows
+    # convert start date, and find end date from endtime of last row
+    start_date = pd.to_datetime(entry['start_date'], format='%Y%m%d%H%M%S', utc=True)
+    entry['start_date'] = start_date
+    try:
+        entry['end_date'] = start_date + pd.to_timedelta(float(last_line.split()[1]), unit='D')
+    except (IndexError, ValueError):
+        entry['end_date'] = pd.NaT
+    # time resolution, as used for the output resolutions
+    d_res = resolution_code_to_days(entry['resolution_code'])
+    entry['f_t_res'] = classify_time_res(round(d_res)) if d_res == d_res else None
+    return entry
+
+def build_catalog_EMEP(dn, n_workers=None):
+    """Scan the headers of all EBAS files in parallel and save the catalog
+
+    Files that have not changed since the last scan (same size and
+    modification time) are not read again.
+
+    Parameters
+    ----------
+    dn : string
+         Path for EMEP mercury files
+    n_workers : int
+         Number of processes (default: number of CPUs)
+    """
+    fn_all = glob_any(dn + '**/*.nas', recursive=True) # also compressed
+
+    # reuse entries of unchanged files from the previous catalog
+    catalog_old = load_catalog_EMEP(dn)
+    entries = []
+    fn_scan = []
+    for f in fn_all:
+        f_rel = os.path.relpath(f, dn)
+        if (catalog_old is not None) and (f_rel in catalog_old.index):
+            entry_old = catalog_old.loc[f_rel]
+            if (entry_old['size'], entry_old['mtime']) == stat_any(f):
+                entries.append(dict(entry_old, file=f_rel))
+                continue
+        fn_scan.append(f)
+
+    print('Scanning %d of %d files' % (len(fn_scan), len(fn_all)))
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        entries += list(executor.map(read_header_EMEP, fn_scan, [dn] * len(fn_scan),
+                                     chunksize=16))
+
+    catalog = pd.DataFrame(entries, columns=['file', 'size', 'mtime'] +
+                           list(header_keys.values()) + ['n_rows', 'end_date', 'f_t_res'])
+    catalog = catalog.sort_values(by='file')
+    catalog.to_csv(dn + catalog_name, index=False)
+    return catalog.set_index('file')
+
+def get_catalog_entry(catalog, dn, fn):
+    """Return the catalog entry of a file, None if not in the catalog
+
+    Parameters
+    ----------
+    catalog : DataFrame
+         Catalog of the EBAS files (or None)
+    dn : string
+         Path for EMEP mercury files
+    fn : string
+         Filename
+    """
+    if catalog is None:
+        return None
+    f_rel = os.path.relpath(fn, dn)
+    if f_rel not in catalog.index:
+        return None
+    return catalog.loc[f_rel]
+
+def load_catalog_EMEP(dn):
+    """Load the catalog of the EBAS files, None if it has not been built
+
+    Parameters
+    ----------
+    dn : string
+         Path for EMEP mercury files
+    """
+    fn = dn + catalog_name
+    if not os.path.exists(fn):
+        return None
+    catalog = pd.read_csv(fn, index_col='file')
+    catalog['start_date'] = pd.to_datetime(catalog['start_date'], utc=True)
+    catalog['end_date'] = pd.to_datetime(catalog['end_date'], utc=True)
+    return catalog
+
+def query_catalog_EMEP(catalog, component=None, f_t_res=None, year=None):
+    """Select catalog entries by component, time resolution and year
+
+    Parameters
+    ----------
+    catalog : DataFrame
+         Catalog of the EBAS files
+    component : string
+         Component name in the header (e.g. 'mercury')
+    f_t_res : string
+         Time resolution of the file ('H', 'D', 'W', '2W', 'M')
+    year : int
+         Year that the file should cover
+    """
+    bool_sel = np.ones(len(catalog), dtype=bool)
+    if component is not None:
+        bool_sel &= (catalog['component'] == component).values
+    if f_t_res is not None:
+        bool_sel &= (catalog['f_t_res'] == f_t_res).values
+    if year is not None:
+        year_start = pd.Timestamp(str(year), tz='UTC')
+        year_end = pd.Timestamp(str(year + 1), tz='UTC')
+        bool_sel &= ((catalog['start_date'] < year_end) &
+                     (catalog['end_date'].fillna(year_end) > year_start)).values
+    return catalog[bool_sel]
+
+#%% Build or query the catalog
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Catalog of EBAS file headers')
+    parser.add_argument('command', choices=['build', 'query'])
+    parser.add_argument('--dn', default='../../obs_datasets/EMEP/') # change to your path
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--component', default=None)
+    parser.add_argument('--res', default=None)
+    parser.add_argument('--year', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        catalog = build_catalog_EMEP(args.dn, args.workers)
+        print('Catalog of %d files saved to %s' % (len(catalog), args.dn + catalog_name))
+    else:
+        catalog = load_catalog_EMEP(args.dn)
+        if catalog is None:
+            raise FileNotFoundError('No catalog found, run build first')
+        sel = query_catalog_EMEP(catalog, args.component, args.res, args.year)
+        print(sel[['station_code', 'station_name', 'component', 'resolution_code',
+                   'start_date', 'end_date', 'n_rows']].to_string())
@@ -9,8 +9,22 @@ Load Hg0 observation data from EMEP dataset
 #%% Import packages
 import numpy as np
 import pandas as pd
-import glob
+import os
+import time
 from scipy import stats
+from EMEP_catalog import (classify_time_res, get_suitable_res, load_catalog_EMEP,
+                          get_catalog_entry)
+from time_window import file_in_window, select_window
+from instrument_merge import merge_instrument_frames
+from qc_flags import get_valid_mask
+from climatology import ClimatologyCube
+from quicklook import QuickLook
+from spike_screen import screen_frame
+from tail_ingest import read_csv_maybe_tail
+from compressed_io import open_any, read_csv_any, glob_any
+from shard_batch import (get_shard_arg, estimate_input_size, select_shard,
+                         get_output_dir, get_file_key, report_entry,
+                         write_run_report)
 #%% functions
 def get_filenames_EMEP(dn, site):
     """Get the data filename(s) for the site
@@ -88,7 +102,7 @@ def find_header_line_EMEP(fn):
          Filename
     """
     header_num = -99 # placeholder
-    with open(fn, 'r', encoding='ISO-8859-1') as searchfile:         
+    with open_any(fn, 'r', encoding='ISO-8859-1') as searchfile:         
     
         #Search file for strings, trim lines and save as variables
         for ll, line in enumerate(searchfile):
@@ -111,7 +125,7 @@ def find_startdate(fn):
          Filename
     """
     line_num = -99 # placeholder
-    with open(fn, 'r', encoding='ISO-8859-1') as searchfile:         
+    with open_any(fn, 'r', encoding='ISO-8859-1') as searchfile:         
     
         #Search file for strings, trim lines and save as variables
         for ll, line in enumerate(searchfile):
@@ -193,7 +207,8 @@ def fix_column_names_EMEP(colnames):
             
     return colnames_new
 
-def load_data_EMEP(site, dn, fn_a, t_res):
+def load_data_EMEP(site, dn, fn_a, t_res, catalog=None, start=None, end=None,
+                   allowed_res=None, screen=None, clim=None, quick=None, tail_cache=None):
     """Load the data over all years for the site
     
     Parameters
@@ -206,19 +221,49 @@ def load_data_EMEP(site, dn, fn_a, t_res):
          List of file names
     t_res : string
          Required time resolution of output dataframe
+    catalog : DataFrame
+         Catalog of file headers (EMEP_catalog.py), to skip unsuitable files
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    allowed_res : list
+         Time resolutions of files that can be used, e.g. ['H'] (None for all)
+    screen : dict
+         Spike screening of hourly files (arguments of spike_screen.screen_spikes), None for no screening
+    clim : ClimatologyCube
+         Cube to add the values of hourly files to, for diurnal/seasonal climatologies (None for no climatology)
+    quick : QuickLook
+         Collector of the values of hourly files, for downsampled quick-look series (None for no quick-look)
+    tail_cache : string
+         Directory for offsets and parsed rows of files, to parse only data appended since the last run (None to parse fully)
     """
 
     # create empty data frame to store all sites and years
     frame = []
     colnames_a = []
+    n_spikes = 0 # number of spikes removed from hourly files
     
     # Loop over all data files, concatenate
     for fn in fn_a: # loop over filenames
-        for f in glob.glob(fn): # loop over the different file years
+        for f in glob_any(fn): # loop over the different file years (also compressed)
             print(f)
+            # check resolution from catalog before reading data, if available
+            entry = get_catalog_entry(catalog, dn, f)
+            if (entry is not None) and isinstance(entry['f_t_res'], str):
+                if t_res not in get_suitable_res(entry['f_t_res']):
+                    print("Skipped file, short averaging time resolution chosen for file with resolution: " + entry['f_t_res'] )
+                    continue
+                if (allowed_res is not None) and (entry['f_t_res'] not in allowed_res):
+                    print("Skipped file, resolution not allowed: " + entry['f_t_res'])
+                    continue
+            # check whether file covers time window (from catalog or filename)
+            if not file_in_window(f, start, end, entry):
+                print("Skipped file, outside of time window")
+                continue
             header_row = find_header_line_EMEP(f) # find the row number to start data
             # find the column names from the csv file
-            colnames = pd.read_csv(f, skiprows=header_row, nrows=1, header=None, sep=' ',
+            colnames = read_csv_any(f, skiprows=header_row, nrows=1, header=None, sep=' ',
                      encoding='ISO-8859-1').values.flatten().tolist()
             # can't have multiple columns with same name
             if colnames.count('GEM') > 1: # have duplicate GEM entries
@@ -229,7 +274,7 @@ def load_data_EMEP(site, dn, fn_a, t_res):
             colnames_f = fix_column_names_EMEP(colnames)
 
             # load dataset from file
-            df = pd.read_csv(f, 
+            df = read_csv_maybe_tail(f, tail_cache,
                     skiprows=header_row, header=0, sep='\s+',
                     names = colnames_f,  encoding='ISO-8859-1')    
             
@@ -243,14 +288,11 @@ def load_data_EMEP(site, dn, fn_a, t_res):
             time_mid = ((date_end - date_start)/2 + date_start).values
             df['time_mid'] = time_mid
             
-            # select valid values
-            bool_valid = df['flag_TGM']==0.  # Valid value 
-            
-            # Check as well that concentrations are not invalid
-            bool_pos = (df['TGM'] < 99.) & (df['TGM'] > 0.)
+            # select data within time window
+            df = df[select_window(df['time_mid'], start, end)]
             
-            # Combine these two requirements
-            bool_overall = bool_valid & bool_pos # these are valid data
+            # select valid values (all EBAS flags valid, and 0 < TGM < 99)
+            bool_overall = get_valid_mask(df['flag_TGM'], df['TGM'], 'EMEP')
             # Filter data for validity
             df = df[bool_overall]
 
@@ -267,29 +309,21 @@ def load_data_EMEP(site, dn, fn_a, t_res):
             # set index to the time_mid, needed for resampling consistently
             df = df.set_index('time_mid')
             
-            # figure out time resolution of file
-            if d_diff == 1: # daily data
-                f_t_res = 'D'
-                # output resolutions that work with daily data
-                suitable_res = ['D', 'W', '2W','M']
-            elif d_diff == 0: # hourly or multi-hourly data
-                f_t_res = 'H'
-                # output resolutions that work with daily data
-                suitable_res = ['H','D', 'W', '2W','M']
-            elif (d_diff > 4) and (d_diff < 10) : # weekly data
-                f_t_res = 'W'
-                # output resolutions that work with daily data
-                suitable_res = ['W', '2W','M']
-            elif (d_diff > 10) and (d_diff < 18) : # biweekly data
-                f_t_res = '2W'
-                # output resolutions that work with daily data
-                suitable_res = ['2W','M']
-            elif (d_diff > 20) and (d_diff < 40) : # monthly data
-                f_t_res = 'M'
-                # output resolutions that work with daily data
-                suitable_res = ['M']
-            else:
-                raise Exception('Correct time resolution not found')
+            # figure out time resolution of file, and output resolutions that work with it
+            f_t_res = classify_time_res(d_diff)
+            suitable_res = get_suitable_res(f_t_res)
+            if (allowed_res is not None) and (f_t_res not in allowed_res):
+                print("Skipped file, resolution not allowed: " + f_t_res)
+                continue
+            # remove spikes from hourly files
+            if f_t_res == 'H':
+                df, n_spikes_f = screen_frame(df.sort_index(), 'TGM', screen=screen)
+                n_spikes += n_spikes_f
+            # add hourly files to climatology cube and quick-look, in the same pass
+            if (clim is not None) and (f_t_res == 'H'):
+                clim.add(df.index.values, df['TGM'].values)
+            if (quick is not None) and (f_t_res == 'H'):
+                quick.add(df.index.values, df['TGM'].values)
             # check if time resolution can be suitably converted
             if t_res in suitable_res:
                 if t_res == f_t_res: 
@@ -301,6 +335,12 @@ def load_data_EMEP(site, dn, fn_a, t_res):
                 print("Skipped file, short averaging time resolution chosen for file with resolution: " + f_t_res )
                 continue
             
+            # station code of file (from catalog, or start of filename e.g. NO0002R)
+            if (entry is not None) and isinstance(entry['station_code'], str):
+                df_t['station'] = entry['station_code']
+            else:
+                df_t['station'] = os.path.basename(f).split('.')[0]
+            
             # append to frame, so that can later concatenate
             df_d_temp = frame.append(df_t)
                
@@ -308,12 +348,19 @@ def load_data_EMEP(site, dn, fn_a, t_res):
     colnames_list = [item for sublist in colnames_a for item in sublist if item==item] # make sure not nan
     colnames_u = list(set(colnames_list))
     print(colnames_u)
+    
+    # no files in time window or with allowed resolution
+    if len(frame) == 0:
+        print('No data files of site ' + str(site) + ' to load')
+        return pd.DataFrame(columns=['TGM', 'station'], index=pd.DatetimeIndex([], name='time_mid'))
         
     # concatenate all data frames        
     df_t = pd.concat(frame)
+    df_t.attrs['n_spikes'] = n_spikes
     return df_t
 
-def get_data_EMEP(site, dn, t_res):
+def get_data_EMEP(site, dn, t_res, catalog=None, start=None, end=None,
+                  allowed_res=None, screen=None, clim=None, quick=None, tail_cache=None):
     """Get the daily data for the site
     
     Parameters
@@ -324,19 +371,40 @@ def get_data_EMEP(site, dn, t_res):
          Path for EMEP mercury files   
     t_res: string      
          Time resolution of the data   
+    catalog : DataFrame
+         Catalog of file headers (EMEP_catalog.py), to skip unsuitable files
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    allowed_res : list
+         Time resolutions of files that can be used, e.g. ['H'] (None for all)
+    screen : dict
+         Spike screening of hourly files (arguments of spike_screen.screen_spikes), None for no screening
+    clim : ClimatologyCube
+         Cube to add the values of hourly files to, for diurnal/seasonal climatologies (None for no climatology)
+    quick : QuickLook
+         Collector of the values of hourly files, for downsampled quick-look series (None for no quick-look)
+    tail_cache : string
+         Directory for offsets and parsed rows of files, to parse only data appended since the last run (None to parse fully)
     """
     
     # get the list of filename formats for the site
     fn_a = get_filenames_EMEP(dn, site)
 
     # load data for all years into dataframe
-    df = load_data_EMEP(site, dn, fn_a, t_res)
+    df = load_data_EMEP(site, dn, fn_a, t_res, catalog, start, end, allowed_res, screen, clim,
+                        quick, tail_cache)
+    if df.empty: # no data to merge
+        return df
 
-    # sort data by correct time
-    df = df.sort_index()
-        
-    # Check whether have duplicated dates within dataset, remove these
-    #df = df.drop_duplicates(subset=['time_mid'])
+    # merge stations of the site (e.g. NO0001R/NO0002R) on one sorted time index,
+    # preferring the station listed first in get_filenames_EMEP where they overlap
+    value_cols = [c for c in df.columns if c != 'station']
+    n_spikes = df.attrs.get('n_spikes', 0)
+    df = merge_instrument_frames(df, None, 'station', value_cols, rule='priority',
+                                 priority=pd.unique(df['station']))
+    df.attrs['n_spikes'] = n_spikes
             
     return df
 
@@ -365,12 +433,41 @@ site_time_res = ['D', 'D','D','D']
 
 dn = '../../obs_datasets/EMEP/' # directory for EMEP files, change to your path
 do = '../misc_Data/' # directory for outputted daily mean files
+start, end = None, None # time window to load, e.g. '2010-01-01', '2016-01-01' (None for all data)
+allowed_res = None # resolutions of files to use, e.g. ['H'] (None for all)
+screen = None # spike screening of hourly files, e.g. {'window': 25, 'n_mad': 5., 'max_rate': 2.} (None for no screening)
+clim_hourly = False # also save climatology cube of hourly files (hour x month x year) as <site>_clim.npz
+quicklook = False # also save downsampled quick-look series of hourly files (zoom levels) as <site>_quick.npz
+tail_cache = None # directory for offsets/rows of parsed files, to only parse data appended to growing files (None to parse fully)
+
+# catalog of file headers, if built with: python EMEP_catalog.py build
+catalog = load_catalog_EMEP(dn)
+
+# select sites of this job when running as a job array (--shard i/N)
+shard = get_shard_arg()
+sizes = [estimate_input_size(get_filenames_EMEP(dn, s)) for s in site_codes]
+sites_shard = select_shard('EMEP', site_codes, sizes, shard)
+do_shard = get_output_dir(do, shard)
+report = []
 
 # run loop over sites to load and process data
 for i in range(len(site_codes)):
+    if site_codes[i] not in sites_shard: # processed by another job
+        continue
+    key = get_file_key('EMEP', site_codes[i]) # output file name, with network if code is shared
+    t_start = time.time()
     print("Loading site: " + site_names[i])
+    clim = ClimatologyCube() if clim_hourly else None
+    quick = QuickLook() if quicklook else None
     # get data from sites at desired time resolution
-    df = get_data_EMEP(site_codes[i], dn, site_time_res[i])
+    df = get_data_EMEP(site_codes[i], dn, site_time_res[i], catalog, start, end,
+                       allowed_res, screen, clim, quick, tail_cache)
     # output csv of daily averages
-    fo = do + site_codes[i] + '_' + site_time_res[i].lower() + '.csv'
+    fo = do_shard + key + '_' + site_time_res[i].lower() + '.csv'
     df.to_csv(fo)
+    if clim is not None:
+        clim.save(do_shard + key + '_clim.npz')
+    if quick is not None:
+        quick.save(do_shard + key + '_quick.npz')
+    report.append(report_entry(site_codes[i], fo, df, sizes[i], t_start))
+write_run_report(do_shard, 'EMEP', report)
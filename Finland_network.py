@@ -9,6 +9,12 @@ Load Hg0 observation data from Finland dataset (courtesy of ￼Katriina Kyllöne
 import glob
 import numpy as np
 import pandas as pd
+import time
+from time_window import select_window
+from spike_screen import screen_frame
+from shard_batch import (get_shard_arg, estimate_input_size, select_shard,
+                         get_output_dir, get_file_key, report_entry,
+                         write_run_report)
 #%% Functions used for analysis
 def get_sitename(site):
     """Get the name for the site from the codes
@@ -57,7 +63,7 @@ def load_data_FIN(site, fn):
 
     return df_na
 
-def get_data_FIN(site, dn):
+def get_data_FIN(site, dn, start=None, end=None, screen=None):
     """Get the daily data for the FIN site
     
     Parameters
@@ -66,6 +72,12 @@ def get_data_FIN(site, dn):
          Site code
     dn : string
          Path for FIN mercury files   
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of hourly data (arguments of spike_screen.screen_spikes), None for no screening
     """
     
     # filename of Finnish sites
@@ -74,6 +86,9 @@ def get_data_FIN(site, dn):
     # load data for all years into dataframe
     df = load_data_FIN(site, fn)
     
+    # select data within time window
+    df = df[select_window(df['time'], start, end)]
+    
     # Check as well that concentrations are non-negative
     # bool_neg = df.iloc[:,1] <= 0
     # print(sum(bool_neg))
@@ -81,8 +96,12 @@ def get_data_FIN(site, dn):
     # sort data by correct time
     df = df.sort_values(by='time')
     
+    # remove spikes from hourly data
+    df, n_spikes = screen_frame(df, 'TGM', 'time', screen)
+    
     # resample daily averages
     df_d = df.set_index('time').resample('D').mean().dropna()
+    df_d.attrs['n_spikes'] = n_spikes
                     
     return df_d
 
@@ -90,13 +109,28 @@ def get_data_FIN(site, dn):
 stations_all = ['PAL1']#, 'HYY', 'VIR']
 dn = '../../obs_datasets/TGM/misc/' # directory for FIN files, change to your path
 do = '../misc_Data/' # directory for outputted daily mean files
+start, end = None, None # time window to load, e.g. '2010-01-01', '2016-01-01' (None for all data)
+screen = None # spike screening of hourly data, e.g. {'window': 25, 'n_mad': 5., 'max_rate': 2.} (None for no screening)
+
+# select sites of this job when running as a job array (--shard i/N)
+shard = get_shard_arg()
+sizes = [estimate_input_size([dn + 'Finnish_TGM_final.csv']) for station in stations_all]
+sites_shard = select_shard('FIN', stations_all, sizes, shard)
+do_shard = get_output_dir(do, shard)
+report = []
 
 # run loop over sites to load and process data
-for station in stations_all:
+for i, station in enumerate(stations_all):
+    if station not in sites_shard: # processed by another job
+        continue
+    key = get_file_key('FIN', station) # output file name, with network if code is shared
+    t_start = time.time()
     print("Loading site: " + station)
     # get daily data from site
-    df = get_data_FIN(station, dn)
+    df = get_data_FIN(station, dn, start, end, screen)
     # output csv of daily averages
-    fo = do + station + '_d.csv'
+    fo = do_shard + key + '_d.csv'
     df.to_csv(fo)
+    report.append(report_entry(station, fo, df, sizes[i], t_start))
+write_run_report(do_shard, 'FIN', report)
     
\ No newline at end of file
@@ -8,8 +8,22 @@ Load Hg0 observation data from GMOS dataset
 #%% Import packages
 import numpy as np
 import pandas as pd
+import time
+from time_window import select_window
+from qc_flags import get_valid_mask
+from spike_screen import screen_frame
+from climatology import ClimatologyCube
+from long_format import stack_sites, screen_long, daily_means_long, split_sites
+from shard_batch import (get_shard_arg, estimate_input_size, select_shard,
+                         get_output_dir, get_file_key, report_entry,
+                         write_run_report)
 #%% Functions used for analysis
-def get_GEM_avg(site, fn):
+# these stations have both GEM and TGM
+tgm_list = ['NIK','BRE','CAL', 'CMA', 'CST', 'EVK', 'ISK','KOD', 'KREGND',
+            'LIS', 'LSM', 'MHE','PAL', 'PIR','ROR','SHL','SIS','VAV', 'WAN'
+            , 'CPO','LON','MAL','MBA','MIN','MWA','RAO','SLU','STN']
+
+def get_GEM_avg(site, fn, start=None, end=None, screen=None, clim=None):
     """return daily-averaged value for GMOS time series
     
     Parameters
@@ -18,20 +32,34 @@ def get_GEM_avg(site, fn):
          name for station
     fn : string
          file name for station
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of hourly data (arguments of spike_screen.screen_spikes), None for no screening
+    clim : ClimatologyCube
+         Cube to add the hourly values to, for diurnal/seasonal climatologies (None for no climatology)
 
     """
     df_station = pd.read_csv(fn)
     # Find where data is invalid
     df_GEM = df_station[df_station['target']=='gem'].copy()
-    # these stations have both GEM and TGM
-    tgm_list = ['NIK','BRE','CAL', 'CMA', 'CST', 'EVK', 'ISK','KOD', 'KREGND',
-                'LIS', 'LSM', 'MHE','PAL', 'PIR','ROR','SHL','SIS','VAV', 'WAN'
-                , 'CPO','LON','MAL','MBA','MIN','MWA','RAO','SLU','STN']
     # convert to datetime format
     df_GEM['tstamp'] = pd.to_datetime(df_GEM['tstamp']) 
     
+    # select data within time window
+    df_GEM = df_GEM[select_window(df_GEM['tstamp'], start, end)]
+    
     # remove missing values
-    df_GEM['value'] = df_GEM['value'].mask(df_GEM['value']<0) #missing values
+    df_GEM['value'] = df_GEM['value'].where(get_valid_mask(None, df_GEM['value'], 'GMOS')) #missing values
+    
+    # remove spikes from hourly data
+    df_GEM, n_spikes = screen_frame(df_GEM.sort_values(by='tstamp'), 'value', 'tstamp', screen)
+    
+    # add hourly GEM to climatology cube, in the same pass
+    if clim is not None:
+        clim.add(df_GEM['tstamp'].values, df_GEM['value'].values)
 
     # resample daily averages for GEM
     df_GEM_d = df_GEM.set_index('tstamp').resample('D').mean().dropna()
@@ -43,8 +71,15 @@ def get_GEM_avg(site, fn):
         # convert to datetime format
         df_TGM['tstamp'] = pd.to_datetime(df_TGM['tstamp']) 
         
+        # select data within time window
+        df_TGM = df_TGM[select_window(df_TGM['tstamp'], start, end)]
+        
         # remove missing values
-        df_TGM['value'] = df_TGM['value'].mask(df_TGM['value']<0) #missing values
+        df_TGM['value'] = df_TGM['value'].where(get_valid_mask(None, df_TGM['value'], 'GMOS')) #missing values
+        
+        # remove spikes from hourly data
+        df_TGM, n_spikes_TGM = screen_frame(df_TGM.sort_values(by='tstamp'), 'value', 'tstamp', screen)
+        n_spikes += n_spikes_TGM
         
         # resample daily averages for TGM
         df_TGM_d = df_TGM.set_index('tstamp').resample('D').mean().dropna()
@@ -55,9 +90,10 @@ def get_GEM_avg(site, fn):
         
         df_GEM_d = pd.concat([df_GEM_d, df_TGM_d])     
     
+    df_GEM_d.attrs['n_spikes'] = n_spikes
     return df_GEM_d
 
-def get_data_GMOS(site, dn):
+def get_data_GMOS(site, dn, start=None, end=None, screen=None, clim=None):
     """Get the daily data for the GMOS site
     
     Parameters
@@ -66,19 +102,81 @@ def get_data_GMOS(site, dn):
          Site code
     dn : string
          Path for GMOS mercury files   
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of hourly data (arguments of spike_screen.screen_spikes), None for no screening
+    clim : ClimatologyCube
+         Cube to add the hourly values to, for diurnal/seasonal climatologies (None for no climatology)
     """
     
     # get the filename for the site
     fn = dn + site + '.csv'
         
     # load data for all years into dataframe, take daily average
-    df = get_GEM_avg(site, fn)
+    df = get_GEM_avg(site, fn, start, end, screen, clim)
 
     # sort data by correct time
     df = df.sort_index()
                     
     return df
 
+def get_data_GMOS_long(sites, dn, start=None, end=None, screen=None):
+    """Get the daily data of several GMOS sites at once, in long format
+    
+    Filtering and daily averaging run once for all sites, with one groupby over
+    (site, target, day). Returns dict of site code -> daily data (as get_data_GMOS).
+    
+    Parameters
+    ----------
+    sites : list
+         Site codes
+    dn : string
+         Path for GMOS mercury files   
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of hourly data (arguments of spike_screen.screen_spikes), None for no screening
+    """
+    
+    # stack data of all sites, with categorical site column
+    df = stack_sites({site: pd.read_csv(dn + site + '.csv') for site in sites})
+    
+    # select GEM of all sites, and TGM of the sites that have both
+    bool_target = (df['target']=='gem') | ((df['target']=='tgm') & df['site'].isin(tgm_list))
+    df = df[bool_target].copy()
+    
+    # convert to datetime format
+    df['tstamp'] = pd.to_datetime(df['tstamp'])
+    
+    # select data within time window
+    df = df[select_window(df['tstamp'], start, end)]
+    
+    # remove missing values
+    df['value'] = df['value'].where(get_valid_mask(None, df['value'], 'GMOS')) #missing values
+    
+    # remove spikes from hourly data of each site and target
+    df, n_spikes = screen_long(df, 'value', 'tstamp', ['site', 'target'], screen)
+    
+    # daily averages of all sites and targets
+    value_cols = list(df.select_dtypes('number').columns)
+    df_d = daily_means_long(df, ['site', 'target'], 'tstamp', value_cols)
+    df_d['target'] = df_d['target'].str.upper()
+    
+    # split into sites, target only kept for sites that have both GEM and TGM
+    frames = split_sites(df_d.sort_values(by=['site', 'tstamp', 'target']), 'tstamp')
+    for site in frames:
+        cols = [c for c in frames[site].columns if c != 'target']
+        if site in tgm_list:
+            cols.append('target')
+        frames[site] = frames[site][cols]
+        frames[site].attrs['n_spikes'] = n_spikes.get(site, 0)
+    return frames
+
 #%% Read GMOS data
 # station = 'BAR'
 
@@ -90,12 +188,42 @@ def get_data_GMOS(site, dn):
 stations_all = ['RAO', 'CPO', 'MBA', 'PAL']
 dn = '../../obs_datasets/TGM/GMOS/' # directory for GMOS files, change to your path
 do = '../misc_Data/' # directory for outputted daily mean files
+start, end = None, None # time window to load, e.g. '2010-01-01', '2016-01-01' (None for all data)
+batch = False # process all sites of the job at once in long format (faster for many small sites)
+screen = None # spike screening of hourly data, e.g. {'window': 25, 'n_mad': 5., 'max_rate': 2.} (None for no screening)
+clim_hourly = False # also save climatology cube of hourly data (hour x month x year) as <site>_clim.npz (per-site mode)
+
+# select sites of this job when running as a job array (--shard i/N)
+shard = get_shard_arg()
+sizes = [estimate_input_size([dn + station + '.csv']) for station in stations_all]
+sites_shard = select_shard('GMOS', stations_all, sizes, shard)
+do_shard = get_output_dir(do, shard)
+report = []
+
+if batch: # all sites at once
+    t_start = time.time()
+    print("Loading sites: " + ', '.join(sites_shard))
+    frames = get_data_GMOS_long([s for s in stations_all if s in sites_shard], dn,
+                                start, end, screen)
 
 # run loop over sites to load and process data
-for station in stations_all:
-    print("Loading site: " + station)
-    # get daily data from site
-    df = get_data_GMOS(station, dn)
+for i, station in enumerate(stations_all):
+    if station not in sites_shard: # processed by another job
+        continue
+    key = get_file_key('GMOS', station) # output file name, with network if code is shared
+    if batch:
+        df = frames.get(station, pd.DataFrame())
+    else:
+        t_start = time.time()
+        print("Loading site: " + station)
+        clim = ClimatologyCube() if clim_hourly else None
+        # get daily data from site
+        df = get_data_GMOS(station, dn, start, end, screen, clim)
+        if clim is not None:
+            clim.save(do_shard + key + '_clim.npz')
     # output csv of daily averages
-    fo = do + station + '_d.csv'
-    df.to_csv(fo)
\ No newline at end of file
+    fo = do_shard + key + '_d.csv'
+    df.to_csv(fo)
+    # (time since start of batch, in batch mode)
+    report.append(report_entry(station, fo, df, sizes[i], t_start))
+write_run_report(do_shard, 'GMOS', report)
\ No newline at end of file
@@ -9,6 +9,14 @@ Load misc Hg0 observation data courtesy of D. Custodio
 import glob
 import numpy as np
 import pandas as pd
+import time
+from spike_screen import screen_spikes
+from site_series import SiteSeries
+from climatology import ClimatologyCube
+from quicklook import QuickLook
+from shard_batch import (get_shard_arg, estimate_input_size, select_shard,
+                         get_output_dir, get_file_key, report_entry,
+                         write_run_report)
 #%% Functions used for analysis
 def load_data_misc(site, fn):
     """Load the data over all years for the site
@@ -33,7 +41,7 @@ def load_data_misc(site, fn):
 
     return df_na
 
-def get_data_misc(site, dn):
+def get_data_misc(site, dn, start=None, end=None, screen=None, clim=None, quick=None):
     """Get the daily data for the misc site
     
     Parameters
@@ -42,6 +50,16 @@ def get_data_misc(site, dn):
          Site code
     dn : string
          Path for misc mercury files   
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of hourly data (arguments of spike_screen.screen_spikes), None for no screening
+    clim : ClimatologyCube
+         Cube to add the hourly values to, for diurnal/seasonal climatologies (None for no climatology)
+    quick : QuickLook
+         Collector of the hourly values, for downsampled quick-look series (None for no quick-look)
     """
     
     # filename of misc sites
@@ -50,12 +68,32 @@ def get_data_misc(site, dn):
     # load data for all years into dataframe
     df = load_data_misc(site, fn)
     
+    # keep only times and numeric data, as compact series sorted by time
+    series = SiteSeries.from_frame(df, 'time')
+    
+    # select data within time window
+    series = series.window(start, end)
+    
     # Check as well that concentrations are non-negative
     # bool_neg = df['MH'] <= 0
     # print(sum(bool_neg))
             
+    # remove spikes from hourly data (first data column)
+    n_spikes = 0
+    if screen is not None:
+        spikes = screen_spikes(series.times, series.data[series.columns[0]], **screen)
+        series = series.filter(~spikes)
+        n_spikes = int(spikes.sum())
+    
+    # add hourly data to climatology cube and quick-look, in the same pass
+    if clim is not None:
+        clim.add(series.times.astype('datetime64[ns]'), series.data[series.columns[0]])
+    if quick is not None:
+        quick.add(series.times.astype('datetime64[ns]'), series.data[series.columns[0]])
+            
     # resample daily averages
-    df_d = df.set_index('time').resample('D').mean().dropna()
+    df_d = series.resample('D').to_frame('time')
+    df_d.attrs['n_spikes'] = n_spikes
                     
     return df_d
 
@@ -63,12 +101,35 @@ def get_data_misc(site, dn):
 stations_all = ['MHD']
 dn = '../../obs_datasets/TGM/misc/' # directory for misc files, change to your path
 do = '../misc_Data/' # directory for outputted daily mean files
+start, end = None, None # time window to load, e.g. '2010-01-01', '2016-01-01' (None for all data)
+screen = None # spike screening of hourly data, e.g. {'window': 25, 'n_mad': 5., 'max_rate': 2.} (None for no screening)
+clim_hourly = False # also save climatology cube of hourly data (hour x month x year) as <site>_clim.npz
+quicklook = False # also save downsampled quick-look series of hourly data (zoom levels) as <site>_quick.npz
+
+# select sites of this job when running as a job array (--shard i/N)
+shard = get_shard_arg()
+sizes = [estimate_input_size([dn + station + '.csv']) for station in stations_all]
+sites_shard = select_shard('MHD', stations_all, sizes, shard)
+do_shard = get_output_dir(do, shard)
+report = []
 
 # run loop over sites to load and process data
-for station in stations_all:
+for i, station in enumerate(stations_all):
+    if station not in sites_shard: # processed by another job
+        continue
+    key = get_file_key('MHD', station) # output file name, with network if code is shared
+    t_start = time.time()
     print("Loading site: " + station)
+    clim = ClimatologyCube() if clim_hourly else None
+    quick = QuickLook() if quicklook else None
     # get daily data from site
-    df = get_data_misc(station, dn)
+    df = get_data_misc(station, dn, start, end, screen, clim, quick)
     # output csv of daily averages
-    fo = do + station + '_d.csv'
-    df.to_csv(fo)
\ No newline at end of file
+    fo = do_shard + key + '_d.csv'
+    df.to_csv(fo)
+    if clim is not None:
+        clim.save(do_shard + key + '_clim.npz')
+    if quick is not None:
+        quick.save(do_shard + key + '_quick.npz')
+    report.append(report_entry(station, fo, df, sizes[i], t_start))
+write_run_report(do_shard, 'MHD', report)
\ No newline at end of file
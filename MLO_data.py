@@ -9,8 +9,14 @@ Load MLO dataset from 2002–2010 courtesy of Matt Landis (EPA)
 import glob
 import numpy as np
 import pandas as pd
+import time
+from time_window import select_window, to_utc_naive
+from spike_screen import screen_frame
+from shard_batch import (get_shard_arg, estimate_input_size, select_shard,
+                         get_output_dir, get_file_key, report_entry,
+                         write_run_report)
 #%% Functions used for analysis
-def load_data_MLO(site, fn):
+def load_data_MLO(site, fn, start=None, end=None):
     """Load the data over all years for the MLO site
     
     Parameters
@@ -19,17 +25,30 @@ def load_data_MLO(site, fn):
          Site code
     fn : string
          File name for misc data
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
          
     """
         
     # load dataset for all misc Hg data
     df = pd.read_csv(fn)            
     
+    # skip years outside time window before converting times
+    if start is not None:
+        df = df[df['Year'] >= to_utc_naive(start).year]
+    if end is not None:
+        df = df[df['Year'] <= to_utc_naive(end).year]
+    
     # select time and save as datetime variable
     str_time = df['Year'].apply(str) + ' ' + df['Month'].apply(str) + \
         ' ' + df['Day'].apply(str) + ' ' +  df['Hour'].apply(str) + ' ' + \
             df['Minute'].apply(str)
     df['time'] = pd.to_datetime(str_time, format='%Y %m %d %H %M')
+    
+    # select data within time window
+    df = df[select_window(df['time'], start, end)]
         
     # drop rows with NaN values
     df_na = df.dropna(subset=['Hg0 (ngm-3)'])
@@ -40,7 +59,7 @@ def load_data_MLO(site, fn):
     
     return df_na
 
-def get_data_MLO(site, dn):
+def get_data_MLO(site, dn, start=None, end=None, screen=None):
     """Get the daily data for MLO
     
     Parameters
@@ -49,13 +68,19 @@ def get_data_MLO(site, dn):
          Site code
     dn : string
          Path for misc mercury files   
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of hourly data (arguments of spike_screen.screen_spikes), None for no screening
     """
     
     # filename of misc sites
     fn = dn + 'mauna_loa_All_processed.csv'
     
     # load data for all years into dataframe
-    df = load_data_MLO(site, fn)
+    df = load_data_MLO(site, fn, start, end)
     
     # filter rows with extremely high Hg values
     bool_high = df['GEM'] < 10 # remove values over 10 ng m-3
@@ -63,20 +88,39 @@ def get_data_MLO(site, dn):
     # Filter data for validity
     df = df[bool_high]
 
+    # remove spikes from hourly data
+    df, n_spikes = screen_frame(df.sort_values(by='time'), 'GEM', 'time', screen)
+
     # resample daily averages
     df_d = df.set_index('time').resample('D').mean().dropna()
+    df_d.attrs['n_spikes'] = n_spikes
                     
     return df_d
 #%% Read MLO data
 stations_all = ['MLO1'] # add one to differentiate from AMNet data
 dn = '../../obs_datasets/GEM/MLO_data_Landis/' # directory for misc files, change to your path
 do = '../misc_Data/' # directory for outputted daily mean files
+start, end = None, None # time window to load, e.g. '2010-01-01', '2016-01-01' (None for all data)
+screen = None # spike screening of hourly data, e.g. {'window': 25, 'n_mad': 5., 'max_rate': 2.} (None for no screening)
+
+# select sites of this job when running as a job array (--shard i/N)
+shard = get_shard_arg()
+sizes = [estimate_input_size([dn + 'mauna_loa_All_processed.csv']) for station in stations_all]
+sites_shard = select_shard('MLO', stations_all, sizes, shard)
+do_shard = get_output_dir(do, shard)
+report = []
 
 # run loop over sites to load and process data
-for station in stations_all:
+for i, station in enumerate(stations_all):
+    if station not in sites_shard: # processed by another job
+        continue
+    key = get_file_key('MLO', station) # output file name, with network if code is shared
+    t_start = time.time()
     print("Loading site: " + station)
     # get daily data from site
-    df = get_data_MLO(station, dn)
+    df = get_data_MLO(station, dn, start, end, screen)
     # output csv of daily averages
-    fo = do + station + '_d.csv'
+    fo = do_shard + key + '_d.csv'
     df.to_csv(fo)
+    report.append(report_entry(station, fo, df, sizes[i], t_start))
+write_run_report(do_shard, 'MLO', report)
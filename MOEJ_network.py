@@ -7,9 +7,18 @@ Files provided by Hiroyuki Tsukamoto and Takashi Yamamoto upon request
 @author: arifeinberg
 """
 #%% Import packages
-import glob
 import numpy as np
 import pandas as pd
+import time
+from time_window import file_in_window, select_window
+from climatology import ClimatologyCube
+from quicklook import QuickLook
+from spike_screen import screen_frame
+from tail_ingest import read_csv_maybe_tail
+from compressed_io import glob_any
+from shard_batch import (get_shard_arg, estimate_input_size, select_shard,
+                         get_output_dir, get_file_key, report_entry,
+                         write_run_report)
 #%% Functions used for analysis
 def get_filenames_MOEJ(dn, site):
     """Get the data filename(s) for the site
@@ -30,7 +39,7 @@ def get_filenames_MOEJ(dn, site):
         fn = ['']
     return fn
 
-def load_data_MOEJ(site, dn,  fn_a):
+def load_data_MOEJ(site, dn,  fn_a, start=None, end=None, tail_cache=None):
     """Load the data over all years for the site
     
     Parameters
@@ -41,6 +50,12 @@ def load_data_MOEJ(site, dn,  fn_a):
          Path for MOEJ mercury files                      
     fn_a : list
          List of file names
+    start : string
+         Start of time window, files of earlier years are skipped (None for all)
+    end : string
+         End of time window (exclusive), files of later years are skipped (None for all)
+    tail_cache : string
+         Directory for offsets and parsed rows of files, to parse only data appended since the last run (None to parse fully)
          
     """
 
@@ -49,18 +64,26 @@ def load_data_MOEJ(site, dn,  fn_a):
         
     # Loop over all data files, concatenate
     for fn in fn_a: # loop over filenames
-        for f in glob.glob(fn): # loop over the different file years
+        for f in glob_any(fn): # loop over the different file years (also compressed)
+            if not file_in_window(f, start, end): # year of file outside time window
+                continue
             print(f)
             # load dataset for year
-            df_d_f = pd.read_csv(f)            
+            df_d_f = read_csv_maybe_tail(f, tail_cache)            
             # append to frame, so that can later concatenate
             df_d_temp = frame.append(df_d_f)
+    
+    # no files in time window
+    if len(frame) == 0:
+        print('No data files of site ' + str(site) + ' to load')
+        return pd.DataFrame()
             
     # concatenate all data frames        
     df = pd.concat(frame)
     return df
 
-def get_data_MOEJ(site, dn):
+def get_data_MOEJ(site, dn, start=None, end=None, screen=None, clim=None, quick=None,
+                  tail_cache=None):
     """Get the daily data for the MOEJ site
     
     Parameters
@@ -69,13 +92,27 @@ def get_data_MOEJ(site, dn):
          Site code
     dn : string
          Path for MOEJ mercury files   
+    start : string
+         Start of time window, e.g. '2010-01-01' (None for all data)
+    end : string
+         End of time window (exclusive), e.g. '2016-01-01' (None for all data)
+    screen : dict
+         Spike screening of hourly data (arguments of spike_screen.screen_spikes), None for no screening
+    clim : ClimatologyCube
+         Cube to add the hourly values to, for diurnal/seasonal climatologies (None for no climatology)
+    quick : QuickLook
+         Collector of the hourly values, for downsampled quick-look series (None for no quick-look)
+    tail_cache : string
+         Directory for offsets and parsed rows of files, to parse only data appended since the last run (None to parse fully)
     """
     
     # get the list of filename formats for the site
     fn_a = get_filenames_MOEJ(dn, site)
     
     # load data for all years into dataframe
-    df = load_data_MOEJ(site, dn, fn_a)
+    df = load_data_MOEJ(site, dn, fn_a, start, end, tail_cache)
+    if df.empty: # no daily data
+        return df
     
     # Check as well that concentrations are non-negative
     # bool_neg = df.iloc[:,1] <= 0
@@ -84,11 +121,24 @@ def get_data_MOEJ(site, dn):
     # Create datetime variables for time of measurement
     df['time'] = pd.to_datetime(df.iloc[:,0])
     
+    # select data within time window
+    df = df[select_window(df['time'], start, end)]
+    
     # sort data by correct time
     df = df.sort_values(by='time')
     
+    # remove spikes from hourly data (first data column)
+    df, n_spikes = screen_frame(df, df.select_dtypes('number').columns[0], 'time', screen)
+    
+    # add hourly data (first data column) to climatology cube and quick-look, in the same pass
+    if clim is not None:
+        clim.add(df['time'].values, df[df.select_dtypes('number').columns[0]].values)
+    if quick is not None:
+        quick.add(df['time'].values, df[df.select_dtypes('number').columns[0]].values)
+    
     # resample daily averages
     df_d = df.set_index('time').resample('D').mean().dropna()
+    df_d.attrs['n_spikes'] = n_spikes
                     
     return df_d
 
@@ -96,12 +146,36 @@ def get_data_MOEJ(site, dn):
 stations_all = ['CHE', 'OGA']
 dn = '../../obs_datasets/GEM/CapeHEDO_GEM_2007-2022/' # directory for MOEJ files, change to your path
 do = '../misc_Data/' # directory for outputted daily mean files
+start, end = None, None # time window to load, e.g. '2010-01-01', '2016-01-01' (None for all data)
+screen = None # spike screening of hourly data, e.g. {'window': 25, 'n_mad': 5., 'max_rate': 2.} (None for no screening)
+clim_hourly = False # also save climatology cube of hourly data (hour x month x year) as <site>_clim.npz
+quicklook = False # also save downsampled quick-look series of hourly data (zoom levels) as <site>_quick.npz
+tail_cache = None # directory for offsets/rows of parsed files, to only parse data appended to growing files (None to parse fully)
+
+# select sites of this job when running as a job array (--shard i/N)
+shard = get_shard_arg()
+sizes = [estimate_input_size(get_filenames_MOEJ(dn, station)) for station in stations_all]
+sites_shard = select_shard('MOEJ', stations_all, sizes, shard)
+do_shard = get_output_dir(do, shard)
+report = []
 
 # run loop over sites to load and process data
-for station in stations_all:
+for i, station in enumerate(stations_all):
+    if station not in sites_shard: # processed by another job
+        continue
+    key = get_file_key('MOEJ', station) # output file name, with network if code is shared
+    t_start = time.time()
     print("Loading site: " + station)
+    clim = ClimatologyCube() if clim_hourly else None
+    quick = QuickLook() if quicklook else None
     # get daily data from site
-    df = get_data_MOEJ(station, dn)
+    df = get_data_MOEJ(station, dn, start, end, screen, clim, quick, tail_cache)
     # output csv of daily averages
-    fo = do + station + '_d.csv'
+    fo = do_shard + key + '_d.csv'
     df.to_csv(fo)
+    if clim is not None:
+        clim.save(do_shard + key + '_clim.npz')
+    if quick is not None:
+        quick.save(do_shard + key + '_quick.npz')
+    report.append(report_entry(station, fo, df, sizes[i], t_start))
+write_run_report(do_shard, 'MOEJ', report)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Confidence intervals of the daily, weekly, biweekly, monthly and annual means
+of the site series, from a circular block bootstrap with all resamples of a site
+drawn as one array (or from an analytic interval with autocorrelation)
+@author: arifeinberg
+"""
+#%% Import packages
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import zlib
+import numpy as np
+import pandas as pd
+from scipy import stats
+from export_panel import find_site_files
+from site_reconciliation import load_gem_series
+#%% Functions used for confidence intervals
+# days added to bin start so that labels are centered, as in EMEP convert_time_res
+label_shift = {'D': 0, 'W': 3.5, '2W': 7, 'M': 15, 'A': 182}
+
+def get_bins(times, t_res):
+    """Bin of each time (times sorted), with the centered label of each bin
+
+    Weekly and biweekly bins start on the first day of data, like
+    resample('7D') and resample('14D').
+
+    Parameters
+    ----------
+    times : array
+         Times (datetime64), sorted
+    t_res : string
+         Time resolution of bins ('D', 'W', '2W', 'M' or 'A')
+    """
+    t = np.asarray(times, dtype='datetime64[ns]')
+    day = t.astype('datetime64[D]')
+    if t_res == 'D':
+        start = day
+    elif t_res in ['W', '2W']:
+        width = 7 if t_res == 'W' else 14
+        start = day[0] + ((day - day[0]).astype(int) // width) * width
+    elif t_res == 'M':
+        start = t.astype('datetime64[M]').astype('datetime64[D]')
+    elif t_res == 'A':
+        start = t.astype('datetime64[Y]').astype('datetime64[D]')
+    else:
+        raise ValueError('Unknown time resolution: ' + t_res)
+    bin_idx, bin_start = pd.factorize(start.astype('datetime64[ns]'), sort=True)
+    labels = pd.DatetimeIndex(bin_start) + pd.to_timedelta(label_shift[t_res], unit='D')
+    return bin_idx, labels
+
+def get_block_length(n, block=None):
+    """Block length of each bin (default: n**(1/3), at most n)
+
+    Parameters
+    ----------
+    n : array
+         Number of values of each bin
+    block : int
+         Block length (None for default)
+    """
+    if block is None:
+        return np.maximum(np.rint(np.cbrt(n)), 1).astype(np.int64)
+    return np.maximum(np.minimum(block, n), 1)
+
+def block_bootstrap_means(values, bin_idx, n_bins, n_boot=1000, block=None, rng=None,
+                          chunk=200):
+    """Circular block bootstrap means of each bin, shape (n_boot, n_bins)
+
+    Each resample of a bin joins ceil(n/l) blocks of l consecutive values of
+    the bin, with random starts, the last block cut to n values in total. Blocks wrap around the end of the bin, so
+    all values are equally likely to be drawn (blocks that don't wrap
+    under-sample the ends of the bin, and give too narrow intervals for
+    short bins). The starts of all bins and resamples are drawn as one
+    array, and block sums come from a cumulative sum, so the mean of a
+    resample is a sum of block sums.
+
+    Parameters
+    ----------
+    values : array
+         Values in time order (no NaN), sorted by bin
+    bin_idx : array
+         Bin of each value (0..n_bins-1, non-decreasing)
+    n_bins : int
+         Number of bins
+    n_boot : int
+         Number of resamples
+    block : int
+         Block length (default: n**(1/3) of each bin)
+    rng : Generator
+         Random number generator
+    chunk : int
+         Number of resamples drawn at once (to limit memory)
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    n = np.bincount(bin_idx, minlength=n_bins)
+    first = np.concatenate([[0], np.cumsum(n)[:-1]])
+    l_block = get_block_length(n, block)
+    k_block = -(-n // l_block) # blocks per resample, ceil(n / l)
+    k_block[n == 0] = 0
+    # bin of each block position, and offsets of bins in the blocks
+    block_bin = np.repeat(np.arange(n_bins), k_block)
+    bins_used = np.flatnonzero(k_block > 0)
+    block_first = np.concatenate([[0], np.cumsum(k_block)[:-1]])[bins_used]
+    n_blk, l_blk, first_blk = n[block_bin], l_block[block_bin], first[block_bin]
+    # last block of each resample is cut, so that resamples have n values
+    block_last = np.cumsum(k_block)[bins_used] - 1
+    l_blk[block_last] = (n - (k_block - 1) * l_block)[bins_used]
+    csum = np.concatenate([[0.], np.cumsum(values)])
+
+    means = np.full((n_boot, n_bins), np.nan)
+    for b0 in range(0, n_boot, chunk):
+        n_b = min(chunk, n_boot - b0)
+        starts = (rng.random((n_b, len(block_bin))) * n_blk).astype(np.int64) # in bin
+        ends = starts + l_blk
+        # values until the end of the bin, plus values wrapped to the start of the bin
+        block_sums = csum[first_blk + np.minimum(ends, n_blk)] - csum[first_blk + starts] \
+            + np.where(ends > n_blk, csum[first_blk + np.maximum(ends - n_blk, 0)] - csum[first_blk], 0.)
+        sums = np.add.reduceat(block_sums, block_first, axis=1)
+        means[b0:b0 + n_b, bins_used] = sums / n[bins_used]
+    return means
+
+def analytic_ci(values, bin_idx, n_bins, alpha=0.05):
+    """Student-t interval of the mean of each bin, with n reduced for lag-1 autocorrelation
+
+    Parameters
+    ----------
+    values : array
+         Values in time order (no NaN), sorted by bin
+    bin_idx : array
+         Bin of each value
+    n_bins : int
+         Number of bins
+    alpha : float
+         1 - confidence level
+    """
+    n = np.bincount(bin_idx, minlength=n_bins).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(bin_idx, weights=values, minlength=n_bins) / n
+        anom = values - mean[bin_idx]
+        var = np.bincount(bin_idx, weights=anom**2, minlength=n_bins) / (n - 1)
+        # lag-1 autocorrelation of consecutive values in the same bin
+        bool_same = bin_idx[1:] == bin_idx[:-1]
+        cov1 = np.bincount(bin_idx[1:][bool_same], weights=(anom[1:] * anom[:-1])[bool_same],
+                           minlength=n_bins) / (n - 1)
+        r1 = np.clip(cov1 / var, 0., 0.99)
+        n_eff = np.maximum(n * (1 - r1) / (1 + r1), 2.)
+        half = stats.t.ppf(1 - alpha / 2, n_eff - 1) * np.sqrt(var / n_eff)
+    return mean, mean - half, mean + half
+
+def get_ci(series, t_res_list=('D', 'W', '2W', 'M', 'A'), method='bootstrap', n_boot=1000,
+           block=None, alpha=0.05, min_count=3, seed=0, min_blocks=20):
+    """Means and confidence intervals of one series at several time resolutions
+
+    Bootstrap intervals of bins with few blocks are too narrow (the spread
+    of few block sums underestimates the variance), so bins with fewer than
+    min_blocks blocks get the analytic interval.
+
+    Parameters
+    ----------
+    series : Series
+         Values with datetime index
+    t_res_list : list
+         Time resolutions ('D', 'W', '2W', 'M', 'A')
+    method : string
+         'bootstrap' (percentiles of block bootstrap) or 'analytic'
+    n_boot : int
+         Number of bootstrap resamples
+    block : int
+         Block length (default: n**(1/3) of each bin)
+    alpha : float
+         1 - confidence level
+    min_count : int
+         Minimum number of values in a bin for an interval
+    seed : int or SeedSequence
+         Seed of the random numbers
+    min_blocks : int
+         Minimum number of blocks in a bin for a bootstrap interval
+    """
+    series = series.dropna().sort_index()
+    values = series.values.astype(float)
+    rng = np.random.default_rng(seed)
+    frames = []
+    for t_res in t_res_list:
+        if len(values) == 0:
+            break
+        bin_idx, labels = get_bins(series.index.values, t_res)
+        n_bins = len(labels)
+        n = np.bincount(bin_idx, minlength=n_bins)
+        if method == 'bootstrap':
+            mean = np.bincount(bin_idx, weights=values, minlength=n_bins) / n
+            means = block_bootstrap_means(values, bin_idx, n_bins, n_boot, block, rng)
+            lo, hi = np.quantile(means, [alpha / 2, 1 - alpha / 2], axis=0)
+            bool_few = n < min_blocks * get_block_length(n, block)
+            if bool_few.any(): # analytic interval for bins with few blocks
+                _, lo_a, hi_a = analytic_ci(values, bin_idx, n_bins, alpha)
+                lo[bool_few], hi[bool_few] = lo_a[bool_few], hi_a[bool_few]
+        elif method == 'analytic':
+            mean, lo, hi = analytic_ci(values, bin_idx, n_bins, alpha)
+        else:
+            raise ValueError('Unknown method: ' + method)
+        lo[n < min_count], hi[n < min_count] = np.nan, np.nan
+        frames.append(pd.DataFrame({'t_res': t_res, 'time': labels, 'n': n,
+                                    'mean': mean, 'lo': lo, 'hi': hi}))
+    if len(frames) == 0:
+        return pd.DataFrame(columns=['t_res', 'time', 'n', 'mean', 'lo', 'hi'])
+    return pd.concat(frames, ignore_index=True)
+
+def site_seed(seed, site):
+    """Seed of a site, independent of the order and sharding of sites"""
+    return np.random.SeedSequence([seed, zlib.crc32(site.encode('utf-8'))])
+
+def ci_all(series_dict, n_workers=None, seed=0, **kwargs):
+    """Means and confidence intervals of all sites, in parallel processes
+
+    Parameters
+    ----------
+    series_dict : dict
+         Site -> Series with datetime index
+    n_workers : int
+         Number of processes (default: number of CPUs)
+    seed : int
+         Seed of the random numbers (each site gets its own stream)
+    kwargs : dict
+         Options of get_ci
+    """
+    sites = list(series_dict)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(get_ci, series_dict[s], seed=site_seed(seed, s), **kwargs)
+                   for s in sites]
+        results = [f.result() for f in futures]
+    return pd.concat([df.assign(site=s) for s, df in zip(sites, results)], ignore_index=True)
+
+#%% Confidence intervals of all outputted sites
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Confidence intervals of the outputted site series')
+    parser.add_argument('--do', default='../misc_Data/') # directory of outputted files, change to your path
+    parser.add_argument('--fo', default='../misc_Data/ci_TGM.csv')
+    parser.add_argument('--res', default='d') # resolution of input files, finer than t_res
+    parser.add_argument('--t-res', nargs='+', default=['W', '2W', 'M', 'A'])
+    parser.add_argument('--method', choices=['bootstrap', 'analytic'], default='bootstrap')
+    parser.add_argument('--n-boot', type=int, default=1000)
+    parser.add_argument('--block', type=int, default=None)
+    parser.add_argument('--min-blocks', type=int, default=20) # fewer blocks in bin: analytic interval
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    site_files = find_site_files(args.do, args.res)
+    series_dict = {site: load_gem_series(fn) for site, fn in site_files.items()}
+    df_ci = ci_all(series_dict, args.workers, args.seed, t_res_list=args.t_res,
+                   method=args.method, n_boot=args.n_boot, block=args.block,
+                   min_blocks=args.min_blocks)
+    df_ci[['site', 't_res', 'time', 'n', 'mean', 'lo', 'hi']].to_csv(args.fo, index=False)
+    print('Confidence intervals of %d sites saved to %s' % (len(series_dict), args.fo))
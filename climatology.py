@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Diurnal and seasonal climatologies of hourly data, accumulated as sums and
+counts in a (year x month x hour) cube during the same pass as the daily means
+@author: arifeinberg
+"""
+#%% Import packages
+import numpy as np
+import pandas as pd
+#%% Climatology class
+class ClimatologyCube:
+    """Sums and counts of hourly values by (year, month, hour of day), hours in UTC
+
+    Parameters
+    ----------
+    year0 : int
+         First year of the cube (extended when earlier or later data are added)
+    n_years : int
+         Number of years of the cube (0 for an empty cube)
+    """
+
+    def __init__(self, year0=0, n_years=0):
+        self.year0 = year0
+        self.sums = np.zeros((n_years, 12, 24))
+        self.counts = np.zeros((n_years, 12, 24), dtype=np.int64)
+
+    @property
+    def years(self):
+        return np.arange(self.year0, self.year0 + self.sums.shape[0])
+
+    def extend(self, year_min, year_max):
+        """Extend the cube to cover the years year_min..year_max"""
+        if self.sums.shape[0] > 0: # keep years already in cube
+            year_min = min(year_min, self.year0)
+            year_max = max(year_max, self.year0 + self.sums.shape[0] - 1)
+        n_years = year_max - year_min + 1
+        if (year_min == self.year0) and (n_years == self.sums.shape[0]):
+            return
+        i0 = self.year0 - year_min
+        sums = np.zeros((n_years, 12, 24))
+        counts = np.zeros((n_years, 12, 24), dtype=np.int64)
+        sums[i0:i0 + self.sums.shape[0]] = self.sums
+        counts[i0:i0 + self.counts.shape[0]] = self.counts
+        self.year0, self.sums, self.counts = year_min, sums, counts
+
+    def add(self, times, values):
+        """Add hourly values to the cube, with one bincount
+
+        Parameters
+        ----------
+        times : array
+             Times (datetime64, UTC)
+        values : array
+             Values (NaN are skipped)
+        """
+        values = np.asarray(values, dtype=float)
+        bool_valid = ~np.isnan(values)
+        if not bool_valid.any():
+            return
+        t = np.asarray(times, dtype='datetime64[ns]')[bool_valid]
+        values = values[bool_valid]
+        year = t.astype('datetime64[Y]').astype(int) + 1970
+        month = t.astype('datetime64[M]').astype(int) % 12
+        hour = (t - t.astype('datetime64[D]')).astype('timedelta64[h]').astype(int)
+        self.extend(int(year.min()), int(year.max()))
+
+        # flat index in the cube
+        idx = ((year - self.year0) * 12 + month) * 24 + hour
+        size = self.sums.size
+        self.sums += np.bincount(idx, weights=values, minlength=size).reshape(self.sums.shape)
+        self.counts += np.bincount(idx, minlength=size).reshape(self.counts.shape)
+
+    def add_cube(self, other):
+        """Add the sums and counts of another cube (e.g. of another file or job)"""
+        if other.sums.shape[0] == 0:
+            return
+        self.extend(other.year0, other.year0 + other.sums.shape[0] - 1)
+        i0 = other.year0 - self.year0
+        self.sums[i0:i0 + other.sums.shape[0]] += other.sums
+        self.counts[i0:i0 + other.counts.shape[0]] += other.counts
+
+    def mean(self):
+        """Mean of each (year, month, hour), NaN without data"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.counts > 0, self.sums / self.counts, np.nan)
+
+    def month_hour(self, min_count=1):
+        """Month x hour climatology over all years, shape (12, 24)
+
+        Parameters
+        ----------
+        min_count : int
+             Minimum number of values for a month and hour
+        """
+        counts = self.counts.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts >= max(min_count, 1), self.sums.sum(axis=0) / counts, np.nan)
+
+    def diurnal(self, months=None):
+        """Mean diurnal cycle (24 hours) over all years
+
+        Parameters
+        ----------
+        months : list
+             Months (1-12) to use, e.g. [6, 7, 8] (None for all)
+        """
+        sel = slice(None) if months is None else np.asarray(months) - 1
+        counts = self.counts[:, sel].sum(axis=(0, 1))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, self.sums[:, sel].sum(axis=(0, 1)) / counts, np.nan)
+
+    def seasonal(self):
+        """Mean seasonal cycle (12 months) over all years and hours"""
+        counts = self.counts.sum(axis=(0, 2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, self.sums.sum(axis=(0, 2)) / counts, np.nan)
+
+    def anomalies(self):
+        """Anomaly of each (year, month, hour) from the month x hour climatology"""
+        return self.mean() - self.month_hour()[None, :, :]
+
+    def to_frame(self):
+        """Long-format table of year, month, hour, count, mean and anomaly"""
+        year, month, hour = np.meshgrid(self.years, np.arange(1, 13), np.arange(24),
+                                        indexing='ij')
+        df = pd.DataFrame({'year': year.ravel(), 'month': month.ravel(), 'hour': hour.ravel(),
+                           'count': self.counts.ravel(), 'mean': self.mean().ravel(),
+                           'anomaly': self.anomalies().ravel()})
+        return df[df['count'] > 0].reset_index(drop=True)
+
+    def save(self, fo):
+        """Save sums and counts to a .npz file"""
+        np.savez_compressed(fo, year0=self.year0, sums=self.sums, counts=self.counts)
+
+    @classmethod
+    def load(cls, fn):
+        """Load a cube saved with save"""
+        with np.load(fn) as data:
+            cube = cls(int(data['year0']), data['sums'].shape[0])
+            cube.sums[:] = data['sums']
+            cube.counts[:] = data['counts']
+        return cube
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Sample gridded model output at the observation sites and times, to make a
+paired obs/model table for model evaluation
+@author: arifeinberg
+"""
+#%% Import packages
+import numpy as np
+import pandas as pd
+from netCDF4 import Dataset, num2date
+from scipy.spatial import cKDTree
+from site_registry import lonlat_to_xyz
+#%% Functions used for collocation
+def get_lon_spacing(lon_grid):
+    """Longitude spacing of a regular grid, and whether the grid covers all longitudes
+
+    Parameters
+    ----------
+    lon_grid : array
+         Longitudes of grid (1D, increasing)
+    """
+    dlon = (lon_grid[-1] - lon_grid[0]) / (len(lon_grid) - 1) if len(lon_grid) > 1 else 360.
+    return dlon, len(lon_grid) * dlon >= 360. - 1e-6
+
+def get_outside_domain(lat_grid, lon_grid, site_lat, site_lon, dist_nearest=None):
+    """Check which sites are outside the domain of the grid (regional grids)
+
+    Regular grids cover their cells (half a grid spacing beyond the first and
+    last grid points), and all longitudes if they span 360 degrees. Sites are
+    outside a curvilinear grid if the nearest grid point is further than the
+    largest spacing between neighbouring grid points.
+
+    Parameters
+    ----------
+    lat_grid : array
+         Latitudes of grid (1D for regular grids, 2D for curvilinear grids)
+    lon_grid : array
+         Longitudes of grid (same shape as lat_grid)
+    site_lat : array
+         Latitudes of sites
+    site_lon : array
+         Longitudes of sites
+    dist_nearest : array
+         Chord distance of each site to the nearest grid point (curvilinear grids)
+    """
+    if np.ndim(lat_grid) == 1:
+        dlat = np.abs(lat_grid[-1] - lat_grid[0]) / max(len(lat_grid) - 1, 1)
+        bool_out = (site_lat < np.min(lat_grid) - dlat / 2) | \
+            (site_lat > np.max(lat_grid) + dlat / 2)
+        dlon, bool_periodic = get_lon_spacing(lon_grid)
+        if not bool_periodic: # distance east of the western edge of the grid
+            lon_rel = np.mod(site_lon - (lon_grid[0] - dlon / 2), 360.)
+            bool_out |= lon_rel > len(lon_grid) * dlon
+        return bool_out
+    xyz = lonlat_to_xyz(np.ravel(lon_grid), np.ravel(lat_grid)).reshape(np.shape(lat_grid) + (3,))
+    spacing = max(np.max(np.linalg.norm(np.diff(xyz, axis=0), axis=-1)),
+                  np.max(np.linalg.norm(np.diff(xyz, axis=1), axis=-1)))
+    return dist_nearest > spacing
+
+def get_grid_weights(lat_grid, lon_grid, site_lat, site_lon, method='nearest'):
+    """Find the grid cells and weights used for each site, computed once for all times
+
+    Returns flat grid indices and weights, both of shape (n_site, k). Sites
+    outside the domain of a regional grid get NaN weights.
+
+    Parameters
+    ----------
+    lat_grid : array
+         Latitudes of grid (1D for regular grids, 2D for curvilinear grids)
+    lon_grid : array
+         Longitudes of grid (same shape as lat_grid)
+    site_lat : array
+         Latitudes of sites
+    site_lon : array
+         Longitudes of sites
+    method : string
+         'nearest' (nearest cell), 'idw' (inverse distance of 4 nearest cells)
+         or 'bilinear' (regular grids only)
+    """
+    site_lat = np.asarray(site_lat, dtype=float)
+    site_lon = np.asarray(site_lon, dtype=float)
+
+    if method == 'bilinear':
+        if (np.ndim(lat_grid) != 1) or (np.ndim(lon_grid) != 1):
+            raise ValueError('Bilinear interpolation needs a regular (1D lat/lon) grid')
+        return get_bilinear_weights(np.asarray(lat_grid, dtype=float),
+                                    np.asarray(lon_grid, dtype=float), site_lat, site_lon)
+
+    if np.ndim(lat_grid) == 1: # regular grid, make 2D
+        lon_2d, lat_2d = np.meshgrid(lon_grid, lat_grid)
+    else:
+        lon_2d, lat_2d = lon_grid, lat_grid
+    # spatial index over all grid points on the unit sphere
+    tree = cKDTree(lonlat_to_xyz(lon_2d.ravel(), lat_2d.ravel()))
+    k = 1 if method == 'nearest' else 4
+    dist, idx = tree.query(lonlat_to_xyz(site_lon, site_lat), k=k)
+    dist, idx = dist.reshape(len(site_lat), k), idx.reshape(len(site_lat), k)
+
+    if method == 'nearest':
+        weights = np.ones((len(site_lat), 1))
+    elif method == 'idw':
+        weights = (1. / np.maximum(dist, 1e-12)) # site exactly on a grid point
+        weights = weights / np.sum(weights, axis=1, keepdims=True)
+    else:
+        raise ValueError('Unknown interpolation method: ' + method)
+    bool_out = get_outside_domain(lat_grid, lon_grid, site_lat, site_lon, dist[:, 0])
+    weights[bool_out] = np.nan
+    return idx, weights
+
+def get_bilinear_weights(lat_grid, lon_grid, site_lat, site_lon):
+    """Bilinear weights of the 4 surrounding cells on a regular grid
+
+    Parameters
+    ----------
+    lat_grid : array
+         Latitudes of grid (1D, increasing or decreasing, e.g. stored N to S)
+    lon_grid : array
+         Longitudes of grid (1D, increasing, global or regional)
+    site_lat : array
+         Latitudes of sites
+    site_lon : array
+         Longitudes of sites
+    """
+    n_lat, n_lon = len(lat_grid), len(lon_grid)
+    dlon, bool_periodic = get_lon_spacing(lon_grid)
+    # latitude: search in increasing order, clip to grid edges (sites poleward of the last grid center)
+    bool_desc = lat_grid[0] > lat_grid[-1]
+    lat_inc = lat_grid[::-1] if bool_desc else lat_grid
+    j1 = np.clip(np.searchsorted(lat_inc, site_lat), 1, n_lat - 1)
+    j0 = j1 - 1
+    w_lat = np.clip((site_lat - lat_inc[j0]) / (lat_inc[j1] - lat_inc[j0]), 0., 1.)
+    if bool_desc: # indices in the order of the grid
+        j0, j1 = n_lat - 1 - j0, n_lat - 1 - j1
+    if bool_periodic: # global grid, wrap site into range of grid (site on a grid point is in the cell east of it)
+        lon_site = lon_grid[0] + np.mod(site_lon - lon_grid[0], 360.)
+        i1 = np.searchsorted(lon_grid, lon_site, side='right')
+        i0 = i1 - 1
+        lon_1 = np.where(i1 == n_lon, lon_grid[0] + 360., lon_grid[np.minimum(i1, n_lon - 1)])
+        w_lon = (lon_site - lon_grid[i0]) / (lon_1 - lon_grid[i0])
+        i1 = np.mod(i1, n_lon)
+    else: # regional grid, clip to edges like latitude (sites outside the domain get NaN below)
+        lon_site = lon_grid[0] - dlon / 2 + np.mod(site_lon - (lon_grid[0] - dlon / 2), 360.)
+        i1 = np.clip(np.searchsorted(lon_grid, lon_site, side='right'), 1, max(n_lon - 1, 1))
+        i0 = i1 - 1
+        w_lon = np.clip((lon_site - lon_grid[i0]) / (lon_grid[i1] - lon_grid[i0]), 0., 1.)
+
+    idx = np.column_stack([j0 * n_lon + i0, j0 * n_lon + i1,
+                           j1 * n_lon + i0, j1 * n_lon + i1])
+    weights = np.column_stack([(1 - w_lat) * (1 - w_lon), (1 - w_lat) * w_lon,
+                               w_lat * (1 - w_lon), w_lat * w_lon])
+    weights[get_outside_domain(lat_grid, lon_grid, site_lat, site_lon)] = np.nan
+    return idx, weights
+
+def match_times(model_times, obs_times, time_match='nearest', tolerance=None):
+    """Find the model time step for each observation time (-1 if no match)
+
+    Parameters
+    ----------
+    model_times : array
+         Model times (datetime64, sorted)
+    obs_times : array
+         Observation times (datetime64)
+    time_match : string
+         'nearest' (closest model time) or 'asof' (last model time before the observation)
+    tolerance : string or Timedelta
+         Maximum time difference for a match (None for no limit)
+    """
+    t_model = np.asarray(model_times, dtype='datetime64[ns]').astype('int64')
+    t_obs = np.asarray(obs_times, dtype='datetime64[ns]').astype('int64')
+
+    if time_match == 'asof':
+        it = np.searchsorted(t_model, t_obs, side='right') - 1
+    elif time_match == 'nearest':
+        i1 = np.clip(np.searchsorted(t_model, t_obs), 0, len(t_model) - 1)
+        i0 = np.clip(i1 - 1, 0, len(t_model) - 1)
+        it = np.where(np.abs(t_obs - t_model[i0]) <= np.abs(t_model[i1] - t_obs), i0, i1)
+    else:
+        raise ValueError('Unknown time matching: ' + time_match)
+
+    if tolerance is not None:
+        dt = np.abs(t_obs - t_model[np.maximum(it, 0)])
+        it = np.where(dt <= pd.Timedelta(tolerance).value, it, -1)
+    return it
+
+def find_coord_name(nc, names):
+    """Return the first of the names that is a variable in the NetCDF file
+
+    Parameters
+    ----------
+    nc : Dataset
+         NetCDF file
+    names : list
+         Possible variable names
+    """
+    for name in names:
+        if name in nc.variables:
+            return name
+    raise KeyError('None of the coordinates found: ' + str(names))
+
+def collocate(df_obs, fn_model, var, site_coords, method='nearest', time_match='nearest',
+              tolerance=None, level=0, block_size=500):
+    """Pair each observation with the model field at the site and time
+
+    Grid weights are computed once per site, and model time steps are read
+    in blocks, with all sites extracted from a block with one gather.
+    Observations of sites outside the domain of a regional grid are dropped.
+
+    Parameters
+    ----------
+    df_obs : DataFrame
+         Observations in long format, time index and 'site' column (e.g. ObsStore.query)
+    fn_model : string
+         NetCDF file of model output
+    var : string
+         Model variable name, with dimensions (time, [level,] lat, lon)
+    site_coords : dict
+         Site -> (latitude, longitude, ...), e.g. ObsStore.coords() (also for file
+         keys of shared site codes, e.g. EMEP_PAL)
+    method : string
+         Horizontal interpolation: 'nearest', 'idw' or 'bilinear'
+    time_match : string
+         'nearest' or 'asof'
+    tolerance : string or Timedelta
+         Maximum time difference for a match (None for no limit)
+    level : int
+         Vertical level index, for fields with a level dimension
+    block_size : int
+         Number of model time steps read at once
+    """
+    nc = Dataset(fn_model, 'r')
+    try:
+        lat_grid = nc[find_coord_name(nc, ['lat', 'latitude', 'nav_lat'])][:]
+        lon_grid = nc[find_coord_name(nc, ['lon', 'longitude', 'nav_lon'])][:]
+        v_time = nc[find_coord_name(nc, ['time', 'Time'])]
+        model_times = pd.to_datetime([str(t) for t in
+                                      num2date(v_time[:], v_time.units,
+                                               getattr(v_time, 'calendar', 'standard'))])
+        v_field = nc[var]
+
+        # grid cells and weights of each site
+        sites = pd.unique(df_obs['site'])
+        missing = [s for s in sites if s not in site_coords]
+        if len(missing) > 0:
+            raise KeyError('No coordinates for sites: ' + str(missing))
+        site_lat = np.array([site_coords[s][0] for s in sites])
+        site_lon = np.array([site_coords[s][1] for s in sites])
+        idx, weights = get_grid_weights(np.asarray(lat_grid), np.asarray(lon_grid),
+                                        site_lat, site_lon, method)
+
+        # drop observations of sites outside the domain of a regional grid
+        bool_out = np.isnan(weights[:, 0])
+        if bool_out.any():
+            print('Sites outside the model domain: ' + ', '.join(sites[bool_out]))
+            df_obs = df_obs[~df_obs['site'].isin(sites[bool_out])]
+            sites, idx, weights = sites[~bool_out], idx[~bool_out], weights[~bool_out]
+
+        # site and model time of each observation
+        site_pos = pd.Index(sites).get_indexer(df_obs['site'])
+        it = match_times(model_times.values, df_obs.index.values, time_match, tolerance)
+        it_u, it_inv = np.unique(it[it >= 0], return_inverse=True)
+        model_val = np.full(len(df_obs), np.nan)
+        rows_valid = np.flatnonzero(it >= 0)
+
+        # read needed time steps in blocks, and gather all sites at once
+        for b0 in range(0, len(it_u), block_size):
+            t_block = it_u[b0:b0 + block_size]
+            if v_field.ndim == 4: # (time, level, lat, lon)
+                field = v_field[t_block, level, ...]
+            else: # (time, lat, lon)
+                field = v_field[t_block, ...]
+            field = np.ma.filled(np.ma.asarray(field, dtype=float), np.nan)
+            field = field.reshape(len(t_block), -1)
+            site_val = np.sum(field[:, idx] * weights[None, :, :], axis=2) # (time, site)
+
+            bool_block = (it_inv >= b0) & (it_inv < b0 + len(t_block))
+            rows = rows_valid[bool_block]
+            model_val[rows] = site_val[it_inv[bool_block] - b0, site_pos[rows]]
+    finally:
+        nc.close()
+
+    df_pair = df_obs.copy()
+    df_pair['model_time'] = np.where(it >= 0, model_times.values[np.maximum(it, 0)],
+                                     np.datetime64('NaT'))
+    df_pair['model'] = model_val
+    return df_pair
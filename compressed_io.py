@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Read data files directly from compressed files (.gz, .bz2, .xz, .zst) and from
+members of zip bundles (path/bundle.zip/member), decompressing while reading
+@author: arifeinberg
+"""
+#%% Import packages
+import bz2
+import fnmatch
+import glob
+import gzip
+import io
+import lzma
+import os
+import zipfile
+import pandas as pd
+#%% Functions used for compressed files
+compressed_ext = ['.gz', '.bz2', '.xz', '.zst']
+
+def split_zip_path(fn):
+    """Split a path of the form bundle.zip/member into (bundle, member), (None, None) otherwise
+
+    Parameters
+    ----------
+    fn : string
+         Filename
+    """
+    parts = fn.replace(os.sep, '/').split('/')
+    for i, part in enumerate(parts[:-1]):
+        if part.lower().endswith('.zip'):
+            return os.sep.join(parts[:i + 1]), '/'.join(parts[i + 1:])
+    return None, None
+
+def strip_compression(fn):
+    """Filename without compression extension (member name for zip members)
+
+    Parameters
+    ----------
+    fn : string
+         Filename
+    """
+    for ext in compressed_ext:
+        if fn.endswith(ext):
+            return fn[:-len(ext)]
+    return fn
+
+def is_compressed(fn):
+    """Check whether a file is compressed or a zip member"""
+    return (strip_compression(fn) != fn) or (split_zip_path(fn)[0] is not None)
+
+def open_any(fn, mode='r', encoding=None):
+    """Open a plain file, compressed file or zip member, decompressing while reading
+
+    Parameters
+    ----------
+    fn : string
+         Filename (bundle.zip/member for zip members)
+    mode : string
+         'r' (text) or 'rb' (binary)
+    encoding : string
+         Encoding in text mode
+    """
+    fn_zip, member = split_zip_path(fn)
+    if fn_zip is not None:
+        f = zipfile.ZipFile(fn_zip).open(member) # archive closes with the member
+    elif fn.endswith('.gz'):
+        f = gzip.open(fn, 'rb')
+    elif fn.endswith('.bz2'):
+        f = bz2.open(fn, 'rb')
+    elif fn.endswith('.xz'):
+        f = lzma.open(fn, 'rb')
+    elif fn.endswith('.zst'):
+        import zstandard # only needed for zstd files
+        f = zstandard.ZstdDecompressor().stream_reader(open(fn, 'rb'), closefd=True)
+    else:
+        f = open(fn, 'rb')
+    if mode == 'rb':
+        return f
+    return io.TextIOWrapper(io.BufferedReader(f) if fn.endswith('.zst') else f,
+                            encoding=encoding)
+
+def read_csv_any(fn, **kw):
+    """pd.read_csv of a plain file, compressed file or zip member, in a single pass
+
+    Parameters
+    ----------
+    fn : string
+         Filename
+    kw : dict
+         Options of pd.read_csv
+    """
+    if not is_compressed(fn):
+        return pd.read_csv(fn, **kw)
+    with open_any(fn, 'rb') as f:
+        return pd.read_csv(f, **kw)
+
+def match_path(fn, pattern, recursive=False):
+    """Match a path against a glob pattern one component at a time, so that *
+    does not match across directories (as in glob, unlike fnmatch)
+
+    Parameters
+    ----------
+    fn : string
+         Path
+    pattern : string
+         Glob pattern
+    recursive : bool
+         Allow ** in pattern to match any number of directories
+    """
+    parts = os.path.normpath(fn).replace(os.sep, '/').split('/')
+    parts_p = os.path.normpath(pattern).replace(os.sep, '/').split('/')
+
+    def match(i, j):
+        if j == len(parts_p):
+            return i == len(parts)
+        if recursive and (parts_p[j] == '**'): # zero or more directories
+            return any(match(k, j + 1) for k in range(i, len(parts) + 1))
+        return (i < len(parts)) and fnmatch.fnmatchcase(parts[i], parts_p[j]) and \
+            match(i + 1, j + 1)
+    return match(0, 0)
+
+def glob_any(pattern, recursive=False):
+    """Files matching a pattern, also compressed (pattern + .gz, ...) and members of zip bundles
+
+    Zip members are matched against the pattern as if the bundle was a
+    directory, or as if its members were in the directory of the bundle.
+    If a file is found both plain and compressed, only the plain file is kept.
+
+    Parameters
+    ----------
+    pattern : string
+         Glob pattern
+    recursive : bool
+         Allow ** in pattern
+    """
+    found = {} # name without compression -> file
+    for ext in [''] + compressed_ext:
+        for f in glob.glob(pattern + ext, recursive=recursive):
+            found.setdefault(strip_compression(f), f)
+    # members of zip bundles in the directory of the pattern (or above it)
+    dn_pattern, base_pattern = os.path.split(pattern)
+    zip_patterns = [os.path.join(dn_pattern, '*.zip'), dn_pattern + '.zip']
+    if recursive:
+        zip_patterns.append(os.path.join(dn_pattern, '**', '*.zip'))
+    for fn_zip in sorted(set(f for p in zip_patterns for f in glob.glob(p, recursive=recursive))):
+        with zipfile.ZipFile(fn_zip) as zf:
+            members = [m for m in zf.namelist() if not m.endswith('/')]
+        for member in members:
+            fn = os.path.join(fn_zip, member)
+            # match as member of a directory named like the bundle, or next to the bundle
+            fn_dir = os.path.join(os.path.dirname(fn_zip), member)
+            if match_path(strip_compression(fn_dir), pattern, recursive) or \
+               match_path(strip_compression(os.path.join(fn_zip[:-len('.zip')], member)),
+                          pattern, recursive):
+                found.setdefault(strip_compression(fn_dir), fn)
+    return sorted(found.values())
+
+def find_any(fn):
+    """File itself, or its compressed version or zip member if only that exists
+
+    Parameters
+    ----------
+    fn : string
+         Filename (without compression extension)
+    """
+    if os.path.exists(fn):
+        return fn
+    found = glob_any(glob.escape(fn))
+    return found[0] if len(found) > 0 else fn # not found, error when reading
+
+def stat_any(fn):
+    """Size (bytes, compressed) and modification time of a file or zip member
+
+    Parameters
+    ----------
+    fn : string
+         Filename
+    """
+    fn_zip, member = split_zip_path(fn)
+    if fn_zip is None:
+        return os.path.getsize(fn), os.path.getmtime(fn)
+    with zipfile.ZipFile(fn_zip) as zf:
+        return zf.getinfo(member).compress_size, os.path.getmtime(fn_zip)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Combine the outputted site files of all networks into one (time x site) panel
+per variable, written as a chunked and compressed NetCDF file
+@author: arifeinberg
+"""
+#%% Import packages
+import argparse
+import glob
+import os
+import numpy as np
+import pandas as pd
+from shard_batch import read_run_outputs, read_site_codes, read_site_networks
+from site_registry import SiteRegistry
+#%% Functions used for the panel
+# columns in the site files for each panel variable, with the species they measure
+panel_vars = {'GEM_TGM': [('GEM', 'GEM'), ('TGM', 'TGM'), ('Hg_Gaseous_ngm3', 'TGM'),
+                          ('value', 'GEM')],
+              'RGM': [('RGM_pg_m3', 'RGM'), ('RGM (pgm-3)', 'RGM'), ('GOM', 'GOM')],
+              'PHg': [('PHg_pg_m3', 'PHg'), ('Hg(p) (pgm-3)', 'PHg'), ('PBM', 'PBM')]}
+
+panel_units = {'GEM_TGM': 'ng m-3', 'RGM': 'pg m-3', 'PHg': 'pg m-3'}
+
+def find_site_files(do, res):
+    """Return the output file of each site at the time resolution
+
+    Parameters
+    ----------
+    do : string
+         Directory of outputted site files
+    res : string
+         Time resolution in file names ('d', 'w', '2w', 'm')
+    """
+    site_files = {}
+    for f in sorted(glob.glob(os.path.join(do, '*_' + res + '.csv'))):
+        fn = os.path.basename(f)
+        if fn.startswith('run_report_'):
+            continue
+        site_files[fn[:-len('_' + res + '.csv')]] = f
+    return site_files
+
+def find_network_site_files(do, res):
+    """Return the output file of each (network, site) at the time resolution,
+    from the run reports (site codes used by several networks have one file
+    per network, see shard_batch.get_file_key)
+
+    Parameters
+    ----------
+    do : string
+         Directory of outputted site files
+    res : string
+         Time resolution in file names ('d', 'w', '2w', 'm')
+    """
+    df_outputs = read_run_outputs(do)
+    site_files = {}
+    for row in df_outputs.itertuples(index=False):
+        f = os.path.join(do, row.output)
+        if row.output.endswith('_' + res + '.csv') and os.path.exists(f):
+            site_files[(row.network, row.site)] = f
+    return site_files
+
+def get_time_range(fn):
+    """Return first and last time of a site file, without reading all of it
+
+    Parameters
+    ----------
+    fn : string
+         Filename (sorted by time in first column)
+    """
+    with open(fn, 'rb') as f:
+        f.readline() # column names
+        first = f.readline()
+        # read last line from the end of the file
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        block = b''
+        while pos > 0 and block.count(b'\n') < 2:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step) + block
+        last = block.strip().split(b'\n')[-1]
+    if not first.strip(): # no data
+        return None, None
+    t_first = pd.Timestamp(first.split(b',')[0].decode()).floor('D')
+    t_last = pd.Timestamp(last.split(b',')[0].decode()).floor('D')
+    return t_first, t_last
+
+def get_time_axis(fns, res):
+    """Return the common time axis of the site files
+
+    All days between the first and last time for daily files, and the union
+    of the time stamps (floored to days) of the files for coarser resolutions,
+    whose time stamps differ between sites (e.g. weekly bins starting on the
+    first day of data).
+
+    Parameters
+    ----------
+    fns : list
+         Filenames
+    res : string
+         Time resolution in file names ('d', 'w', '2w', 'm')
+    """
+    if res == 'd':
+        ranges = [get_time_range(fn) for fn in fns]
+        t_first = min(r[0] for r in ranges if r[0] is not None)
+        t_last = max(r[1] for r in ranges if r[1] is not None)
+        return pd.date_range(t_first, t_last, freq='D')
+    times = [pd.DatetimeIndex(pd.read_csv(fn, usecols=[0]).iloc[:, 0]).floor('D').values
+             for fn in fns]
+    return pd.DatetimeIndex(np.unique(np.concatenate(times)))
+
+def read_site_variables(fn):
+    """Read the panel variables of a site file, at daily time stamps
+
+    Parameters
+    ----------
+    fn : string
+         Filename
+    """
+    df = pd.read_csv(fn, index_col=0, parse_dates=True)
+    if 'target' in df.columns: # GMOS sites with both GEM and TGM, use GEM
+        df = df[df['target'] == 'GEM'].drop(columns='target')
+    df.index = pd.DatetimeIndex(df.index).floor('D')
+
+    site_vars = {}
+    for var in panel_vars:
+        for col, species in panel_vars[var]:
+            if col in df.columns:
+                site_vars[var] = (df[col].groupby(level=0).mean(), species)
+                break
+    # files with a single unnamed concentration column (e.g. MHD, MOEJ)
+    if 'GEM_TGM' not in site_vars:
+        cols_num = df.select_dtypes('number').columns
+        if len(cols_num) == 1:
+            site_vars['GEM_TGM'] = (df[cols_num[0]].groupby(level=0).mean(), 'Hg0')
+        else:
+            print('No GEM/TGM column found in: ' + fn)
+    return site_vars
+
+def export_panel(do, fo, res='d', site_coords=None, chunk_time=1461, chunk_site=32):
+    """Write all site files of a time resolution to a (time x site) NetCDF panel
+
+    Sites are read and written in blocks of chunk_site sites, so only one
+    block of sites is in memory at a time.
+
+    Parameters
+    ----------
+    do : string
+         Directory of outputted site files
+    fo : string
+         Output NetCDF file name
+    res : string
+         Time resolution in file names ('d', 'w', '2w', 'm')
+    site_coords : dict
+         Site (file key) -> (latitude, longitude, elevation), default from site registry
+    chunk_time : int
+         Chunk size along time (time steps)
+    chunk_site : int
+         Chunk size along sites
+    """
+    from netCDF4 import Dataset # only needed for writing the panel
+
+    site_files = find_site_files(do, res)
+    site_networks = read_site_networks(do)
+    sites = list(site_files)
+    if len(sites) == 0:
+        raise FileNotFoundError('No site files found in ' + do)
+    if site_coords is None:
+        site_coords = SiteRegistry().output_coords(read_site_codes(do))
+
+    # common time axis at the resolution of the files
+    time = get_time_axis([site_files[s] for s in sites], res)
+    n_time, n_site = len(time), len(sites)
+
+    nc = Dataset(fo, 'w', format='NETCDF4')
+    nc.title = 'Hg observations of all networks, (time x site) panel'
+    nc.time_resolution = res
+    nc.createDimension('time', n_time)
+    nc.createDimension('site', n_site)
+
+    v_time = nc.createVariable('time', 'i4', ('time',))
+    v_time.units = 'days since 1970-01-01 00:00:00'
+    v_time.calendar = 'standard'
+    v_time[:] = (time - pd.Timestamp('1970-01-01')).days.values
+
+    v_site = nc.createVariable('site', str, ('site',))
+    v_network = nc.createVariable('network', str, ('site',))
+    for j, s in enumerate(sites):
+        v_site[j] = s
+        v_network[j] = site_networks.get(s, 'unknown')
+
+    for name, units, k in [('lat', 'degrees_north', 0), ('lon', 'degrees_east', 1),
+                           ('elevation', 'm', 2)]:
+        v = nc.createVariable(name, 'f4', ('site',), fill_value=np.nan)
+        v.units = units
+        v[:] = np.array([site_coords.get(s, (np.nan,) * 3)[k] for s in sites], dtype='f4')
+
+    chunks = (min(chunk_time, n_time), min(chunk_site, n_site))
+    v_data = {}
+    v_species = {}
+    for var in panel_vars:
+        v = nc.createVariable(var, 'f4', ('time', 'site'), fill_value=np.nan,
+                              zlib=True, complevel=4, shuffle=True, chunksizes=chunks)
+        v.units = panel_units[var]
+        v.coordinates = 'lat lon'
+        v_data[var] = v
+        v_species[var] = nc.createVariable(var + '_species', str, ('site',))
+
+    # write blocks of sites, aligned with chunks
+    for j0 in range(0, n_site, chunks[1]):
+        j1 = min(j0 + chunks[1], n_site)
+        block = {var: np.full((n_time, j1 - j0), np.nan, dtype='f4') for var in panel_vars}
+        for j in range(j0, j1):
+            print('Adding site: ' + sites[j])
+            site_vars = read_site_variables(site_files[sites[j]])
+            for var in site_vars:
+                values, species = site_vars[var]
+                inds = time.get_indexer(values.index) # position on time axis
+                block[var][inds, j - j0] = values.values
+                v_species[var][j] = species
+        for var in panel_vars:
+            v_data[var][:, j0:j1] = block[var]
+    nc.close()
+    return fo
+
+#%% Export the panel
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export (time x site) panel')
+    parser.add_argument('--do', default='../misc_Data/') # directory of outputted site files
+    parser.add_argument('--fo', default=None) # default: <do>/Hg_obs_panel_<res>.nc
+    parser.add_argument('--res', default='d')
+    args = parser.parse_args()
+
+    fo = args.fo if args.fo is not None else \
+        os.path.join(args.do, 'Hg_obs_panel_' + args.res + '.nc')
+    export_panel(args.do, fo, args.res)
+    print('Panel saved to ' + fo)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Average the observations of all sites onto the cells of a model grid, with
+one grouped reduction over (cell, time)
+@author: arifeinberg
+"""
+#%% Import packages
+import argparse
+import numpy as np
+import pandas as pd
+from collocation import get_grid_weights, find_coord_name
+from export_panel import find_site_files
+from site_reconciliation import load_gem_series
+from shard_batch import read_site_codes
+from site_registry import SiteRegistry
+#%% Functions used for gridding
+def read_grid(fn_model):
+    """Read latitudes and longitudes of the grid of a model NetCDF file
+
+    Parameters
+    ----------
+    fn_model : string
+         NetCDF file of model output
+    """
+    from netCDF4 import Dataset
+    with Dataset(fn_model, 'r') as nc:
+        lat_grid = np.asarray(nc[find_coord_name(nc, ['lat', 'latitude', 'nav_lat'])][:])
+        lon_grid = np.asarray(nc[find_coord_name(nc, ['lon', 'longitude', 'nav_lon'])][:])
+    return lat_grid, lon_grid
+
+def map_sites_to_cells(sites, lat_grid, lon_grid, site_coords=None):
+    """Find the grid cell (flat index) of each site, once for all times (sites outside
+    the domain of a regional grid are left out)
+
+    Parameters
+    ----------
+    sites : list
+         Site codes
+    lat_grid : array
+         Latitudes of grid (1D for regular grids, 2D for curvilinear grids)
+    lon_grid : array
+         Longitudes of grid (same shape as lat_grid)
+    site_coords : dict
+         Site (file key) -> (latitude, longitude, ...) (default: SiteRegistry().coords(),
+         use SiteRegistry().output_coords for file keys such as EMEP_PAL)
+    """
+    if site_coords is None:
+        site_coords = SiteRegistry().coords()
+    missing = [s for s in sites if s not in site_coords]
+    if len(missing) > 0:
+        raise KeyError('No coordinates for sites: ' + str(missing))
+    site_lat = np.array([site_coords[s][0] for s in sites])
+    site_lon = np.array([site_coords[s][1] for s in sites])
+    idx, weights = get_grid_weights(lat_grid, lon_grid, site_lat, site_lon, method='nearest')
+    bool_in = ~np.isnan(weights[:, 0])
+    if not bool_in.all():
+        print('Sites outside the grid domain: ' + ', '.join(np.array(sites)[~bool_in]))
+    return dict(zip(np.array(sites)[bool_in], idx[bool_in, 0]))
+
+def load_long(site_files):
+    """Load the daily GEM/TGM series of all sites in long format (time index, site, value)
+
+    Parameters
+    ----------
+    site_files : dict
+         Site -> outputted site file
+    """
+    frames = []
+    for site, fn in site_files.items():
+        series = load_gem_series(fn).dropna()
+        frames.append(pd.DataFrame({'site': site, 'value': series.values},
+                                   index=pd.DatetimeIndex(series.index, name='time')))
+    return pd.concat(frames)
+
+def grid_obs(df_obs, value_col, cell_of_site, grid_shape, freq='D'):
+    """Mean, count and number of sites of the observations in each (cell, time)
+
+    Returns a sparse table with one row per (cell, time) with data. The mean
+    is the mean over sites of the mean of each site in the time step, count
+    is the number of records.
+
+    Parameters
+    ----------
+    df_obs : DataFrame
+         Observations in long format, time index and 'site' column
+    value_col : string
+         Column to average
+    cell_of_site : dict
+         Site -> flat grid cell index (map_sites_to_cells), other sites are left out
+    grid_shape : tuple
+         Shape of the grid (n_lat, n_lon)
+    freq : string
+         Time step, e.g. 'D' or 'h'
+    """
+    values = df_obs[value_col].to_numpy(dtype=float)
+    bool_valid = ~np.isnan(values) & df_obs['site'].isin(list(cell_of_site)).values
+    site_codes, sites = pd.factorize(df_obs['site'].values[bool_valid])
+    cells_site = np.array([cell_of_site[s] for s in sites], dtype=np.int64)
+    time_codes, times = pd.factorize(pd.DatetimeIndex(df_obs.index[bool_valid]).floor(freq),
+                                     sort=True)
+    values = values[bool_valid]
+
+    # mean of each (site, time) first, so that sites with more records (or more
+    # records per time step, when freq is coarser than the input) don't dominate
+    key_site = time_codes * len(sites) + site_codes
+    key_site_u, key_site_inv = np.unique(key_site, return_inverse=True)
+    counts_site = np.bincount(key_site_inv)
+    site_means = np.bincount(key_site_inv, weights=values) / counts_site
+    time_site, site_site = key_site_u // len(sites), key_site_u % len(sites)
+
+    # one key per (cell, time), mean over the sites, reduced with bincount
+    key = cells_site[site_site] * len(times) + time_site
+    key_u, key_inv = np.unique(key, return_inverse=True)
+    sums = np.bincount(key_inv, weights=site_means)
+    n_sites = np.bincount(key_inv)
+    counts = np.bincount(key_inv, weights=counts_site).astype(np.int64) # number of records
+
+    cell_u = key_u // len(times)
+    j, i = np.unravel_index(cell_u, grid_shape)
+    return pd.DataFrame({'time': times[key_u % len(times)], 'cell': cell_u, 'j': j, 'i': i,
+                         'mean': sums / n_sites, 'count': counts, 'n_sites': n_sites})
+
+def to_dense(df_grid, grid_shape, times=None):
+    """Convert the sparse gridded table to dense (time, lat, lon) arrays of mean and count
+
+    Parameters
+    ----------
+    df_grid : DataFrame
+         Output of grid_obs
+    grid_shape : tuple
+         Shape of the grid (n_lat, n_lon)
+    times : DatetimeIndex
+         Times of the dense arrays (default: times in df_grid)
+    """
+    if times is None:
+        times = pd.DatetimeIndex(np.unique(df_grid['time']))
+    it = pd.DatetimeIndex(times).get_indexer(df_grid['time'])
+    bool_in = it >= 0
+    mean = np.full((len(times),) + tuple(grid_shape), np.nan, dtype=np.float32)
+    count = np.zeros((len(times),) + tuple(grid_shape), dtype=np.int32)
+    mean[it[bool_in], df_grid['j'].values[bool_in], df_grid['i'].values[bool_in]] = \
+        df_grid['mean'].values[bool_in]
+    count[it[bool_in], df_grid['j'].values[bool_in], df_grid['i'].values[bool_in]] = \
+        df_grid['count'].values[bool_in]
+    return times, mean, count
+
+#%% Grid all outputted sites onto a model grid
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Average the outputted sites onto a model grid')
+    parser.add_argument('fn_model') # NetCDF file with the model grid
+    parser.add_argument('--do', default='../misc_Data/') # directory of outputted files, change to your path
+    parser.add_argument('--fo', default='../misc_Data/obs_gridded_TGM.csv')
+    parser.add_argument('--res', default='d')
+    args = parser.parse_args()
+
+    lat_grid, lon_grid = read_grid(args.fn_model)
+    grid_shape = np.shape(lat_grid) if np.ndim(lat_grid) == 2 else (len(lat_grid), len(lon_grid))
+    df_obs = load_long(find_site_files(args.do, args.res))
+    site_coords = SiteRegistry().output_coords(read_site_codes(args.do))
+    cell_of_site = map_sites_to_cells(list(pd.unique(df_obs['site'])), lat_grid, lon_grid,
+                                      site_coords)
+    df_grid = grid_obs(df_obs, 'value', cell_of_site, grid_shape)
+    df_grid.to_csv(args.fo, index=False)
+    print('%d cells with data, %d rows' % (df_grid['cell'].nunique(), len(df_grid)))
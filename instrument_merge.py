@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Merge co-located instruments (or station codes) of a site on one time index,
+with a priority or overlap-averaging rule
+@author: arifeinberg
+"""
+#%% Import packages
+import numpy as np
+import pandas as pd
+#%% Functions used for merging instruments
+def merge_instrument_frames(df, time_col, inst_col, value_cols, rule='priority',
+                            priority=None, freq=None, group_col=None):
+    """Merge the rows of several instruments into one series, with the source of each time
+
+    Rows are ordered by (time, instrument priority) in one sort. Rows of the
+    same instrument at the same time (e.g. sub-hourly records with freq='h',
+    or duplicated rows from overlapping files) are first averaged, and each
+    time is then reduced over the instruments with the rule.
+
+    Parameters
+    ----------
+    df : DataFrame
+         Data of all instruments
+    time_col : string
+         Column with times (None to use the index)
+    inst_col : string
+         Column with instrument (or station) of each row
+    value_cols : list
+         Columns with values to merge
+    rule : string
+         'priority' (value of preferred instrument at each time) or
+         'mean' (mean of all instruments at each time)
+    priority : list
+         Instruments in order of preference (others are added after, sorted)
+    freq : string
+         Round times down to this frequency before aligning (e.g. 'h'), None for exact times
+    group_col : string
+         Column with site of each row, to merge the instruments of all sites at
+         once (None for a single site)
+    """
+    if time_col is None:
+        times = pd.DatetimeIndex(df.index)
+        time_name = df.index.name
+    else:
+        times = pd.DatetimeIndex(df[time_col])
+        time_name = time_col
+    if freq is not None:
+        times = times.floor(freq)
+    t = times.values.astype('datetime64[ns]').astype('int64')
+
+    labels = df[inst_col].astype(str).values
+    labels_u = sorted(pd.unique(labels))
+    if priority is None:
+        priority = labels_u
+    else:
+        priority = [str(p) for p in priority]
+        priority = priority + [l for l in labels_u if l not in priority]
+    rank = pd.Index(priority).get_indexer(labels)
+
+    if group_col is None:
+        groups = np.zeros(len(df), dtype=int)
+    else:
+        groups, group_u = pd.factorize(df[group_col], sort=True)
+
+    # one stable sort by (site,) time, then priority
+    order = np.lexsort((rank, t, groups))
+    t_s, rank_s, groups_s = t[order], rank[order], groups[order]
+    bool_new = np.r_[True, (t_s[1:] != t_s[:-1]) | (groups_s[1:] != groups_s[:-1])] # first row of each time
+    bool_new_inst = bool_new | np.r_[True, rank_s[1:] != rank_s[:-1]] # first row of each instrument
+    starts_inst = np.flatnonzero(bool_new_inst)
+
+    # mean of each instrument at each time
+    values = df[value_cols].to_numpy(dtype=float)[order]
+    bool_valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(bool_valid, values, 0.), starts_inst, axis=0)
+    counts = np.add.reduceat(bool_valid.astype(int), starts_inst, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values_inst = np.where(counts > 0, sums / counts, np.nan)
+    # first instrument of each time, in the rows of instrument means
+    starts = np.flatnonzero(bool_new[starts_inst])
+
+    if rule == 'priority':
+        values_m = values_inst[starts]
+    elif rule == 'mean':
+        bool_valid = ~np.isnan(values_inst)
+        sums = np.add.reduceat(np.where(bool_valid, values_inst, 0.), starts, axis=0)
+        counts = np.add.reduceat(bool_valid.astype(int), starts, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values_m = np.where(counts > 0, sums / counts, np.nan)
+    else:
+        raise ValueError('Unknown merge rule: ' + rule)
+
+    rows = order[starts_inst[starts]] # first row of each time, in original order
+    df_m = pd.DataFrame(values_m, columns=value_cols,
+                        index=pd.DatetimeIndex(t[rows].astype('datetime64[ns]'),
+                                               name=time_name))
+    df_m[inst_col] = labels[rows] # preferred instrument at each time
+    if group_col is not None:
+        df_m[group_col] = group_u[groups[rows]]
+    return df_m
+
+def resample_source(source, rule='D'):
+    """Return the instrument with most data in each resampling bin
+
+    Parameters
+    ----------
+    source : Series
+         Instrument of each time (datetime index)
+    rule : string
+         Resampling frequency
+    """
+    counts = pd.get_dummies(source).astype(int).resample(rule).sum()
+    counts = counts[counts.sum(axis=1) > 0]
+    return counts.idxmax(axis=1)
+
+#%% Check the merge of sub-hourly records on an hourly index
+if __name__ == '__main__':
+    # twelve 5-minute records of one instrument (0..11), and a second
+    # instrument with one record (20) in the same hour
+    times = pd.date_range('2015-01-01', periods=12, freq='5min')
+    df = pd.DataFrame({'time': times.append(times[:1]), 'inst': ['A'] * 12 + ['B'],
+                       'value': np.r_[np.arange(12.), 20.]})
+    df_p = merge_instrument_frames(df, 'time', 'inst', ['value'], rule='priority', freq='h')
+    df_a = merge_instrument_frames(df, 'time', 'inst', ['value'], rule='mean', freq='h')
+    assert np.allclose(df_p['value'], [5.5]) and (df_p['inst'].iloc[0] == 'A')
+    assert np.allclose(df_a['value'], [(5.5 + 20.) / 2])
+    print('Sub-hourly records are averaged per instrument before merging')
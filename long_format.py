@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Long-format processing of all sites of a network at once: records of all
+sites are stacked with a categorical site column, aggregated with one
+groupby over (site, day), and split into per-site outputs at the end
+@author: arifeinberg
+"""
+#%% Import packages
+import numpy as np
+import pandas as pd
+from spike_screen import screen_frame
+#%% Functions used for long-format processing
+def stack_sites(frames, site_col='site'):
+    """Stack the data of several sites, with a categorical site column
+
+    Parameters
+    ----------
+    frames : dict
+         Site code -> DataFrame
+    site_col : string
+         Name of site column
+    """
+    sites = list(frames)
+    df = pd.concat([frames[s] for s in sites], ignore_index=True)
+    df[site_col] = pd.Categorical(np.repeat(sites, [len(frames[s]) for s in sites]),
+                                  categories=sites)
+    return df
+
+def screen_long(df, value_col, time_col, group_cols, screen=None):
+    """Remove spikes of each site from long-format data, return data and number of spikes per site
+
+    Parameters
+    ----------
+    df : DataFrame
+         Long-format hourly data
+    value_col : string
+         Column to screen
+    time_col : string
+         Column with times
+    group_cols : list
+         Columns defining one series (e.g. ['site'])
+    screen : dict
+         Arguments of spike_screen.screen_spikes, None for no screening
+    """
+    if screen is None:
+        return df, {}
+    frames, n_spikes = [], {}
+    for key, df_g in df.sort_values(by=time_col).groupby(group_cols, observed=True):
+        df_g, n = screen_frame(df_g, value_col, time_col, screen)
+        frames.append(df_g)
+        site = key[0] if isinstance(key, tuple) else key
+        n_spikes[site] = n_spikes.get(site, 0) + n
+    return pd.concat(frames), n_spikes
+
+def daily_means_long(df, group_cols, time_col, value_cols, time_name=None):
+    """Daily means of all sites, with one groupby over (site, day)
+
+    Parameters
+    ----------
+    df : DataFrame
+         Long-format data
+    group_cols : list
+         Columns defining one series (e.g. ['site'] or ['site', 'target'])
+    time_col : string
+         Column with times (None to use the index)
+    value_cols : list
+         Columns to average
+    time_name : string
+         Name of the day column (default: time_col)
+    """
+    times = df.index if time_col is None else df[time_col]
+    day = pd.DatetimeIndex(times).floor('D')
+    day = pd.Series(day, index=df.index, name=time_name or time_col or df.index.name)
+    df_d = df.groupby([df[c] for c in group_cols] + [day], observed=True,
+                      sort=True)[value_cols].mean()
+    return df_d.reset_index()
+
+def daily_source_long(df, group_cols, time_col, inst_col, time_name=None):
+    """Instrument that measured most of each day, for all sites
+
+    Parameters
+    ----------
+    df : DataFrame
+         Long-format data with instrument of each time
+    group_cols : list
+         Columns defining one series (e.g. ['site'])
+    time_col : string
+         Column with times (None to use the index)
+    inst_col : string
+         Column with instrument
+    time_name : string
+         Name of the day column (default: time_col)
+    """
+    times = df.index if time_col is None else df[time_col]
+    day = pd.Series(pd.DatetimeIndex(times).floor('D'), index=df.index,
+                    name=time_name or time_col or df.index.name)
+    counts = df.groupby([df[c] for c in group_cols] + [day, df[inst_col]],
+                        observed=True).size().rename('n_source').reset_index()
+    counts = counts.sort_values(by='n_source', ascending=False, kind='stable')
+    return counts.drop_duplicates(subset=group_cols + [day.name]).drop(columns='n_source')
+
+def split_sites(df_long, time_name, site_col='site'):
+    """Split long-format daily data into per-site frames with a time index
+
+    Columns that are empty for a site are dropped, then days with missing
+    values (as for the daily means of a single site).
+
+    Parameters
+    ----------
+    df_long : DataFrame
+         Long-format daily data
+    time_name : string
+         Name of the day column
+    site_col : string
+         Name of site column
+    """
+    frames = {}
+    for site, df_site in df_long.groupby(site_col, observed=True, sort=False):
+        df_site = df_site.drop(columns=site_col).set_index(time_name)
+        frames[site] = df_site.dropna(axis=1, how='all').dropna()
+    return frames
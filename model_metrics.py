@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Model evaluation metrics (bias, normalised mean bias, RMSE, correlation and
+seasonal cycle amplitude) by site, season and region, for one or many model
+runs, from sufficient statistics accumulated in one pass over the paired data
+@author: arifeinberg
+"""
+#%% Import packages
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+#%% Functions used for metrics
+seasons = ['DJF', 'MAM', 'JJA', 'SON']
+season_of_month = np.array([0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0]) # Jan..Dec
+stat_names = ['n', 'so', 'soo', 'sm', 'smm', 'som']
+
+def runs_to_columns(df_pair, run_col, model_col='model', obs_col='obs', site_col='site'):
+    """Convert a paired table with one row per (time, site, run) to one model column per run
+
+    Parameters
+    ----------
+    df_pair : DataFrame
+         Paired data, time index
+    run_col : string
+         Column with the model run
+    model_col : string
+         Column with the model values
+    obs_col : string
+         Column with the observed values
+    site_col : string
+         Column with the site code
+    """
+    df = df_pair.set_index([site_col, run_col], append=True)
+    df_wide = df[model_col].unstack(run_col)
+    df_wide.columns = [str(c) for c in df_wide.columns]
+    df_wide[obs_col] = df[obs_col].groupby(level=[0, 1]).first()
+    return df_wide.reset_index(level=1)
+
+def sufficient_stats(df_pair, obs_col, model_cols, site_col='site', block=256):
+    """Sums of each (site, calendar month) and model run, for pairs with both values valid
+
+    Values are centered on the mean observation before summing, for
+    numerical stability. Sums are sparse matrix products of a (site, month)
+    indicator matrix with the data, for blocks of model runs.
+
+    Returns sites, the centering value, and a dict of statistics of shape
+    (n_site, 12, n_run): n, so, soo, sm, smm, som (o: obs, m: model).
+
+    Parameters
+    ----------
+    df_pair : DataFrame
+         Paired data, time index
+    obs_col : string
+         Column with the observed values
+    model_cols : list
+         Columns with the model values (one per run)
+    site_col : string
+         Column with the site code
+    block : int
+         Number of runs in each block
+    """
+    obs = df_pair[obs_col].to_numpy(dtype=float)
+    bool_obs = ~np.isnan(obs)
+    site_codes, sites = pd.factorize(df_pair[site_col].values[bool_obs])
+    month = pd.DatetimeIndex(df_pair.index[bool_obs]).month.values - 1
+    center = np.mean(obs[bool_obs]) if bool_obs.any() else 0.
+    o = obs[bool_obs] - center
+
+    n_base = len(sites) * 12
+    G = sparse.csr_matrix((np.ones(len(o)), (site_codes * 12 + month, np.arange(len(o)))),
+                          shape=(n_base, len(o)))
+    stats = {name: np.zeros((n_base, len(model_cols))) for name in stat_names}
+    for b0 in range(0, len(model_cols), block):
+        b = slice(b0, b0 + block)
+        m = df_pair[model_cols[b]].to_numpy(dtype=float)[bool_obs] - center
+        valid = (~np.isnan(m)).astype(float)
+        m = np.nan_to_num(m)
+        o_v = valid * o[:, None]
+        stats['n'][:, b] = G @ valid
+        stats['so'][:, b] = G @ o_v
+        stats['soo'][:, b] = G @ (o_v * o[:, None])
+        stats['sm'][:, b] = G @ m
+        stats['smm'][:, b] = G @ m**2
+        stats['som'][:, b] = G @ (m * o[:, None])
+    stats = {name: s.reshape(len(sites), 12, len(model_cols)) for name, s in stats.items()}
+    return list(sites), center, stats
+
+def combine_stats(stats, site_groups, n_site_groups, month_groups, n_month_groups):
+    """Sum statistics of sites and months into groups (e.g. regions and seasons)
+
+    Parameters
+    ----------
+    stats : dict
+         Statistics of shape (n_site, 12, n_run)
+    site_groups : array
+         Group of each site (0..n_site_groups-1)
+    n_site_groups : int
+         Number of site groups
+    month_groups : array
+         Group of each calendar month (0..n_month_groups-1)
+    n_month_groups : int
+         Number of month groups
+    """
+    A = np.zeros((n_site_groups, len(site_groups)))
+    A[site_groups, np.arange(len(site_groups))] = 1.
+    B = np.zeros((n_month_groups, 12))
+    B[month_groups, np.arange(12)] = 1.
+    return {name: np.einsum('gs,hm,smr->ghr', A, B, s, optimize=True)
+            for name, s in stats.items()}
+
+def compute_metrics(stats, center):
+    """Metrics of each group and run from its statistics
+
+    Parameters
+    ----------
+    stats : dict
+         Statistics (any shape, same for all)
+    center : float
+         Value subtracted from obs and model before summing
+    """
+    n, so, soo, sm, smm, som = [stats[name] for name in stat_names]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        metrics = {'n': n.astype(np.int64),
+                   'obs_mean': so / n + center,
+                   'model_mean': sm / n + center,
+                   'bias': (sm - so) / n,
+                   'nmb': (sm - so) / (so + n * center),
+                   'rmse': np.sqrt(np.maximum(soo - 2 * som + smm, 0.) / n)}
+        cov = n * som - so * sm
+        var = (n * soo - so**2) * (n * smm - sm**2)
+        metrics['r'] = np.where((n > 1) & (var > 0), cov / np.sqrt(var), np.nan)
+    bool_empty = n == 0
+    for name in metrics:
+        if name != 'n':
+            metrics[name][bool_empty] = np.nan
+    return metrics
+
+def seasonal_amplitude(stats, center, min_count=1):
+    """Amplitude (max - min of monthly means) of the mean seasonal cycle of obs and model
+
+    Parameters
+    ----------
+    stats : dict
+         Statistics of shape (n_group, 12, n_run)
+    center : float
+         Value subtracted from obs and model before summing
+    min_count : int
+         Minimum number of pairs in all 12 months for an amplitude
+    """
+    n = stats['n']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        obs_month = stats['so'] / n + center
+        model_month = stats['sm'] / n + center
+    bool_complete = (n >= max(min_count, 1)).all(axis=1)
+    amp_obs = np.where(bool_complete, np.ptp(np.nan_to_num(obs_month), axis=1), np.nan)
+    amp_model = np.where(bool_complete, np.ptp(np.nan_to_num(model_month), axis=1), np.nan)
+    return amp_obs, amp_model
+
+def evaluate(df_pair, obs_col, model_cols, region_of_site=None, site_col='site',
+             levels=(('site', 'all'), ('site', 'season'), ('region', 'all'),
+                     ('region', 'season'), ('all', 'all'), ('all', 'season')),
+             min_count=1):
+    """Metrics of all runs at all grouping levels, from one pass of sufficient statistics
+
+    Returns a long table with one row per (level, group, season, run).
+
+    Parameters
+    ----------
+    df_pair : DataFrame
+         Paired data, time index (e.g. collocation.collocate)
+    obs_col : string
+         Column with the observed values
+    model_cols : list
+         Columns with the model values (one per run)
+    region_of_site : dict
+         Site -> region (default: 'network' column of df_pair)
+    site_col : string
+         Column with the site code
+    levels : list
+         (site level, time level) pairs, site level in 'site', 'region', 'all'
+         and time level in 'all', 'season'
+    min_count : int
+         Minimum number of pairs in each month for seasonal amplitudes
+    """
+    model_cols = list(model_cols)
+    sites, center, stats = sufficient_stats(df_pair, obs_col, model_cols, site_col)
+    site_levels = {'site': (np.arange(len(sites)), sites),
+                   'all': (np.zeros(len(sites), dtype=int), ['all'])}
+    if any(level[0] == 'region' for level in levels):
+        if region_of_site is None:
+            region_of_site = df_pair.groupby(site_col)['network'].first().to_dict()
+        region_codes, regions = pd.factorize(np.array([region_of_site[s] for s in sites]))
+        site_levels['region'] = (region_codes, list(regions))
+    time_levels = {'all': (np.zeros(12, dtype=int), ['all']),
+                   'season': (season_of_month, seasons)}
+
+    frames = []
+    for site_level, time_level in levels:
+        site_groups, site_names = site_levels[site_level]
+        month_groups, period_names = time_levels[time_level]
+        # keep months to get the seasonal cycle, then sum months into seasons
+        stats_g = combine_stats(stats, site_groups, len(site_names), np.arange(12), 12)
+        stats_gt = combine_stats(stats_g, np.arange(len(site_names)), len(site_names),
+                                 month_groups, len(period_names))
+        metrics = compute_metrics(stats_gt, center)
+        if time_level == 'all':
+            amp_obs, amp_model = seasonal_amplitude(stats_g, center, min_count)
+            metrics['amp_obs'], metrics['amp_model'] = amp_obs[:, None, :], amp_model[:, None, :]
+
+        shape = metrics['n'].shape # (group, time group, run)
+        group, period, run = np.meshgrid(site_names, period_names, model_cols,
+                                         indexing='ij')
+        df = pd.DataFrame({'level': site_level + '_' + time_level, 'group': group.ravel(),
+                           'period': period.ravel(), 'run': run.ravel()})
+        for name, values in metrics.items():
+            df[name] = np.broadcast_to(values, shape).ravel()
+        frames.append(df[df['n'] > 0])
+    return pd.concat(frames, ignore_index=True)
+
+#%% Metrics of a paired table of observations and model runs
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Model evaluation metrics from paired data')
+    parser.add_argument('fn_pair') # CSV of paired data, time in first column
+    parser.add_argument('--fo', default='../misc_Data/model_metrics.csv')
+    parser.add_argument('--obs', default='GEM_TGM') # column with observations
+    parser.add_argument('--model', nargs='+', default=['model']) # model columns (one per run)
+    parser.add_argument('--run-col', default=None) # or: column with run, one row per run
+    args = parser.parse_args()
+
+    df_pair = pd.read_csv(args.fn_pair, index_col=0, parse_dates=True)
+    region_of_site = None
+    if args.run_col is not None: # one column per run
+        if 'network' in df_pair.columns:
+            region_of_site = df_pair.groupby('site')['network'].first().to_dict()
+        df_pair = runs_to_columns(df_pair, args.run_col, args.model[0], args.obs)
+        args.model = [c for c in df_pair.columns if c not in ['site', args.obs]]
+    df_metrics = evaluate(df_pair, args.obs, args.model, region_of_site)
+    df_metrics.to_csv(args.fo, index=False)
+    print('Metrics of %d runs saved to %s' % (len(args.model), args.fo))
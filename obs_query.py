@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Query the outputted site files by site, network, time window and resolution,
+with binary search on time and an LRU cache of recently used files
+@author: arifeinberg
+"""
+#%% Import packages
+import glob
+import os
+import re
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from shard_batch import read_site_codes
+from site_registry import SiteRegistry
+from time_window import to_utc_naive
+#%% Query class
+# output file names: <site>_<res>.csv
+fn_pattern = re.compile(r'^(?P<site>.+)_(?P<res>h|d|w|2w|m)\.csv$')
+
+class ObsStore:
+    """Index of the outputted site files, with cached sorted time arrays
+
+    Parameters
+    ----------
+    do : string
+         Directory of outputted site files
+    max_partitions : int
+         Number of (site, resolution) files kept in memory
+    """
+
+    def __init__(self, do, max_partitions=64):
+        self.do = do
+        self.max_partitions = max_partitions
+        self.cache = OrderedDict() # (site, res) -> (times, columns, mtime), most recent last
+        self.refresh()
+
+    def refresh(self):
+        """Rebuild the index of site files and networks (e.g. after new outputs)"""
+        rows = []
+        for f in sorted(glob.glob(os.path.join(self.do, '*.csv'))):
+            match = fn_pattern.match(os.path.basename(f))
+            if (match is None) or os.path.basename(f).startswith('run_report_'):
+                continue
+            rows.append({'site': match.group('site'), 'res': match.group('res'), 'file': f})
+        self.index = pd.DataFrame(rows, columns=['site', 'res', 'file'])
+        # network and site code of each file key (e.g. EMEP_PAL -> EMEP, PAL)
+        site_codes = read_site_codes(self.do)
+        self.index['network'] = [site_codes.get(s, ('unknown', s))[0] for s in self.index['site']]
+        self.index['code'] = [site_codes.get(s, ('unknown', s))[1] for s in self.index['site']]
+        self.index = self.index.set_index(['site', 'res']).sort_index()
+        self.cache.clear()
+
+    def coords(self, registry=None):
+        """Return dict of site -> (latitude, longitude, elevation) of the sites in the
+        store, for collocation.collocate and grid_obs.map_sites_to_cells
+
+        Parameters
+        ----------
+        registry : SiteRegistry
+             Registry of sites (default: SiteRegistry())
+        """
+        if registry is None:
+            registry = SiteRegistry()
+        return registry.output_coords(read_site_codes(self.do))
+
+    def sites(self, network=None, res=None):
+        """Return the site codes in the store, optionally of one network and resolution
+
+        Parameters
+        ----------
+        network : string
+             Name of the network (None for all)
+        res : string
+             Time resolution ('h', 'd', 'w', '2w', 'm'), None for all
+        """
+        index = self.index.reset_index()
+        if network is not None:
+            index = index[index['network'] == network]
+        if res is not None:
+            index = index[index['res'] == res]
+        return sorted(index['site'].unique())
+
+    def load_partition(self, site, res):
+        """Return the sorted times (int64 ns) and columns of a site file, from the cache
+
+        Parameters
+        ----------
+        site : string
+             Site code
+        res : string
+             Time resolution
+        """
+        key = (site, res)
+        if key not in self.index.index:
+            raise KeyError('No output file for site %s at resolution %s' % key)
+        fn = self.index.loc[key, 'file']
+        mtime = os.path.getmtime(fn)
+        if (key in self.cache) and (self.cache[key][2] == mtime): # file unchanged
+            self.cache.move_to_end(key) # most recently used
+            return self.cache[key][:2]
+
+        df = pd.read_csv(fn, index_col=0, parse_dates=True)
+        df = df.sort_index(kind='stable')
+        times = pd.DatetimeIndex(df.index).values.astype('datetime64[ns]').astype('int64')
+        columns = {c: df[c].values for c in df.columns}
+
+        self.cache[key] = (times, columns, mtime)
+        if len(self.cache) > self.max_partitions: # drop least recently used
+            self.cache.popitem(last=False)
+        return times, columns
+
+    def query(self, sites=None, networks=None, start=None, end=None, res='d',
+              variables=None, as_arrays=False):
+        """Return the data of a set of sites within a time window
+
+        Parameters
+        ----------
+        sites : list
+             Site codes (None for all sites of the networks)
+        networks : list
+             Network names (None for all networks)
+        start : string
+             Start of time window (None for no start)
+        end : string
+             End of time window, exclusive (None for no end)
+        res : string
+             Time resolution ('h', 'd', 'w', '2w', 'm')
+        variables : list
+             Columns to return (None for all)
+        as_arrays : bool
+             Return dict of site -> (times, columns) numpy arrays instead of a DataFrame
+        """
+        if sites is None:
+            sites = []
+            for network in (networks if networks is not None else [None]):
+                sites += self.sites(network, res)
+        elif networks is not None: # keep only sites of these networks (with a file at res)
+            site_networks = self.index['network'].reindex(
+                pd.MultiIndex.from_product([sites, [res]], names=['site', 'res']))
+            sites = [s for s, network in zip(sites, site_networks) if network in networks]
+
+        t_start = None if start is None else to_utc_naive(start).value
+        t_end = None if end is None else to_utc_naive(end).value
+
+        result = {}
+        for site in sites:
+            times, columns = self.load_partition(site, res)
+            # binary search for the time window
+            i0 = 0 if t_start is None else np.searchsorted(times, t_start, side='left')
+            i1 = len(times) if t_end is None else np.searchsorted(times, t_end, side='left')
+            cols = list(columns) if variables is None else \
+                [c for c in variables if c in columns]
+            result[site] = (times[i0:i1], {c: columns[c][i0:i1] for c in cols})
+
+        if as_arrays:
+            return result
+
+        frames = []
+        for site in result:
+            times, columns = result[site]
+            df = pd.DataFrame(columns, index=pd.DatetimeIndex(times.astype('datetime64[ns]'),
+                                                              name='time'))
+            df.insert(0, 'site', site)
+            df.insert(1, 'network', self.index.loc[(site, res), 'network'])
+            frames.append(df)
+        if len(frames) == 0:
+            return pd.DataFrame(columns=['site', 'network'])
+        return pd.concat(frames)
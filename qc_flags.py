@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Quality control flag vocabularies of each network, and vectorized decoding of
+flags into validity classes (including EBAS values with several flags)
+@author: arifeinberg
+"""
+#%% Import packages
+import numpy as np
+import pandas as pd
+#%% Flag vocabularies
+# validity classes, in order of severity (worst class of a value's flags is used)
+qc_classes = ['valid', 'below_dl', 'invalid', 'missing']
+VALID, BELOW_DL, INVALID, MISSING = range(len(qc_classes))
+
+# flags of the EBAS (EMEP) format, other flags are treated as invalid
+ebas_flags = {0: 'valid',
+              100: 'valid', # checked by data originator, overrides invalid flags
+              147: 'below_dl', # below detection limit, value measured and considered valid
+              781: 'below_dl', # below detection limit, value is detection limit
+              999: 'missing', # missing measurement, unspecified reason
+              980: 'missing', # missing due to calibration or zero/span check
+              899: 'invalid'} # measurement undefined, unspecified reason
+
+# flag vocabulary and range of valid concentrations of each network
+# (flags: 'ebas' for EBAS flags, dict for string flags, None for no flags;
+#  closed: side(s) of the range that are included, as in pd.Interval)
+qc_tables = {'CAPMoN': {'flags': {'V0': 'valid',
+                                  'V1': 'below_dl', # valid but below detection limit
+                                  'V4': 'valid'}, # flag not in use
+                        'range': (0., np.inf), 'closed': 'left'},
+             'AMNet': {'flags': {'A': 'valid',
+                                 'B': 'valid'},
+                       'range': (0., np.inf), 'closed': 'left'},
+             'EMEP': {'flags': 'ebas',
+                      'range': (0., 99.), 'closed': 'neither'},
+             'GMOS': {'flags': None, # negative values are missing
+                      'range': (0., np.inf), 'closed': 'left'}}
+
+#%% Functions used for decoding flags
+def split_ebas_flags(flags, n_flags=3):
+    """Split EBAS flag values into 3-digit flags, e.g. 0.147100 -> 147, 100
+
+    Returns integer array of shape (n, n_flags), with 0 where no flag.
+
+    Parameters
+    ----------
+    flags : array
+         EBAS flag values
+    n_flags : int
+         Maximum number of flags in one value
+    """
+    flags = np.nan_to_num(np.asarray(flags, dtype=float), nan=0.999) # NaN as missing
+    digits = np.rint(flags * 10**(3 * n_flags)).astype(np.int64)
+    powers = 1000**np.arange(n_flags - 1, -1, -1, dtype=np.int64)
+    return (digits[:, None] // powers[None, :]) % 1000
+
+def decode_ebas_flags(flags, n_flags=3):
+    """Return the validity class code of each EBAS flag value
+
+    A value has the worst class of its flags, except that flag 100 overrides
+    invalid flags.
+
+    Parameters
+    ----------
+    flags : array
+         EBAS flag values
+    n_flags : int
+         Maximum number of flags in one value
+    """
+    # lookup table of class for all 3-digit flags
+    lut = np.full(1000, INVALID, dtype=np.int8)
+    for flag, cls in ebas_flags.items():
+        lut[flag] = qc_classes.index(cls)
+
+    flags_split = split_ebas_flags(flags, n_flags)
+    codes = lut[flags_split].max(axis=1)
+    bool_100 = (flags_split == 100).any(axis=1)
+    return np.where(bool_100 & (codes == INVALID), VALID, codes).astype(np.int8)
+
+def decode_string_flags(flags, vocabulary):
+    """Return the validity class code of each string flag
+
+    Each distinct flag is looked up once, unknown flags are invalid and
+    empty flags are missing.
+
+    Parameters
+    ----------
+    flags : array
+         Flags (strings)
+    vocabulary : dict
+         Flag -> validity class
+    """
+    codes, uniques = pd.factorize(np.asarray(flags))
+    lut = np.array([qc_classes.index(vocabulary.get(u, 'invalid')) for u in uniques]
+                   + [MISSING], dtype=np.int8) # last entry used for code -1 (NaN)
+    return lut[codes]
+
+def decode_flags(flags, network):
+    """Return the validity class code (index in qc_classes) of each flag
+
+    Parameters
+    ----------
+    flags : array
+         Flags of the network (ignored for networks without flags)
+    network : string
+         Name of the network, key of qc_tables
+    """
+    vocabulary = qc_tables[network]['flags']
+    if vocabulary is None:
+        return np.full(len(flags), VALID, dtype=np.int8)
+    elif vocabulary == 'ebas':
+        return decode_ebas_flags(flags)
+    return decode_string_flags(flags, vocabulary)
+
+def in_range(values, network):
+    """Check that values are in the range of valid concentrations of the network
+
+    Parameters
+    ----------
+    values : array
+         Concentrations
+    network : string
+         Name of the network, key of qc_tables
+    """
+    values = np.asarray(values, dtype=float)
+    vmin, vmax = qc_tables[network]['range']
+    closed = qc_tables[network]['closed']
+    bool_min = values >= vmin if closed in ['left', 'both'] else values > vmin
+    bool_max = values <= vmax if closed in ['right', 'both'] else values < vmax
+    return bool_min & bool_max
+
+def get_valid_mask(flags, values, network, accept=('valid', 'below_dl')):
+    """Return boolean mask of valid data, from flags and range of concentrations
+
+    Parameters
+    ----------
+    flags : array
+         Flags (None for networks without flags)
+    values : array
+         Concentrations
+    network : string
+         Name of the network, key of qc_tables
+    accept : tuple
+         Validity classes that are kept
+    """
+    if flags is None:
+        flags = np.zeros(len(values))
+    codes = decode_flags(flags, network)
+    bool_accept = np.isin(codes, [qc_classes.index(c) for c in accept])
+    return bool_accept & in_range(values, network)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Downsampled quick-look series of long hourly records for interactive plots:
+min and max of each time bucket, at zoom levels of doubling bucket width
+@author: arifeinberg
+"""
+#%% Import packages
+import numpy as np
+import pandas as pd
+#%% Functions used for quick-look series
+def bucket_minmax(bucket, t_lo, v_lo, t_hi, v_hi):
+    """Min and max (with their times) of each bucket, buckets sorted
+
+    Parameters
+    ----------
+    bucket : array
+         Bucket of each point (non-decreasing)
+    t_lo, v_lo : array
+         Times and values of the minimum of each point
+    t_hi, v_hi : array
+         Times and values of the maximum of each point
+    """
+    bool_new = np.concatenate([[True], bucket[1:] != bucket[:-1]])
+    starts = np.flatnonzero(bool_new)
+    group = np.cumsum(bool_new) - 1
+    pos = np.arange(len(bucket))
+    v_min = np.minimum.reduceat(v_lo, starts)
+    v_max = np.maximum.reduceat(v_hi, starts)
+    # first point of each bucket reaching the min and max
+    i_min = np.minimum.reduceat(np.where(v_lo == v_min[group], pos, len(pos)), starts)
+    i_max = np.minimum.reduceat(np.where(v_hi == v_max[group], pos, len(pos)), starts)
+    return bucket[starts], t_lo[i_min], v_min, t_hi[i_max], v_max
+
+class QuickLook:
+    """Collect hourly values of a site and build min/max quick-look series at zoom levels
+
+    Level 0 has buckets of width base, and each next level doubles the
+    width, computed from the previous level, until at most min_buckets
+    buckets are left.
+
+    Parameters
+    ----------
+    base : string
+         Bucket width of the finest level, e.g. '2h'
+    min_buckets : int
+         Number of buckets of the coarsest level
+    """
+
+    def __init__(self, base='2h', min_buckets=500):
+        self.base = base
+        self.min_buckets = min_buckets
+        self.times = []
+        self.values = []
+
+    def add(self, times, values):
+        """Add values (e.g. of one file), NaN are skipped
+
+        Parameters
+        ----------
+        times : array
+             Times (datetime64)
+        values : array
+             Values
+        """
+        values = np.asarray(values, dtype=float)
+        bool_valid = ~np.isnan(values)
+        self.times.append(np.asarray(times, dtype='datetime64[s]')[bool_valid].astype(np.int64))
+        self.values.append(values[bool_valid])
+
+    def levels(self):
+        """Min/max series of all zoom levels, list of (width in s, times, values)
+
+        Times and values of each level are the min and max of each bucket,
+        in time order (two points per bucket, one if the same point).
+        """
+        if len(self.times) == 0 or sum(len(t) for t in self.times) == 0:
+            return []
+        t = np.concatenate(self.times)
+        v = np.concatenate(self.values)
+        order = np.argsort(t, kind='stable')
+        t, v = t[order], v[order]
+        width = int(pd.Timedelta(self.base).total_seconds())
+        bucket = (t - t[0]) // width
+        b, t_lo, v_lo, t_hi, v_hi = bucket_minmax(bucket, t, v, t, v)
+        levels = [(width,) + self.points(t_lo, v_lo, t_hi, v_hi)]
+        while len(b) > self.min_buckets:
+            width *= 2
+            b, t_lo, v_lo, t_hi, v_hi = bucket_minmax(b // 2, t_lo, v_lo, t_hi, v_hi)
+            levels.append((width,) + self.points(t_lo, v_lo, t_hi, v_hi))
+        return levels
+
+    @staticmethod
+    def points(t_lo, v_lo, t_hi, v_hi):
+        """Interleave min and max of buckets in time order, one point if they coincide"""
+        bool_first = t_lo <= t_hi
+        t = np.column_stack([np.where(bool_first, t_lo, t_hi), np.where(bool_first, t_hi, t_lo)])
+        v = np.column_stack([np.where(bool_first, v_lo, v_hi), np.where(bool_first, v_hi, v_lo)])
+        bool_keep = np.ones(t.shape, dtype=bool)
+        bool_keep[:, 1] = t[:, 1] != t[:, 0]
+        return t[bool_keep], v[bool_keep]
+
+    def save(self, fo):
+        """Save all levels to a .npz file (times in s since 1970 as int64, values as float32)"""
+        arrays = {}
+        for k, (width, t, v) in enumerate(self.levels()):
+            arrays['width_%d' % k] = width
+            arrays['t_%d' % k] = t
+            arrays['v_%d' % k] = v.astype(np.float32)
+        np.savez_compressed(fo, n_levels=len(arrays) // 3, **arrays)
+
+def load_quicklook(fn, start=None, end=None, n_points=2000):
+    """Quick-look series of a time window, at the finest level with at most n_points points
+
+    Parameters
+    ----------
+    fn : string
+         File saved with QuickLook.save
+    start : string
+         Start of time window (None for start of data)
+    end : string
+         End of time window (None for end of data)
+    n_points : int
+         Maximum number of points (e.g. twice the width of the plot in pixels)
+    """
+    with np.load(fn) as data:
+        n_levels = int(data['n_levels'])
+        if n_levels == 0:
+            return pd.Series(dtype=np.float32)
+        for k in range(n_levels):
+            t = data['t_%d' % k]
+            i0 = 0 if start is None else np.searchsorted(t, pd.Timestamp(start).timestamp())
+            i1 = len(t) if end is None else np.searchsorted(t, pd.Timestamp(end).timestamp())
+            if (i1 - i0 <= n_points) or (k == n_levels - 1):
+                v = data['v_%d' % k][i0:i1]
+                return pd.Series(v, index=pd.to_datetime(t[i0:i1], unit='s'))
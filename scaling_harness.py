@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Scaling harness: generate a synthetic obs_datasets tree with a chosen number
+of years and time resolution, run the network scripts on it, and record wall
+time, peak memory and output size of each run in a scaling curve
+@author: arifeinberg
+"""
+#%% Import packages
+import argparse
+import ast
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from shard_batch import read_run_report
+#%% Functions used for synthetic data
+dn_scripts = os.path.dirname(os.path.abspath(__file__))
+
+def load_script_defs(fn_script, names):
+    """Functions and literal assignments of a network script, without running the script
+
+    Parameters
+    ----------
+    fn_script : string
+         Script file name (in the scripts directory)
+    names : list
+         Names of functions and variables (last assignment of a variable is used)
+    """
+    with open(os.path.join(dn_scripts, fn_script), 'r', encoding='ISO-8859-1') as f:
+        tree = ast.parse(f.read())
+    defs = {}
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and (node.name in names):
+            code = compile(ast.Module(body=[node], type_ignores=[]), fn_script, 'exec')
+            exec(code, defs)
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and (target.id in names):
+                    defs[target.id] = ast.literal_eval(node.value)
+    return {name: defs[name] for name in names if name in defs}
+
+def load_script_assignments(fn_script, name):
+    """All literal values assigned to a variable of a network script, in order
+
+    Parameters
+    ----------
+    fn_script : string
+         Script file name (in the scripts directory)
+    name : string
+         Name of the variable
+    """
+    with open(os.path.join(dn_scripts, fn_script), 'r', encoding='ISO-8859-1') as f:
+        tree = ast.parse(f.read())
+    return [ast.literal_eval(node.value) for node in tree.body
+            if isinstance(node, ast.Assign) and
+            any(isinstance(t, ast.Name) and (t.id == name) for t in node.targets)]
+
+def fill_pattern(pattern, fill):
+    """File name matching a glob pattern, with the first * replaced by fill
+
+    Parameters
+    ----------
+    pattern : string
+         Glob pattern of file names
+    fill : string
+         Text for the first * (other * are removed)
+    """
+    dn, base = os.path.split(pattern)
+    head, _, tail = base.partition('*')
+    base = head + fill + tail.replace('*', '')
+    return os.path.join(dn, base)
+
+res_freq = {'H': 'h', 'D': 'D', 'W': '7D', '2W': '14D', 'M': 'MS'}
+res_code = {'H': '1h', 'D': '1d', 'W': '1w', '2W': '2w', 'M': '1mo'} # EBAS resolution codes
+
+def synthetic_times(years, res):
+    """Measurement start times of all years at resolution 'H', 'D', 'W', '2W' or 'M'
+
+    Parameters
+    ----------
+    years : list
+         Years
+    res : string
+         'H' (hourly), 'D' (daily), 'W' (weekly), '2W' (biweekly) or 'M' (monthly)
+    """
+    return pd.date_range(str(years[0]), str(years[-1] + 1), freq=res_freq[res], inclusive='left')
+
+def synthetic_values(times, rng):
+    """Synthetic GEM concentrations (ng m-3) with seasonal cycle and noise"""
+    doy = np.asarray(times.dayofyear, dtype=float)
+    return np.round(1.4 + 0.2 * np.cos(2 * np.pi * (doy - 30) / 365.25)
+                    + rng.normal(0, 0.1, len(times)), 3)
+
+def resolve(dn, cwd):
+    """Path of a directory given relative to the working directory of the scripts"""
+    return os.path.normpath(os.path.join(cwd, dn))
+
+def write_CAPMoN(cwd, years, res, rng):
+    """Write CAPMoN NAtChem files, one per filename pattern and year"""
+    defs = load_script_defs('CAPMoN_network.py', ['get_filenames_CAPMoN', 'get_sitecodes',
+                                                  'site_codes', 'dn'])
+    dn = resolve(defs['dn'], cwd) + os.sep
+    step = pd.Timedelta(1, 'h') if res == 'H' else pd.Timedelta(1, 'D')
+    files = {} # file name -> list of frames
+    for site in defs['site_codes']:
+        pattern = defs['get_filenames_CAPMoN'](dn, site)[0]
+        times = synthetic_times(years, res)
+        df = pd.DataFrame({'': '', 'Site ID: standard': defs['get_sitecodes'](site)[0],
+                           'Instrument co-location ID': 1,
+                           'Date start: UTC': times.strftime('%Y-%m-%d'),
+                           'Time start: UTC': times.strftime('%H:%M'),
+                           'Date end: UTC': (times + step).strftime('%Y-%m-%d'),
+                           'Time end: UTC': (times + step).strftime('%H:%M'),
+                           'HG_GASEOUS': synthetic_values(times, rng),
+                           'HG_GASEOUS_Flag': 'V0'})
+        for year in years:
+            fn = fill_pattern(pattern, str(year))
+            files.setdefault(fn, []).append(df[times.year == year])
+    for fn, frames in files.items():
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        df = pd.concat(frames)
+        with open(fn, 'w', encoding='ISO-8859-1') as f:
+            f.write('*DATASET TITLE,Synthetic CAPMoN data\n')
+            f.write('*TABLE NAME,Surface--fixed--TGM\n')
+            f.write('*TABLE COLUMN NAME--SHORT FORM,' + ','.join(df.columns[1:]) + '\n')
+            f.write('*TABLE BEGINS\n')
+            df.to_csv(f, header=False, index=False)
+            f.write('*TABLE ENDS\n')
+
+def write_EMEP(cwd, years, res, rng):
+    """Write EBAS NASA-Ames files, one per year
+
+    Files are written for the sites of all site lists of the script (also
+    the sites that are not run), as in the full EMEP tree. Each site gets its
+    files in weekly_data, biweekly_data and monthly_data at their own
+    resolution, and its file in the directory of the resolution
+    (hourly_data or daily_data) at resolution res. Years go in turn to these
+    patterns, coarse patterns first, so that the coarse directories are in
+    the tree also for one year of data.
+    """
+    defs = load_script_defs('EMEP_network.py', ['get_filenames_EMEP', 'dn'])
+    dn = resolve(defs['dn'], cwd) + os.sep
+    dn_res = {'hourly_data': 'H', 'daily_data': 'D', 'weekly_data': 'W',
+              'biweekly_data': '2W', 'monthly_data': 'M'}
+    dn_main = 'hourly_data' if res == 'H' else 'daily_data'
+    sites = []
+    for site_codes in load_script_assignments('EMEP_network.py', 'site_codes'):
+        sites += [site for site in site_codes if site not in sites]
+    for site in sites:
+        patterns = defs['get_filenames_EMEP'](dn, site)
+        p_res = [dn_res[os.path.basename(os.path.dirname(p))] for p in patterns]
+        patterns_coarse = [p for p, r in zip(patterns, p_res) if r in ['W', '2W', 'M']]
+        # pattern in the directory of the resolution (if the site has one), at resolution res
+        pattern_main = ([p for p in patterns if dn_main + '/' in p] +
+                        [p for p in patterns if p not in patterns_coarse])[:1]
+        patterns_site = patterns_coarse + pattern_main
+        for k, year in enumerate(years):
+            pattern = patterns_site[k % len(patterns_site)]
+            f_res = res if pattern in pattern_main else p_res[patterns.index(pattern)]
+            start = pd.Timestamp(year, 1, 1)
+            times = synthetic_times([year], f_res)
+            t0 = np.asarray((times - start) / pd.Timedelta(1, 'D'))
+            # measurement ends at the next start (end of year for the last one)
+            t1 = np.append(t0[1:], (pd.Timestamp(year + 1, 1, 1) - start) / pd.Timedelta(1, 'D'))
+            # EBAS name: STATION.<start>.<end>.(...).nas
+            fn = fill_pattern(pattern, '.' + start.strftime('%Y%m%d%H%M%S') + '.' +
+                              pd.Timestamp(year + 1, 1, 1).strftime('%Y%m%d%H%M%S') + '.')
+            fn = os.path.join(os.path.dirname(fn), os.path.basename(fn).replace('..', '.'))
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+            df = pd.DataFrame({'starttime': np.round(t0, 6), 'endtime': np.round(t1, 6),
+                               'Hg': synthetic_values(times, rng), 'flag_Hg': 0.})
+            with open(fn, 'w', encoding='ISO-8859-1') as f:
+                f.write('7 1001\nSynthetic EBAS data\n') # header lines, with column names
+                f.write('Startdate:                        ' + start.strftime('%Y%m%d%H%M%S') + '\n')
+                f.write('Station code:                     ' + os.path.basename(fn).split('.')[0] + '\n')
+                f.write('Component:                        mercury\n')
+                f.write('Resolution code:                  ' + res_code[f_res] + '\n')
+                df.to_csv(f, sep=' ', index=False, float_format='%.6f')
+
+def write_AMNet(cwd, years, res, rng):
+    """Write the AMNet file with all sites"""
+    defs = load_script_defs('AMNet_network.py', ['site_codes', 'fn_all'])
+    fn = resolve(defs['fn_all'], cwd)
+    step = pd.Timedelta(1, 'h') if res == 'H' else pd.Timedelta(1, 'D')
+    frames = []
+    for site in defs['site_codes']:
+        times = synthetic_times(years, res)
+        frames.append(pd.DataFrame({'SiteID': site,
+                                    'collStart': times.strftime('%Y-%m-%d %H:%M'),
+                                    'collEnd': (times + step).strftime('%Y-%m-%d %H:%M'),
+                                    'GEM': synthetic_values(times, rng), 'GEMVal': 'A'}))
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    pd.concat(frames).to_csv(fn, index=False)
+
+def write_GMOS(cwd, years, res, rng):
+    """Write one GMOS file per site"""
+    defs = load_script_defs('GMOS_network.py', ['stations_all', 'dn'])
+    dn = resolve(defs['dn'], cwd)
+    os.makedirs(dn, exist_ok=True)
+    for site in defs['stations_all']:
+        times = synthetic_times(years, res)
+        pd.DataFrame({'tstamp': times.strftime('%Y-%m-%d %H:%M:%S'), 'target': 'gem',
+                      'value': synthetic_values(times, rng)}).to_csv(
+                          os.path.join(dn, site + '.csv'), index=False)
+
+def write_MOEJ(cwd, years, res, rng):
+    """Write MOEJ files, one per site and year"""
+    defs = load_script_defs('MOEJ_network.py', ['get_filenames_MOEJ', 'stations_all', 'dn'])
+    dn = resolve(defs['dn'], cwd) + os.sep
+    for site in defs['stations_all']:
+        pattern = defs['get_filenames_MOEJ'](dn, site)[0]
+        for year in years:
+            fn = fill_pattern(pattern, str(year))
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+            times = synthetic_times([year], res)
+            pd.DataFrame({'time': times.strftime('%Y/%m/%d %H:%M'),
+                          'GEM': synthetic_values(times, rng)}).to_csv(fn, index=False)
+
+def write_MHD(cwd, years, res, rng):
+    """Write misc files of the MHD script, one per site"""
+    defs = load_script_defs('MHD.py', ['stations_all', 'dn'])
+    dn = resolve(defs['dn'], cwd)
+    os.makedirs(dn, exist_ok=True)
+    for site in defs['stations_all']:
+        times = synthetic_times(years, res)
+        pd.DataFrame({'time': times.strftime('%Y-%m-%d %H:%M'),
+                      'TGM': synthetic_values(times, rng)}).to_csv(
+                          os.path.join(dn, site + '.csv'), index=False)
+
+def write_FIN(cwd, years, res, rng):
+    """Write the Finnish file, one column per site"""
+    defs = load_script_defs('Finland_network.py', ['get_sitename', 'stations_all', 'dn'])
+    dn = resolve(defs['dn'], cwd)
+    os.makedirs(dn, exist_ok=True)
+    times = synthetic_times(years, res)
+    df = pd.DataFrame({'time': times.strftime('%d/%m/%Y %H.%M')})
+    for site in defs['stations_all']:
+        df[defs['get_sitename'](site)] = synthetic_values(times, rng)
+    df.to_csv(os.path.join(dn, 'Finnish_TGM_final.csv'), index=False)
+
+def write_MLO(cwd, years, res, rng):
+    """Write the Mauna Loa file"""
+    defs = load_script_defs('MLO_data.py', ['dn'])
+    dn = resolve(defs['dn'], cwd)
+    os.makedirs(dn, exist_ok=True)
+    times = synthetic_times(years, res)
+    values = synthetic_values(times, rng)
+    # particulate and reactive Hg (pg m-3), all columns are kept by dropna in MLO_data
+    pd.DataFrame({'Year': times.year, 'Month': times.month, 'Day': times.day,
+                  'Hour': times.hour, 'Minute': times.minute, 'Hg0 (ngm-3)': values,
+                  'Hg(p) (pgm-3)': np.round(5. * synthetic_values(times, rng), 2),
+                  'Hg(p)_2 (pgm-3)': np.round(5. * synthetic_values(times, rng), 2),
+                  'RGM (pgm-3)': np.round(10. * synthetic_values(times, rng), 2)}
+                 ).to_csv(os.path.join(dn, 'mauna_loa_All_processed.csv'), index=False)
+
+# network -> (script, writer of synthetic input files)
+networks = {'CAPMoN': ('CAPMoN_network.py', write_CAPMoN),
+            'EMEP': ('EMEP_network.py', write_EMEP),
+            'AMNet': ('AMNet_network.py', write_AMNet),
+            'GMOS': ('GMOS_network.py', write_GMOS),
+            'MOEJ': ('MOEJ_network.py', write_MOEJ),
+            'MHD': ('MHD.py', write_MHD),
+            'FIN': ('Finland_network.py', write_FIN),
+            'MLO': ('MLO_data.py', write_MLO)}
+
+def file_stats(dn):
+    """Size and modification time of each file in a directory tree"""
+    stats = {}
+    for dn_walk, _, fns in os.walk(dn):
+        for fn in fns:
+            st = os.stat(os.path.join(dn_walk, fn))
+            stats[os.path.join(dn_walk, fn)] = (st.st_size, st.st_mtime_ns)
+    return stats
+
+def make_tree(root, years, res, networks_run, seed=0):
+    """Create a synthetic tree: root/obs_datasets (input) and root/a/b (working directory)
+
+    Returns the working directory of the scripts, from which their relative
+    paths ('../../obs_datasets/...', '../misc_Data/') point into the tree,
+    and the size (bytes) of the input files written for each network.
+
+    Parameters
+    ----------
+    root : string
+         Root directory of the tree
+    years : list
+         Years of data
+    res : string
+         'H' (hourly) or 'D' (daily)
+    networks_run : list
+         Networks to create files for
+    seed : int
+         Seed of the random numbers
+    """
+    cwd = os.path.join(root, 'a', 'b')
+    os.makedirs(cwd, exist_ok=True)
+    input_bytes = {}
+    for network in networks_run:
+        stats = file_stats(root)
+        networks[network][1](cwd, years, res, np.random.default_rng(seed))
+        # files written (or rewritten) for the network
+        input_bytes[network] = sum(st[0] for f, st in file_stats(root).items()
+                                   if stats.get(f) != st)
+    return cwd, input_bytes
+
+def dir_size(dn):
+    """Total size (bytes) of the files in a directory tree"""
+    size = 0
+    for dn_walk, _, fns in os.walk(dn):
+        for fn in fns:
+            size += os.path.getsize(os.path.join(dn_walk, fn))
+    return size
+
+# run a script and write its own peak RSS (kB) to a file, also when it fails.
+# VmHWM of the process is used, ru_maxrss would include the RSS of the harness
+# at the time of the fork
+rss_wrapper = '''
+import os, resource, runpy, sys
+fn_script, fn_rss = sys.argv[1], sys.argv[2]
+sys.argv = [fn_script]
+sys.path[0] = os.path.dirname(fn_script)
+try:
+    runpy.run_path(fn_script, run_name='__main__')
+finally:
+    max_rss = None
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            max_rss = [line.split()[1] for line in f if line.startswith('VmHWM:')][0]
+    with open(fn_rss, 'w') as f:
+        f.write(str(max_rss or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+'''
+
+def run_script(fn_script, cwd, fn_log):
+    """Run a network script, returning exit code, wall time (s) and peak RSS (MB) of the script
+
+    Parameters
+    ----------
+    fn_script : string
+         Script file name (in the scripts directory)
+    cwd : string
+         Working directory
+    fn_log : string
+         File for the output of the script
+    """
+    fn_rss = fn_log + '.rss'
+    t_start = time.time()
+    with open(fn_log, 'w') as f_log:
+        returncode = subprocess.call([sys.executable, '-c', rss_wrapper,
+                                      os.path.join(dn_scripts, fn_script), fn_rss],
+                                     cwd=cwd, stdout=f_log, stderr=subprocess.STDOUT)
+    seconds = time.time() - t_start
+    max_rss = np.nan # not written if the process was killed
+    if os.path.exists(fn_rss):
+        with open(fn_rss) as f:
+            max_rss = int(f.read()) / 1024. # kB on Linux
+        os.remove(fn_rss)
+    return returncode, seconds, max_rss
+
+def report_failure(network, fn_log, n_lines=5, empty=False):
+    """Print the end of the log of a failed script, or of a script without output rows
+
+    Parameters
+    ----------
+    network : string
+         Name of the network
+    fn_log : string
+         File with the output of the script
+    n_lines : int
+         Number of lines of the log to print
+    empty : bool
+         Script ran, but its run report has no output rows
+    """
+    with open(fn_log, 'r', errors='replace') as f:
+        lines = f.readlines()[-n_lines:]
+    status = 'NO OUTPUT ROWS: ' if empty else 'FAILED: '
+    print(status + network + ' (log: ' + fn_log + ')\n' + ''.join(lines), file=sys.stderr)
+
+def count_output_rows(do, network):
+    """Number of outputted rows of a network, from its run report (0 if no report)
+
+    Parameters
+    ----------
+    do : string
+         Output directory
+    network : string
+         Name of the network
+    """
+    fn_report = os.path.join(do, 'run_report_' + network + '.csv')
+    if not os.path.exists(fn_report):
+        return 0
+    return int(read_run_report(fn_report)['n_rows'].sum())
+
+def get_version():
+    """Short git commit of the scripts ('' if not a git repository)"""
+    try:
+        out = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=dn_scripts,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def run_scaling(root, year_counts, res_list, networks_run, fo, first_year=1920, seed=0,
+                keep=False):
+    """Run all networks on synthetic trees of increasing size, appending results to fo
+
+    Parameters
+    ----------
+    root : string
+         Directory for the synthetic trees
+    year_counts : list
+         Numbers of years of data
+    res_list : list
+         Time resolutions of data ('H', 'D')
+    networks_run : list
+         Networks to run
+    fo : string
+         CSV file of the scaling curve (results are appended)
+    first_year : int
+         First year of data
+    seed : int
+         Seed of the random numbers
+    keep : bool
+         Keep the synthetic trees after the runs
+    """
+    version = get_version()
+    results = []
+    for res in res_list:
+        for n_years in year_counts:
+            dn_tree = os.path.join(root, 'tree_%s_%dy' % (res, n_years))
+            cwd, input_bytes = make_tree(dn_tree, list(range(first_year, first_year + n_years)),
+                                         res, networks_run, seed)
+            do = resolve('../misc_Data/', cwd)
+            for network in networks_run:
+                shutil.rmtree(do, ignore_errors=True) # only outputs of this run
+                os.makedirs(do)
+                fn_log = os.path.join(dn_tree, 'log_' + network + '.txt')
+                returncode, seconds, max_rss = run_script(networks[network][0], cwd, fn_log)
+                n_rows = count_output_rows(do, network)
+                results.append({'version': version, 'network': network, 'res': res,
+                                'n_years': n_years, 'input_bytes': input_bytes[network],
+                                'seconds': round(seconds, 3), 'max_rss_mb': round(max_rss, 1),
+                                'output_bytes': dir_size(do), 'n_rows': n_rows,
+                                'returncode': returncode})
+                print(results[-1])
+                if returncode != 0:
+                    report_failure(network, fn_log)
+                elif n_rows == 0: # ran, but measured an empty run
+                    report_failure(network, fn_log, empty=True)
+            if not keep:
+                shutil.rmtree(dn_tree)
+    df = pd.DataFrame(results)
+    df.to_csv(fo, mode='a', index=False, header=not os.path.exists(fo))
+    df_failed = df[(df['returncode'] != 0) | (df['n_rows'] == 0)]
+    if len(df_failed) > 0:
+        print('%d of %d runs FAILED or without output rows:\n' % (len(df_failed), len(df))
+              + df_failed[['network', 'res', 'n_years', 'n_rows',
+                           'returncode']].to_string(index=False),
+              file=sys.stderr)
+    return df
+
+#%% Run the scaling curve
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scaling of the network scripts on synthetic data')
+    parser.add_argument('--root', default=None) # directory for synthetic trees (default: temporary)
+    parser.add_argument('--fo', default='../misc_Data/scaling_curve.csv')
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--res', nargs='+', choices=['H', 'D'], default=['D', 'H'])
+    parser.add_argument('--networks', nargs='+', choices=list(networks), default=list(networks))
+    parser.add_argument('--first-year', type=int, default=1920)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', action='store_true')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp() if args.root is None else args.root
+    df_scaling = run_scaling(root, args.years, args.res, args.networks, args.fo,
+                             args.first_year, args.seed, args.keep)
+    print(df_scaling.pivot_table(index=['res', 'n_years'], columns='network', values='seconds'))
+    if ((df_scaling['returncode'] != 0) | (df_scaling['n_rows'] == 0)).any(): # not a valid scaling curve
+        sys.exit(1)
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Split the site loops of the network scripts into shards for HPC job arrays,
+and merge the outputs of the shards into the final output directory
+@author: arifeinberg
+"""
+#%% Import packages
+import argparse
+import glob
+import os
+import re
+import shutil
+import time
+import zlib
+import pandas as pd
+from compressed_io import glob_any, stat_any
+#%% Functions used for sharding
+report_columns = ['site', 'output', 'n_rows', 'input_size', 'seconds', 'n_spikes',
+                  'n_no_utc']
+
+# resolution suffix of outputted site files, e.g. PAL_d.csv
+output_pattern = re.compile(r'_(h|d|w|2w|m)\.csv$')
+
+# site codes that are outputted by more than one network script (PAL and RAO
+# in EMEP_network.py and GMOS_network.py), add codes here when site lists change
+shared_site_codes = ['PAL', 'RAO']
+
+def parse_shard(shard_str):
+    """Convert a shard string of the form 'i/N' to integers (i, N)
+
+    Parameters
+    ----------
+    shard_str : string
+         Shard index and number of shards, e.g. '0/8' (index starts at 0)
+    """
+    try:
+        i_shard, n_shards = [int(s) for s in shard_str.split('/')]
+    except ValueError:
+        raise ValueError('Shard must be given as i/N, not: ' + shard_str)
+    if (n_shards < 1) or (i_shard < 0) or (i_shard >= n_shards):
+        raise ValueError('Shard index must be between 0 and N-1: ' + shard_str)
+    return i_shard, n_shards
+
+def get_shard_arg(argv=None):
+    """Read the --shard i/N option from the command line, None if not given
+
+    Parameters
+    ----------
+    argv : list
+         Command line arguments (default: sys.argv)
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--shard', default=None)
+    args, _ = parser.parse_known_args(argv)
+    if args.shard is None: # run all sites in one job
+        return None
+    return parse_shard(args.shard)
+
+def estimate_input_size(fn_a):
+    """Estimate the input size (in bytes) of a site from its file patterns
+
+    Parameters
+    ----------
+    fn_a : list
+         List of file names (can include wildcards)
+    """
+    size = 0
+    for fn in fn_a: # loop over filenames
+        for f in glob_any(fn): # loop over matching files (also compressed)
+            size += stat_any(f)[0]
+    return size
+
+def assign_shards(network, site_codes, sizes, n_shards):
+    """Deterministically assign each site to a shard, balanced by input size
+
+    Sites are assigned from largest to smallest to the least loaded shard.
+    Shards are rotated by a hash of the network name, so that the largest
+    site of every network does not end up in the same job.
+
+    Parameters
+    ----------
+    network : string
+         Name of the network
+    site_codes : list
+         Site codes of the network
+    sizes : list
+         Estimated input size of each site (any consistent unit)
+    n_shards : int
+         Number of shards
+    """
+    # order sites by decreasing size, ties broken by site code
+    order = sorted(range(len(site_codes)), key=lambda i: (-sizes[i], site_codes[i]))
+    # stable offset for the network (not python hash, which is salted)
+    offset = zlib.crc32(network.encode('utf-8')) % n_shards
+
+    load = [0] * n_shards
+    shard_sites = {}
+    for i in order:
+        i_min = load.index(min(load)) # least loaded shard, lowest index for ties
+        load[i_min] += sizes[i]
+        shard_sites[site_codes[i]] = (i_min + offset) % n_shards
+    return shard_sites
+
+def select_shard(network, site_codes, sizes, shard):
+    """Return the site codes to be processed by this job, in original order
+
+    Parameters
+    ----------
+    network : string
+         Name of the network
+    site_codes : list
+         Site codes of the network
+    sizes : list
+         Estimated input size of each site
+    shard : tuple
+         (shard index, number of shards), or None to process all sites
+    """
+    if shard is None:
+        return list(site_codes)
+    i_shard, n_shards = shard
+    shard_sites = assign_shards(network, site_codes, sizes, n_shards)
+    return [s for s in site_codes if shard_sites[s] == i_shard]
+
+def get_output_dir(do, shard):
+    """Return (and create) the output directory of this job
+
+    Parameters
+    ----------
+    do : string
+         Final output directory
+    shard : tuple
+         (shard index, number of shards), or None to process all sites
+    """
+    if shard is None:
+        return do
+    do_shard = os.path.join(do, 'shards',
+                            'shard_%d_of_%d' % shard, '')
+    os.makedirs(do_shard, exist_ok=True)
+    return do_shard
+
+def get_file_key(network, site):
+    """Return the name of the output files of a site (without resolution suffix)
+
+    The site code, prefixed with the network when another network script also
+    outputs the code (e.g. EMEP_PAL and GMOS_PAL), so that networks don't
+    overwrite each other's files in the output directory.
+
+    Parameters
+    ----------
+    network : string
+         Name of the network
+    site : string
+         Site code
+    """
+    if site in shared_site_codes:
+        return network + '_' + site
+    return site
+
+def report_entry(site, fo, df, input_size, t_start):
+    """Create the run report entry of a processed site
+
+    Parameters
+    ----------
+    site : string
+         Site code
+    fo : string
+         Output file name
+    df : DataFrame
+         Outputted data of the site (number of screened spikes in df.attrs['n_spikes'],
+         number of rows dropped without UTC time in df.attrs['n_no_utc'])
+    input_size : int
+         Estimated input size of the site
+    t_start : float
+         Time when the processing of the site started (time.time())
+    """
+    return {'site': site,
+            'output': os.path.basename(fo),
+            'n_rows': len(df),
+            'input_size': input_size,
+            'seconds': round(time.time() - t_start, 3),
+            'n_spikes': df.attrs.get('n_spikes', 0),
+            'n_no_utc': df.attrs.get('n_no_utc', 0)}
+
+def write_run_report(do, network, report):
+    """Write the run report of a network to the output directory
+
+    Parameters
+    ----------
+    do : string
+         Output directory (of the shard)
+    network : string
+         Name of the network
+    report : list
+         List of run report entries (see report_entry)
+    """
+    fo = os.path.join(do, 'run_report_' + network + '.csv')
+    # keep the header when the shard has no sites of the network
+    pd.DataFrame(report, columns=report_columns).to_csv(fo, index=False)
+    return fo
+
+def read_run_report(f):
+    """Read a run report, empty DataFrame if the report has no sites
+
+    Parameters
+    ----------
+    f : string
+         Run report file name
+    """
+    try:
+        return pd.read_csv(f)
+    except pd.errors.EmptyDataError: # report written without header
+        return pd.DataFrame(columns=report_columns)
+
+def read_run_outputs(do):
+    """Return the file key, network and site code of each output, from the run reports
+
+    Parameters
+    ----------
+    do : string
+         Output directory
+    """
+    frames = []
+    for f in sorted(glob.glob(os.path.join(do, 'run_report_*.csv'))):
+        network = os.path.basename(f)[len('run_report_'):-len('.csv')]
+        df_report = read_run_report(f)
+        if len(df_report) == 0: # no sites of the network
+            continue
+        frames.append(pd.DataFrame({'key': df_report['output'].str.replace(output_pattern, '',
+                                                                           regex=True),
+                                    'network': network,
+                                    'site': df_report['site'],
+                                    'output': df_report['output']}))
+    if len(frames) == 0:
+        return pd.DataFrame(columns=['key', 'network', 'site', 'output'])
+    return pd.concat(frames, ignore_index=True)
+
+def read_site_codes(do):
+    """Return the (network, site code) of each file key (see get_file_key), from the
+    run reports in the output directory
+
+    Parameters
+    ----------
+    do : string
+         Output directory
+    """
+    df_outputs = read_run_outputs(do)
+    return dict(zip(df_outputs['key'], zip(df_outputs['network'], df_outputs['site'])))
+
+def read_site_networks(do):
+    """Return the network of each site (file key, see get_file_key), from the run
+    reports in the output directory
+
+    Parameters
+    ----------
+    do : string
+         Output directory
+    """
+    return {key: network for key, (network, site) in read_site_codes(do).items()}
+
+def merge_shards(do, n_shards=None):
+    """Collect the outputs and run reports of all shards into the output directory
+
+    Parameters
+    ----------
+    do : string
+         Final output directory
+    n_shards : int
+         Expected number of shards, to check that no job is missing
+    """
+    dn_shards = sorted(glob.glob(os.path.join(do, 'shards', 'shard_*_of_*')))
+    if n_shards is not None: # check all shards are there
+        expected = [os.path.join(do, 'shards', 'shard_%d_of_%d' % (i, n_shards))
+                    for i in range(n_shards)]
+        missing = [d for d in expected if d not in dn_shards]
+        if len(missing) > 0:
+            raise FileNotFoundError('Missing shard outputs: ' + ', '.join(missing))
+        dn_shards = expected
+
+    reports = {} # run reports of each network
+    moved = {} # output file -> shard it came from
+    for dn_shard in dn_shards:
+        fn_shard = glob.glob(os.path.join(dn_shard, '*.csv')) \
+            + glob.glob(os.path.join(dn_shard, '*_clim.npz')) \
+            + glob.glob(os.path.join(dn_shard, '*_quick.npz')) # climatology cubes and quick-looks
+        for f in sorted(fn_shard):
+            fn = os.path.basename(f)
+            if fn.startswith('run_report_'): # combine reports later
+                network = fn[len('run_report_'):-len('.csv')]
+                df_report = read_run_report(f)
+                reports.setdefault(network, [])
+                if len(df_report) > 0: # skip shards without sites of the network
+                    reports[network].append(df_report)
+                continue
+            if fn in moved: # same site written by two shards
+                raise Exception(fn + ' found in ' + moved[fn] + ' and ' + dn_shard)
+            moved[fn] = dn_shard
+            shutil.move(f, os.path.join(do, fn))
+
+    # write combined run report for each network
+    for network in reports:
+        if len(reports[network]) == 0: # no shard had sites of the network
+            write_run_report(do, network, [])
+            continue
+        df_report = pd.concat(reports[network]).sort_values(by='site')
+        write_run_report(do, network, df_report.to_dict('records'))
+    print('Merged %d files from %d shards' % (len(moved), len(dn_shards)))
+    return list(moved)
+
+#%% Merge the shards after all jobs of the array are finished
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merge sharded outputs')
+    parser.add_argument('command', choices=['merge'])
+    parser.add_argument('do', nargs='?', default='../misc_Data/') # output directory
+    parser.add_argument('--n-shards', type=int, default=None)
+    args = parser.parse_args()
+    merge_shards(args.do, args.n_shards)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Pairwise correlations (and lagged correlations) between the daily series of
+all sites, with pairwise-complete data from blocked matrix products
+@author: arifeinberg
+"""
+#%% Import packages
+import argparse
+import numpy as np
+from scipy import stats
+from export_panel import find_site_files
+from site_reconciliation import align_days, load_gem_series
+#%% Functions used for correlations
+def load_matrix(site_files):
+    """Load the daily series of all sites into an aligned (day, site) matrix, NaN where missing
+
+    Parameters
+    ----------
+    site_files : dict
+         Site -> outputted site file
+    """
+    sites, series_list = [], []
+    for site, fn in site_files.items():
+        series = load_gem_series(fn).dropna()
+        if len(series) > 0:
+            sites.append(site)
+            series_list.append(series.groupby(level=0).mean()) # one value per day
+    days, matrix = align_days(series_list)
+    return days, sites, matrix.T
+
+def rank_columns(X):
+    """Rank the valid values of each column (average ranks for ties), NaN kept
+
+    Parameters
+    ----------
+    X : array
+         (time, site) matrix with NaN where missing
+    """
+    R = np.full(X.shape, np.nan)
+    for j in range(X.shape[1]):
+        bool_valid = ~np.isnan(X[:, j])
+        R[bool_valid, j] = stats.rankdata(X[bool_valid, j])
+    return R
+
+def pairwise_corr(X, Y=None, min_count=30, block=256):
+    """Pearson correlation of all pairs of columns, on times where both are valid
+
+    Sums over the pairwise-complete times are matrix products of the
+    (zero-filled) data and the valid-data masks, computed for blocks of
+    columns of X to limit memory.
+
+    Parameters
+    ----------
+    X : array
+         (time, site) matrix with NaN where missing
+    Y : array
+         Second (time, site) matrix, e.g. lagged X (default: X)
+    min_count : int
+         Minimum number of common times (NaN below)
+    block : int
+         Number of columns of X in each block
+    """
+    Y = X if Y is None else Y
+    # center columns for numerical stability (does not change correlations)
+    X = X - np.nanmean(X, axis=0)
+    Y = Y - np.nanmean(Y, axis=0)
+    MX, MY = (~np.isnan(X)).astype(float), (~np.isnan(Y)).astype(float)
+    X0, Y0 = np.nan_to_num(X), np.nan_to_num(Y)
+
+    r = np.full((X.shape[1], Y.shape[1]), np.nan)
+    counts = np.zeros((X.shape[1], Y.shape[1]), dtype=np.int64)
+    for b0 in range(0, X.shape[1], block):
+        b = slice(b0, b0 + block)
+        n = MX[:, b].T @ MY
+        sx = X0[:, b].T @ MY
+        sy = MX[:, b].T @ Y0
+        sxx = (X0[:, b]**2).T @ MY
+        syy = MX[:, b].T @ Y0**2
+        sxy = X0[:, b].T @ Y0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = n * sxy - sx * sy
+            var = (n * sxx - sx**2) * (n * syy - sy**2)
+            r_b = cov / np.sqrt(var)
+        r_b[(n < max(min_count, 2)) | ~(var > 0)] = np.nan
+        r[b] = np.clip(r_b, -1., 1.)
+        counts[b] = np.rint(n).astype(np.int64)
+    return r, counts
+
+def pairwise_spearman(X, Y=None, min_count=30):
+    """Spearman correlation of all pairs of columns, ranked on the times where both are valid
+
+    For each column i of X, its values are ranked on the times valid in each
+    column j of Y at once, from one sort of column i and cumulative counts of
+    the valid times of the columns of Y (average ranks for ties). The columns
+    of Y are ranked on the times valid in column i, and the Pearson
+    correlation of the ranks of each pair is a sum over columns.
+
+    Parameters
+    ----------
+    X : array
+         (time, site) matrix with NaN where missing
+    Y : array
+         Second (time, site) matrix, e.g. lagged X (default: X)
+    min_count : int
+         Minimum number of common times (NaN below)
+    """
+    Y = X if Y is None else Y
+    r = np.full((X.shape[1], Y.shape[1]), np.nan)
+    counts = np.zeros((X.shape[1], Y.shape[1]), dtype=np.int64)
+    for i in range(X.shape[1]):
+        bool_i = ~np.isnan(X[:, i])
+        if not bool_i.any():
+            continue
+        x, S = X[bool_i, i], Y[bool_i]
+        M = ~np.isnan(S)
+        # ranks of x among the times valid in each column of Y, ties get average rank
+        order = np.argsort(x, kind='stable')
+        x_sorted = x[order]
+        csum = np.cumsum(M[order], axis=0)
+        bool_new = np.concatenate([[True], x_sorted[1:] != x_sorted[:-1]])
+        starts = np.flatnonzero(bool_new)
+        ends = np.concatenate([starts[1:], [len(x)]]) - 1
+        before = np.vstack([np.zeros((1, Y.shape[1])), csum])[starts] # valid times below tie group
+        R_x = np.empty(M.shape)
+        R_x[order] = (before + (csum[ends] - before + 1) / 2)[np.cumsum(bool_new) - 1]
+        R_y = rank_columns(S)
+        # Pearson correlation of the ranks on common times, for all columns of Y
+        R_x0, R_y0 = np.where(M, R_x, 0.), np.nan_to_num(R_y)
+        n = M.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = n * np.sum(R_x0 * R_y0, axis=0) - R_x0.sum(axis=0) * R_y0.sum(axis=0)
+            var = (n * np.sum(R_x0**2, axis=0) - R_x0.sum(axis=0)**2) * \
+                (n * np.sum(R_y0**2, axis=0) - R_y0.sum(axis=0)**2)
+            r_i = cov / np.sqrt(var)
+        r_i[(n < max(min_count, 2)) | ~(var > 0)] = np.nan
+        r[i] = np.clip(r_i, -1., 1.)
+        counts[i] = n
+    return r, counts
+
+def corr_matrix(X, method='pearson', min_count=30, block=256):
+    """Pearson or Spearman correlation matrix with pairwise-complete counts
+
+    For Spearman, both sites of each pair are ranked on their common times.
+
+    Parameters
+    ----------
+    X : array
+         (time, site) matrix with NaN where missing
+    method : string
+         'pearson' or 'spearman'
+    min_count : int
+         Minimum number of common times
+    block : int
+         Number of columns in each block
+    """
+    if method == 'spearman':
+        return pairwise_spearman(X, None, min_count)
+    elif method != 'pearson':
+        raise ValueError('Unknown correlation method: ' + method)
+    return pairwise_corr(X, None, min_count, block)
+
+def lagged_corr(X, max_lag, method='pearson', min_count=30, block=256):
+    """Correlation of site i at time t with site j at time t + lag, for lags -max_lag..max_lag
+
+    Returns lags, correlations and counts of shape (n_lag, n_site, n_site),
+    and the lag of the largest correlation of each pair.
+
+    Parameters
+    ----------
+    X : array
+         (time, site) matrix with NaN where missing
+    max_lag : int
+         Largest lag (time steps)
+    method : string
+         'pearson' or 'spearman'
+    min_count : int
+         Minimum number of common times
+    block : int
+         Number of columns in each block
+    """
+    if method == 'spearman': # pairs ranked on their common times
+        corr = lambda X_a, X_b: pairwise_spearman(X_a, X_b, min_count)
+    elif method == 'pearson':
+        corr = lambda X_a, X_b: pairwise_corr(X_a, X_b, min_count, block)
+    else:
+        raise ValueError('Unknown correlation method: ' + method)
+    lags = np.arange(-max_lag, max_lag + 1)
+    r = np.full((len(lags), X.shape[1], X.shape[1]), np.nan)
+    counts = np.zeros((len(lags), X.shape[1], X.shape[1]), dtype=np.int64)
+    for k, lag in enumerate(lags):
+        if lag >= 0:
+            r[k], counts[k] = corr(X[:len(X) - lag], X[lag:])
+        else:
+            r[k], counts[k] = corr(X[-lag:], X[:len(X) + lag])
+    r_fill = np.where(np.isnan(r), -np.inf, r)
+    best_lag = np.where(np.isnan(r).all(axis=0), 0, lags[np.argmax(r_fill, axis=0)])
+    return lags, r, counts, best_lag
+
+def save_corr(fo, sites, r, counts, **extra):
+    """Save correlation matrices to a compressed .npz file (float32 correlations)
+
+    Parameters
+    ----------
+    fo : string
+         Output file name
+    sites : list
+         Site codes (order of rows and columns)
+    r : array
+         Correlations
+    counts : array
+         Number of common times
+    """
+    np.savez_compressed(fo, sites=np.array(sites), r=r.astype(np.float32),
+                        counts=counts.astype(np.int32), **extra)
+
+#%% Correlations between all outputted sites
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Correlations between the outputted site series')
+    parser.add_argument('--do', default='../misc_Data/') # directory of outputted files, change to your path
+    parser.add_argument('--fo', default='../misc_Data/corr_TGM.npz')
+    parser.add_argument('--res', default='d')
+    parser.add_argument('--method', choices=['pearson', 'spearman'], default='pearson')
+    parser.add_argument('--max-lag', type=int, default=0) # lags in days (0 for no lags)
+    parser.add_argument('--min-count', type=int, default=30)
+    args = parser.parse_args()
+
+    days, sites, X = load_matrix(find_site_files(args.do, args.res))
+    if args.max_lag > 0:
+        lags, r, counts, best_lag = lagged_corr(X, args.max_lag, args.method, args.min_count)
+        save_corr(args.fo, sites, r, counts, lags=lags, best_lag=best_lag)
+    else:
+        r, counts = corr_matrix(X, args.method, args.min_count)
+        save_corr(args.fo, sites, r, counts)
+    print('Correlations of %d sites saved to %s' % (len(sites), args.fo))
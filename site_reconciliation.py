@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Reconcile stations that are reported by several networks (e.g. Pallas in EMEP,
+GMOS and FMI), into one daily series with the source of each day
+@author: arifeinberg
+"""
+#%% Import packages
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from export_panel import find_network_site_files, read_site_variables
+from site_registry import SiteRegistry
+#%% Functions used for reconciliation
+# default priority of networks (first is preferred), national datasets before
+# the global networks, and updated datasets (FIN, MLO) before the EMEP/AMNet versions
+network_priority = ['FIN', 'MLO', 'EMEP', 'AMNet', 'CAPMoN', 'MOEJ', 'MHD', 'ELA', 'GMOS']
+
+def find_duplicate_groups(registry, r_km=5., aliases=None):
+    """Group sites of different networks that are at the same location
+
+    Sites of the same network are never grouped (e.g. Troll and Trollhaugen).
+
+    Parameters
+    ----------
+    registry : SiteRegistry
+         Registry of sites with coordinates
+    r_km : float
+         Maximum distance (km) between sites of the same station
+    aliases : list
+         Extra pairs of ((network, site), (network, site)) to group
+    """
+    pairs = registry.pairs_within(r_km)
+    pairs = pairs[pairs['network_1'] != pairs['network_2']]
+    edges = [((p.network_1, p.site_1), (p.network_2, p.site_2))
+             for p in pairs.itertuples(index=False)]
+    if aliases is not None:
+        edges += [tuple(a) for a in aliases]
+
+    # connected components with union-find
+    parent = {}
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]] # path halving
+            node = parent[node]
+        return node
+    for a, b in edges:
+        parent[find(a)] = find(b)
+
+    groups = {}
+    for node in parent:
+        groups.setdefault(find(node), []).append(node)
+    return sorted([sorted(g) for g in groups.values()])
+
+def sort_by_priority(members, priority=None):
+    """Sort (network, site) members of a group by network priority
+
+    Parameters
+    ----------
+    members : list
+         (network, site) tuples
+    priority : list
+         Networks in order of preference (default: network_priority)
+    """
+    if priority is None:
+        priority = network_priority
+    rank = {n: i for i, n in enumerate(priority)}
+    return sorted(members, key=lambda m: (rank.get(m[0], len(rank)), m))
+
+def align_days(series_list):
+    """Put daily series on a common day index, as a (member, day) matrix
+
+    Parameters
+    ----------
+    series_list : list
+         Series with datetime index (one per member)
+    """
+    day_idx = [pd.DatetimeIndex(s.index).values.astype('datetime64[D]').astype('int64')
+               for s in series_list]
+    day_min = min(d.min() for d in day_idx if len(d) > 0)
+    day_max = max(d.max() for d in day_idx if len(d) > 0)
+    matrix = np.full((len(series_list), day_max - day_min + 1), np.nan)
+    for i, (s, d) in enumerate(zip(series_list, day_idx)):
+        matrix[i, d - day_min] = s.values # assign by integer day position
+    days = (np.arange(day_min, day_max + 1)).astype('datetime64[D]')
+    return pd.DatetimeIndex(days.astype('datetime64[ns]')), matrix
+
+def reconcile_group(series_dict, priority=None, how='priority'):
+    """Merge the series of one station from several networks
+
+    Parameters
+    ----------
+    series_dict : dict
+         (network, site) -> daily Series of the station
+    priority : list
+         Networks in order of preference (default: network_priority)
+    how : string
+         'priority' (value of preferred network available on each day) or
+         'mean' (mean of all networks available on each day)
+    """
+    members = sort_by_priority([m for m in series_dict if len(series_dict[m].dropna()) > 0],
+                               priority)
+    if len(members) == 0:
+        return pd.DataFrame(columns=['value', 'source', 'n_sources'])
+    days, matrix = align_days([series_dict[m].dropna() for m in members])
+    bool_valid = ~np.isnan(matrix)
+    n_sources = bool_valid.sum(axis=0)
+    first = np.argmax(bool_valid, axis=0) # first member (by priority) with data
+
+    if how == 'priority':
+        value = matrix[first, np.arange(matrix.shape[1])]
+    elif how == 'mean':
+        with np.errstate(invalid='ignore'):
+            value = np.nansum(matrix, axis=0) / n_sources
+    else:
+        raise ValueError('Unknown reconciliation: ' + how)
+
+    labels = np.array([m[0] + ':' + m[1] for m in members])
+    df = pd.DataFrame({'value': value,
+                       'source': pd.Categorical(labels[first], categories=labels),
+                       'n_sources': n_sources}, index=pd.Index(days, name='time'))
+    return df[n_sources > 0]
+
+def load_gem_series(fn):
+    """Load the daily GEM/TGM series of an outputted site file
+
+    Parameters
+    ----------
+    fn : string
+         Filename
+    """
+    site_vars = read_site_variables(fn)
+    if 'GEM_TGM' not in site_vars:
+        return pd.Series(dtype=float)
+    return site_vars['GEM_TGM'][0]
+
+def reconcile_all(site_files, registry=None, r_km=5., aliases=None, priority=None,
+                  how='priority'):
+    """Reconcile all stations reported by several networks
+
+    Parameters
+    ----------
+    site_files : dict
+         (network, site) -> outputted site file
+    registry : SiteRegistry
+         Registry of sites (default: SiteRegistry())
+    r_km : float
+         Maximum distance (km) between sites of the same station
+    aliases : list
+         Extra pairs of ((network, site), (network, site)) to group
+    priority : list
+         Networks in order of preference (default: network_priority)
+    how : string
+         'priority' or 'mean'
+    """
+    if registry is None:
+        registry = SiteRegistry()
+    groups = find_duplicate_groups(registry, r_km, aliases)
+
+    results = {}
+    for group in groups:
+        members = [m for m in group if m in site_files]
+        if len(members) < 2: # nothing to reconcile
+            continue
+        series_dict = {m: load_gem_series(site_files[m]) for m in members}
+        name = sort_by_priority(members, priority)[0] # named after preferred site
+        results[name] = reconcile_group(series_dict, priority, how)
+    return results
+
+#%% Reconcile the outputted stations reported by several networks
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reconcile stations reported by several networks')
+    parser.add_argument('--do', default='../misc_Data/') # directory of outputted files, change to your path
+    parser.add_argument('--res', default='d')
+    parser.add_argument('--how', choices=['priority', 'mean'], default='priority')
+    args = parser.parse_args()
+
+    for group in find_duplicate_groups(SiteRegistry()):
+        print(', '.join(n + ':' + s for n, s in sort_by_priority(group)))
+    # files of each (network, site), one per network also for shared site codes
+    site_files = find_network_site_files(args.do, args.res)
+    results = reconcile_all(site_files, how=args.how)
+    for (network, site), df in results.items():
+        fo = os.path.join(args.do, network + '_' + site + '_reconciled.csv')
+        df.to_csv(fo)
+        print('Reconciled %s:%s saved to %s' % (network, site, fo))
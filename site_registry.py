@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Registry of the sites of all networks with their coordinates, and a spatial
+index for radius and nearest-site queries
+@author: arifeinberg
+"""
+#%% Import packages
+import os
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+#%% Registry class
+R_earth = 6371.0 # radius of Earth (km)
+
+# site metadata (approximate coordinates), in same directory as this script
+fn_metadata = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site_metadata.csv')
+
+def lonlat_to_xyz(lon, lat):
+    """Convert longitude/latitude (degrees) to points on the unit sphere
+
+    Parameters
+    ----------
+    lon : array
+         Longitudes (degrees)
+    lat : array
+         Latitudes (degrees)
+    """
+    lon_r = np.deg2rad(np.asarray(lon, dtype=float))
+    lat_r = np.deg2rad(np.asarray(lat, dtype=float))
+    return np.column_stack([np.cos(lat_r) * np.cos(lon_r),
+                            np.cos(lat_r) * np.sin(lon_r),
+                            np.sin(lat_r)])
+
+def km_to_chord(dist_km):
+    """Convert great-circle distance (km) to chord length on the unit sphere"""
+    return 2. * np.sin(np.minimum(np.asarray(dist_km) / R_earth, np.pi) / 2.)
+
+def chord_to_km(chord):
+    """Convert chord length on the unit sphere to great-circle distance (km)"""
+    return 2. * R_earth * np.arcsin(np.minimum(np.asarray(chord) / 2., 1.))
+
+class SiteRegistry:
+    """Sites of all networks (site, network, name, latitude, longitude, elevation)
+
+    Parameters
+    ----------
+    fn : string
+         CSV file of site metadata (default: site_metadata.csv)
+    """
+
+    def __init__(self, fn=fn_metadata):
+        self.sites = pd.read_csv(fn)
+        # KD-tree on the unit sphere: chord distance increases with great-circle distance
+        self.tree = cKDTree(lonlat_to_xyz(self.sites['longitude'], self.sites['latitude']))
+
+    def get_site(self, site, network=None):
+        """Return the registry entry of a site (first match if network not given)
+
+        Parameters
+        ----------
+        site : string
+             Site code
+        network : string
+             Name of the network (needed for codes used by several networks, e.g. PAL)
+        """
+        bool_site = self.sites['site'] == site
+        if network is not None:
+            bool_site &= self.sites['network'] == network
+        if not bool_site.any():
+            raise KeyError('Site not in registry: ' + site)
+        return self.sites[bool_site].iloc[0]
+
+    def coords(self, network=None):
+        """Return dict of site code -> (latitude, longitude, elevation)
+
+        Parameters
+        ----------
+        network : string
+             Name of the network (None for all)
+        """
+        sites = self.sites if network is None else self.sites[self.sites['network'] == network]
+        return {s.site: (s.latitude, s.longitude, s.elevation)
+                for s in sites.itertuples(index=False)}
+
+    def output_coords(self, site_codes):
+        """Return dict of site -> (latitude, longitude, elevation), also for the file
+        keys of outputted sites whose code is used by several networks (e.g. EMEP_PAL)
+
+        Parameters
+        ----------
+        site_codes : dict
+             File key -> (network, site code), e.g. shard_batch.read_site_codes
+        """
+        coords = self.coords()
+        for key, (network, site) in site_codes.items():
+            bool_site = self.sites['site'] == site
+            if not bool_site.any():
+                continue
+            if (bool_site & (self.sites['network'] == network)).any(): # entry of the network
+                bool_site &= self.sites['network'] == network
+            s = self.sites[bool_site].iloc[0]
+            coords[key] = (s.latitude, s.longitude, s.elevation)
+        return coords
+
+    def within_radius(self, lat, lon, r_km):
+        """Return all sites within r_km of a point, sorted by distance
+
+        Parameters
+        ----------
+        lat : float
+             Latitude of point
+        lon : float
+             Longitude of point
+        r_km : float
+             Radius (km)
+        """
+        xyz = lonlat_to_xyz([lon], [lat])[0]
+        inds = self.tree.query_ball_point(xyz, km_to_chord(r_km))
+        return self.with_distance(inds, xyz)
+
+    def nearest(self, lat, lon, k=1):
+        """Return the k nearest sites to a point, sorted by distance
+
+        Parameters
+        ----------
+        lat : float
+             Latitude of point
+        lon : float
+             Longitude of point
+        k : int
+             Number of sites
+        """
+        xyz = lonlat_to_xyz([lon], [lat])[0]
+        _, inds = self.tree.query(xyz, k=min(k, len(self.sites)))
+        return self.with_distance(np.atleast_1d(inds), xyz)
+
+    def neighbours(self, site, r_km, network=None):
+        """Return the other sites within r_km of a site
+
+        Parameters
+        ----------
+        site : string
+             Site code
+        r_km : float
+             Radius (km)
+        network : string
+             Name of the network of the site
+        """
+        entry = self.get_site(site, network)
+        df = self.within_radius(entry['latitude'], entry['longitude'], r_km)
+        return df[~((df['site'] == site) & (df['network'] == entry['network']))]
+
+    def pairs_within(self, r_km):
+        """Return all pairs of sites within r_km of each other
+
+        Parameters
+        ----------
+        r_km : float
+             Radius (km)
+        """
+        pairs = self.tree.query_pairs(km_to_chord(r_km), output_type='ndarray')
+        if len(pairs) == 0:
+            return pd.DataFrame(columns=['site_1', 'network_1', 'site_2', 'network_2',
+                                         'distance_km'])
+        xyz = self.tree.data
+        chord = np.linalg.norm(xyz[pairs[:, 0]] - xyz[pairs[:, 1]], axis=1)
+        return pd.DataFrame({'site_1': self.sites['site'].values[pairs[:, 0]],
+                             'network_1': self.sites['network'].values[pairs[:, 0]],
+                             'site_2': self.sites['site'].values[pairs[:, 1]],
+                             'network_2': self.sites['network'].values[pairs[:, 1]],
+                             'distance_km': chord_to_km(chord)}).sort_values(by='distance_km')
+
+    def with_distance(self, inds, xyz):
+        """Return registry entries with distance (km) from a point, sorted by distance
+
+        Parameters
+        ----------
+        inds : list
+             Row indices of sites
+        xyz : array
+             Point on the unit sphere
+        """
+        inds = np.asarray(inds, dtype=int)
+        df = self.sites.iloc[inds].copy()
+        df['distance_km'] = chord_to_km(np.linalg.norm(self.tree.data[inds] - xyz, axis=1))
+        return df.sort_values(by='distance_km')
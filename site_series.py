@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Compact array-backed time series of one site, for the processing between
+reading a file and writing the daily output
+@author: arifeinberg
+"""
+#%% Import packages
+import numpy as np
+import pandas as pd
+from time_window import to_utc_naive
+#%% Time series class
+# units of numpy datetime64 used for each resampling frequency
+resample_units = {'h': 'h', 'H': 'h', 'D': 'D', 'M': 'M', 'Y': 'Y', 'A': 'Y'}
+
+class SiteSeries:
+    """Time series of one site: int64 times (ns since 1970), one float array per
+    variable, and an optional int8 flag array
+
+    Slicing with a slice (and window) returns views of the arrays, without copies.
+
+    Parameters
+    ----------
+    times : array
+         Times (int64 ns since 1970, or datetime64), sorted
+    data : dict
+         Variable name -> values (same length as times)
+    flags : array
+         Flag of each time, e.g. class codes of qc_flags (None for no flags)
+    """
+    __slots__ = ('times', 'data', 'flags')
+
+    def __init__(self, times, data, flags=None):
+        times = np.asarray(times)
+        if np.issubdtype(times.dtype, np.datetime64):
+            times = times.astype('datetime64[ns]').astype(np.int64)
+        self.times = times
+        self.data = data
+        self.flags = flags
+
+    @classmethod
+    def from_frame(cls, df, time_col=None, columns=None, flag_col=None, dtype=np.float64):
+        """Create series from a DataFrame, keeping only times, numeric data and flags
+
+        Parameters
+        ----------
+        df : DataFrame
+             Data of the site
+        time_col : string
+             Column with times (None to use the index)
+        columns : list
+             Variables to keep (default: all numeric columns)
+        flag_col : string
+             Column with integer flags (None for no flags)
+        dtype : dtype
+             Float type of the values (float32 halves memory)
+        """
+        times = df.index.values if time_col is None else df[time_col].values
+        if columns is None:
+            columns = [c for c in df.select_dtypes('number').columns if c != flag_col]
+        order = None
+        times = np.asarray(times).astype('datetime64[ns]').astype(np.int64)
+        if np.any(times[1:] < times[:-1]): # sort once if needed
+            order = np.argsort(times, kind='stable')
+            times = times[order]
+        data = {}
+        for c in columns:
+            values = df[c].to_numpy(dtype=dtype, na_value=np.nan)
+            data[c] = values if order is None else values[order]
+        flags = None
+        if flag_col is not None:
+            flags = df[flag_col].to_numpy(dtype=np.int8)
+            flags = flags if order is None else flags[order]
+        return cls(times, data, flags)
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, key):
+        """Select times by slice (views), integer or boolean array (copies)"""
+        flags = None if self.flags is None else self.flags[key]
+        return SiteSeries(self.times[key], {c: v[key] for c, v in self.data.items()}, flags)
+
+    def __repr__(self):
+        return 'SiteSeries(n=' + str(len(self)) + ', variables=' + str(list(self.data)) + ')'
+
+    @property
+    def columns(self):
+        return list(self.data)
+
+    def window(self, start=None, end=None):
+        """Return the times in [start, end) as a view
+
+        Parameters
+        ----------
+        start : string or Timestamp
+             Start of time window (None for no start)
+        end : string or Timestamp
+             End of time window, exclusive (None for no end)
+        """
+        start, end = to_utc_naive(start), to_utc_naive(end)
+        i0 = 0 if start is None else np.searchsorted(self.times, start.value, side='left')
+        i1 = len(self) if end is None else np.searchsorted(self.times, end.value, side='left')
+        return self[i0:i1]
+
+    def filter(self, mask):
+        """Return the times where mask is True
+
+        Parameters
+        ----------
+        mask : array
+             Boolean array
+        """
+        return self[np.asarray(mask, dtype=bool)]
+
+    def merge(self, other):
+        """Merge with another series of the site, preferring this series at equal times
+
+        Variables missing in one series are NaN for its times.
+
+        Parameters
+        ----------
+        other : SiteSeries
+             Series to merge
+        """
+        times = np.concatenate([self.times, other.times])
+        # stable sort of two sorted runs, rows of this series first at equal times
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        bool_keep = np.r_[True, times[1:] != times[:-1]]
+        data = {}
+        for c in dict.fromkeys(self.columns + other.columns):
+            v1 = self.data.get(c, np.full(len(self), np.nan))
+            v2 = other.data.get(c, np.full(len(other), np.nan))
+            data[c] = np.concatenate([v1, v2])[order][bool_keep]
+        flags = None
+        if (self.flags is not None) and (other.flags is not None):
+            flags = np.concatenate([self.flags, other.flags])[order][bool_keep]
+        return SiteSeries(times[bool_keep], data, flags)
+
+    def resample(self, freq='D', dropna='any'):
+        """Mean of each variable in each time bin, ignoring NaN
+
+        Parameters
+        ----------
+        freq : string
+             Bin size: 'h', 'D', 'M' or 'Y'
+        dropna : string
+             Drop bins with 'any' or 'all' variables missing (None to keep)
+        """
+        if len(self) == 0:
+            return SiteSeries(self.times, {c: v for c, v in self.data.items()})
+        bins = self.times.astype('datetime64[ns]').astype('datetime64[' + resample_units[freq] + ']')
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        times = bins[starts].astype('datetime64[ns]').astype(np.int64)
+        data = {}
+        for c, v in self.data.items():
+            bool_valid = ~np.isnan(v)
+            sums = np.add.reduceat(np.where(bool_valid, v, 0.), starts)
+            counts = np.add.reduceat(bool_valid.astype(int), starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                data[c] = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan).astype(v.dtype)
+        series = SiteSeries(times, data)
+        if (dropna is not None) and len(data) > 0:
+            bool_nan = np.column_stack([np.isnan(v) for v in data.values()])
+            bool_nan = bool_nan.any(axis=1) if dropna == 'any' else bool_nan.all(axis=1)
+            series = series[~bool_nan]
+        return series
+
+    def to_frame(self, time_name='time'):
+        """Convert to a DataFrame with a datetime index
+
+        Parameters
+        ----------
+        time_name : string
+             Name of the index
+        """
+        index = pd.DatetimeIndex(self.times.astype('datetime64[ns]'), name=time_name)
+        df = pd.DataFrame(self.data, index=index, copy=False)
+        if self.flags is not None:
+            df['flag'] = self.flags
+        return df
+
+    def write(self, fo, time_name='time'):
+        """Write to a csv file, as the outputted daily files
+
+        Parameters
+        ----------
+        fo : string
+             Output file name
+        time_name : string
+             Name of the time column
+        """
+        self.to_frame(time_name).to_csv(fo)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Screen hourly data for spikes with rolling median/MAD and rate-of-change
+tests, before taking daily averages
+@author: arifeinberg
+"""
+#%% Import packages
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+#%% Functions used for screening
+def rolling_median_mad(values, window=25, min_periods=7, chunk=100000):
+    """Centred rolling median and median absolute deviation (MAD) of a series
+
+    Windows are strided views of the NaN-padded series, computed in chunks of
+    rows to limit memory. Windows with fewer than min_periods values are NaN.
+
+    Parameters
+    ----------
+    values : array
+         Values, sorted by time
+    window : int
+         Number of points in window (odd)
+    min_periods : int
+         Minimum number of valid values in window
+    chunk : int
+         Number of windows computed at once
+    """
+    values = np.asarray(values, dtype=float)
+    half = window // 2
+    padded = np.pad(values, half, constant_values=np.nan)
+    med = np.full(len(values), np.nan)
+    mad = np.full(len(values), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) # all-NaN windows
+        for i0 in range(0, len(values), chunk):
+            i1 = min(i0 + chunk, len(values))
+            win = sliding_window_view(padded[i0:i1 + 2 * half], 2 * half + 1)
+            med[i0:i1] = np.nanmedian(win, axis=1)
+            mad[i0:i1] = np.nanmedian(np.abs(win - med[i0:i1, None]), axis=1)
+
+    # number of valid values in each window, from cumulative sum
+    n_valid = np.cumsum(np.r_[0, ~np.isnan(padded)])
+    n_valid = n_valid[2 * half + 1:] - n_valid[:-(2 * half + 1)]
+    bool_few = n_valid < min_periods
+    med[bool_few] = np.nan
+    mad[bool_few] = np.nan
+    return med, mad
+
+def screen_spikes(times, values, window=25, n_mad=5., max_rate=None, min_periods=7):
+    """Return boolean array of points flagged as spikes
+
+    A point is flagged if it is more than n_mad scaled MADs from the rolling
+    median, or (if max_rate given) if it rises and falls back faster than
+    max_rate per hour compared to both neighbours.
+
+    Parameters
+    ----------
+    times : array
+         Times (datetime64), sorted
+    values : array
+         Values, without NaN
+    window : int
+         Number of points in rolling window (odd)
+    n_mad : float
+         Threshold in scaled MADs (1.4826 * MAD, standard deviation for normal data)
+    max_rate : float
+         Maximum rate of change (units per hour), None to skip this test
+    min_periods : int
+         Minimum number of values in window for the MAD test
+    """
+    values = np.asarray(values, dtype=float)
+    med, mad = rolling_median_mad(values, window, min_periods)
+    with np.errstate(invalid='ignore'):
+        spikes = (mad > 0) & (np.abs(values - med) > n_mad * 1.4826 * mad)
+
+    if (max_rate is not None) and (len(values) > 2):
+        t_h = np.asarray(times, dtype='datetime64[ns]').astype('int64') / 3.6e12 # hours
+        rate = np.diff(values) / np.maximum(np.diff(t_h), 1e-6)
+        rate_prev = np.r_[0., rate] # change from previous point
+        rate_next = np.r_[rate, 0.] # change to next point
+        spikes |= ((np.abs(rate_prev) > max_rate) & (np.abs(rate_next) > max_rate)
+                   & (np.sign(rate_prev) != np.sign(rate_next)))
+    return spikes
+
+def screen_frame(df, value_col, time_col=None, screen=None):
+    """Remove spikes of a column from the data, return data and number of spikes
+
+    Parameters
+    ----------
+    df : DataFrame
+         Hourly data, sorted by time
+    value_col : string
+         Column to screen
+    time_col : string
+         Column with times (None to use the index)
+    screen : dict
+         Arguments of screen_spikes (e.g. {'window': 25, 'n_mad': 5.}), None for no screening
+    """
+    if (screen is None) or df.empty:
+        return df, 0
+    times = df.index.values if time_col is None else df[time_col].values
+    bool_valid = df[value_col].notna().values
+    spikes = np.zeros(len(df), dtype=bool)
+    spikes[bool_valid] = screen_spikes(times[bool_valid], df[value_col].values[bool_valid],
+                                       **screen)
+    return df[~spikes], int(spikes.sum())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Read data files that grow by appended rows (e.g. current-year files) by only
+parsing the bytes appended since the last run, with the byte offset, last
+record and a hash of the header region of each file kept in a state file
+@author: arifeinberg
+"""
+#%% Import packages
+import hashlib
+import io
+import json
+import os
+import pandas as pd
+from compressed_io import is_compressed, read_csv_any
+#%% Functions used for tail ingestion
+def find_data_start(fh, skiprows):
+    """Byte offset of the first data line, after skiprows lines and the header line
+
+    Parameters
+    ----------
+    fh : file
+         File opened in binary mode
+    skiprows : int
+         Number of lines before the header line
+    """
+    fh.seek(0)
+    for _ in range(skiprows + 1):
+        fh.readline()
+    return fh.tell()
+
+def parse_bytes(data, **kw):
+    """Parse CSV data (bytes) with pd.read_csv"""
+    return pd.read_csv(io.BytesIO(data), **kw)
+
+def read_csv_tail(f, dn_cache, skiprows=0, names=None, **kw):
+    """Same as pd.read_csv(f, skiprows=skiprows, header=0, names=names, **kw), parsing only appended bytes
+
+    Rows parsed so far are kept in a pickle (named after the file and a hash
+    of its full path) next to a state file with the byte offset after the
+    last complete line, the last record and the hash of the header region. If the header region, the last record or the
+    options changed (or the file shrank), the file is parsed again fully.
+    An incomplete last line (file being written) is left for the next run.
+
+    Parameters
+    ----------
+    f : string
+         Filename
+    dn_cache : string
+         Directory for state and rows of parsed files
+    skiprows : int
+         Number of lines before the header line
+    names : list
+         Column names (None to use the header line)
+    kw : dict
+         Other options of pd.read_csv (e.g. sep, encoding)
+    """
+    # keyed by the full path, files of the same name in other directories have their own state
+    path_hash = hashlib.sha256(os.path.abspath(f).encode('utf-8')).hexdigest()[:16]
+    fn_cache = os.path.join(dn_cache, os.path.basename(f) + '.' + path_hash + '.tail')
+    fn_state = fn_cache + '.json'
+    fn_rows = fn_cache + '.pkl'
+    options = json.dumps({'skiprows': skiprows, 'names': names, 'kw': kw}, default=str)
+
+    with open(f, 'rb') as fh:
+        data_start = find_data_start(fh, skiprows)
+        fh.seek(0)
+        header_hash = hashlib.sha256(fh.read(data_start)).hexdigest()
+        size = os.path.getsize(f)
+
+        # check whether the rows parsed so far are still the start of the file
+        state = None
+        if os.path.exists(fn_state) and os.path.exists(fn_rows):
+            with open(fn_state, 'r') as fs:
+                state = json.load(fs)
+            last_record = state['last_record'].encode('latin-1')
+            bool_same = (state['options'] == options) and (state['header_hash'] == header_hash) \
+                and (data_start <= state['offset'] <= size)
+            if bool_same:
+                fh.seek(state['offset'] - len(last_record))
+                bool_same = fh.read(len(last_record)) == last_record
+            if not bool_same:
+                print('File changed, parsing fully: ' + f)
+                state = None
+
+        if state is not None: # parse only appended complete lines
+            fh.seek(state['offset'])
+            new = fh.read()
+            end = new.rfind(b'\n') + 1
+            df = pd.read_pickle(fn_rows)
+            if end == 0: # nothing appended
+                return df
+            offset = state['offset'] + end
+            last_record = new[new.rfind(b'\n', 0, end - 1) + 1:end]
+            df_new = parse_bytes(new[:end], header=None,
+                                 names=names if names is not None else list(df.columns), **kw)
+            df = pd.concat([df, df_new], ignore_index=isinstance(df.index, pd.RangeIndex))
+        else: # parse complete lines of the whole file
+            fh.seek(0)
+            data = fh.read()
+            offset = data.rfind(b'\n') + 1
+            if offset <= data_start: # no complete data line yet
+                offset = len(data)
+            df = parse_bytes(data[:offset], skiprows=skiprows, header=0, names=names, **kw)
+            last_record = data[data.rfind(b'\n', 0, offset - 1) + 1:offset]
+
+    df.to_pickle(fn_rows)
+    with open(fn_state, 'w') as fs:
+        json.dump({'options': options, 'header_hash': header_hash, 'offset': offset,
+                   'last_record': last_record.decode('latin-1')}, fs)
+    return df
+
+def read_csv_maybe_tail(f, dn_cache=None, **kw):
+    """Read a data file, with tail ingestion if a cache directory is given
+
+    Parameters
+    ----------
+    f : string
+         Filename
+    dn_cache : string
+         Directory for state and rows of parsed files (None to parse fully,
+         compressed files are always parsed fully)
+    kw : dict
+         Options of pd.read_csv (skiprows, header=0, names, ...)
+    """
+    if (dn_cache is None) or is_compressed(f):
+        return read_csv_any(f, **kw)
+    os.makedirs(dn_cache, exist_ok=True)
+    kw.pop('header', None) # header line is after skiprows
+    return read_csv_tail(f, dn_cache, **kw)
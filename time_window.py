@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Select data within a time window, skipping files outside the window from
+their names (or catalog entries) before they are read
+@author: arifeinberg
+"""
+#%% Import packages
+import os
+import re
+import numpy as np
+import pandas as pd
+#%% Functions used for time windows
+# margin around file years, since local time files can spill into next/previous year
+margin = pd.Timedelta(days=1)
+
+def get_file_years(fn):
+    """Return (first, last) year covered by a file from its name (None if unknown)
+
+    Parameters
+    ----------
+    fn : string
+         Filename
+    """
+    base = os.path.basename(fn)
+    # EBAS files: STATION.YYYYMMDDhhmmss.*, only start of file is known
+    match = re.search(r'\.((?:19|20)\d{2})\d{10}\.', base)
+    if match is not None:
+        return int(match.group(1)), None
+    # other files: year (or years, e.g. 2008-2010) in filename
+    years = [int(y) for y in re.findall(r'(?<!\d)((?:19|20)\d{2})(?!\d)', base)]
+    if len(years) == 0:
+        return None, None
+    return min(years), max(years)
+
+def dates_in_window(date_first, date_last, start, end):
+    """Check whether the period covered by a file overlaps with the time window
+
+    Parameters
+    ----------
+    date_first : Timestamp
+         First time covered by file (None if unknown)
+    date_last : Timestamp
+         Last time covered by file (None if unknown)
+    start : string or Timestamp
+         Start of time window (None for no start)
+    end : string or Timestamp
+         End of time window, exclusive (None for no end)
+    """
+    if (end is not None) and (date_first is not None) and \
+       (date_first - margin >= to_utc_naive(end)):
+        return False
+    if (start is not None) and (date_last is not None) and \
+       (date_last + margin < to_utc_naive(start)):
+        return False
+    return True
+
+def file_in_window(fn, start, end, entry=None):
+    """Check from its name (or catalog entry) whether a file can have data in the window
+
+    Parameters
+    ----------
+    fn : string
+         Filename
+    start : string or Timestamp
+         Start of time window (None for no start)
+    end : string or Timestamp
+         End of time window, exclusive (None for no end)
+    entry : Series
+         Catalog entry of the file with start_date and end_date (optional)
+    """
+    if (start is None) and (end is None): # no time window
+        return True
+    if entry is not None: # dates from catalog
+        date_first = to_utc_naive(entry['start_date'])
+        date_last = to_utc_naive(entry['end_date'])
+    else: # years from filename
+        year_first, year_last = get_file_years(fn)
+        date_first = None if year_first is None else pd.Timestamp(year_first, 1, 1)
+        date_last = None if year_last is None else pd.Timestamp(year_last + 1, 1, 1)
+    return dates_in_window(date_first, date_last, start, end)
+
+def to_utc_naive(time):
+    """Convert a time to a timezone-naive Timestamp in UTC (None and NaT give None)
+
+    Parameters
+    ----------
+    time : string or Timestamp
+         Time to convert
+    """
+    if time is None:
+        return None
+    time = pd.Timestamp(time)
+    if time is pd.NaT:
+        return None
+    if time.tzinfo is not None:
+        time = time.tz_convert('UTC').tz_localize(None)
+    return time
+
+def select_window(time, start, end):
+    """Return boolean array for times within the window [start, end)
+
+    Parameters
+    ----------
+    time : array
+         Times of the data
+    start : string or Timestamp
+         Start of time window (None for no start)
+    end : string or Timestamp
+         End of time window, exclusive (None for no end)
+    """
+    time = pd.DatetimeIndex(time)
+    if time.tz is not None:
+        time = time.tz_convert('UTC').tz_localize(None)
+    bool_win = np.ones(len(time), dtype=bool)
+    if start is not None:
+        bool_win &= time >= to_utc_naive(start)
+    if end is not None:
+        bool_win &= time < to_utc_naive(end)
+    return bool_win
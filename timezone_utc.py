@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Convert local measurement times to UTC, so that daily means are consistent
+between networks
+@author: arifeinberg
+"""
+#%% Import packages
+import re
+import numpy as np
+import pandas as pd
+#%% Functions used for time zone conversion
+# offsets from UTC (in minutes) of time zone abbreviations used in the datasets
+tz_abbrev_offsets = {'UTC': 0, 'GMT': 0, 'Z': 0,
+                     'NST': -210, 'NDT': -150,
+                     'AST': -240, 'ADT': -180,
+                     'EST': -300, 'EDT': -240,
+                     'CST': -360, 'CDT': -300,
+                     'MST': -420, 'MDT': -360,
+                     'PST': -480, 'PDT': -420,
+                     'AKST': -540, 'YST': -540, 'AKDT': -480,
+                     'HST': -600}
+
+# numeric offsets, e.g. 'UTC-5', 'GMT-05:00', 'LST-0500', '-5', '-5.0'
+tz_num_pattern = re.compile(r'^[A-Z]*\s*([+-]?)\s*(\d{1,2})(?:[:.]?(\d{1,2}))?\s*H?$')
+
+def parse_tz_offset(code):
+    """Return the offset from UTC in minutes for a time zone code (NaN if unknown)
+
+    Parameters
+    ----------
+    code : string or float
+         Time zone code, as abbreviation or as offset in hours
+    """
+    if isinstance(code, (int, float, np.integer, np.floating)):
+        if code != code: # NaN, no time zone given
+            return np.nan
+        return float(code) * 60.
+
+    code_s = str(code).strip().upper()
+    if code_s in tz_abbrev_offsets:
+        return float(tz_abbrev_offsets[code_s])
+
+    match = tz_num_pattern.match(code_s)
+    if match is None: # not a format we know
+        return np.nan
+    sign = -1. if match.group(1) == '-' else 1.
+    hours = float(match.group(2))
+    if match.group(3) is None:
+        minutes = 0.
+    elif '.' in code_s: # decimal hours, e.g. -3.5
+        minutes = float('0.' + match.group(3)) * 60.
+    else:
+        minutes = float(match.group(3))
+    return sign * (hours * 60. + minutes)
+
+def combine_columns(df, cols):
+    """Parse datetimes from one or several (date, time) string columns
+
+    Parameters
+    ----------
+    df : DataFrame
+         Data containing the columns
+    cols : list
+         Column names, joined with a space before parsing
+    """
+    str_time = df[cols[0]].astype(str)
+    for col in cols[1:]:
+        str_time = str_time + ' ' + df[col].astype(str)
+    # repeated timestamps are only parsed once (cache)
+    return pd.to_datetime(str_time, cache=True).values.astype('datetime64[ns]')
+
+def local_to_utc(time_local, tz_codes):
+    """Convert local times to UTC, with one lookup for all time zone codes
+
+    The distinct time zone codes are parsed once, and the offsets are then
+    applied to all rows as a single array operation. Rows with an unknown
+    or missing time zone are set to NaT (not kept in local time, which would
+    mix local and UTC days in the daily means).
+
+    Parameters
+    ----------
+    time_local : array
+         Local times (datetime64)
+    tz_codes : array
+         Time zone code of each row
+    """
+    # integer code for each distinct time zone (-1 for missing)
+    codes, uniques = pd.factorize(np.asarray(tz_codes))
+    offsets = np.array([parse_tz_offset(u) for u in uniques] + [np.nan])
+    offset_rows = offsets[codes] # index -1 picks the NaN at the end
+
+    bool_unknown = np.isnan(offset_rows)
+    if bool_unknown.any():
+        print('Unknown time zone for %d rows, set to NaT: ' % bool_unknown.sum()
+              + str([u for u in uniques if np.isnan(parse_tz_offset(u))]))
+        offset_rows = np.where(bool_unknown, 0., offset_rows)
+
+    delta = (offset_rows * 60.).astype('int64').astype('timedelta64[s]')
+    time_utc = np.asarray(time_local, dtype='datetime64[ns]') - delta
+    time_utc[bool_unknown] = np.datetime64('NaT')
+    return time_utc
+
+def get_time_utc(df, utc_cols, local_cols, tz_col):
+    """Return measurement times in UTC for a dataset
+
+    UTC columns are used for all rows where they are available, the other
+    rows are converted from local time using the time zone column. Rows
+    without a known time zone are NaT, and should be dropped (and counted)
+    by the loader.
+
+    Parameters
+    ----------
+    df : DataFrame
+         Data of the site
+    utc_cols : list
+         Column names of the UTC (date, time)
+    local_cols : list
+         Column names of the local (date, time)
+    tz_col : string
+         Column name of the time zone code
+    """
+    time_utc = np.full(len(df), np.datetime64('NaT'), dtype='datetime64[ns]')
+
+    # rows where UTC is given in the file
+    if (len(utc_cols) > 0) and all(c in df.columns for c in utc_cols):
+        bool_utc = df[utc_cols].notna().all(axis=1).values
+    else:
+        bool_utc = np.zeros(len(df), dtype=bool)
+    if bool_utc.any():
+        time_utc[bool_utc] = combine_columns(df[bool_utc], utc_cols)
+
+    # remaining rows from local time
+    bool_local = ~bool_utc
+    if bool_local.any():
+        if (tz_col in df.columns) and all(c in df.columns for c in local_cols):
+            time_local = combine_columns(df[bool_local], local_cols)
+            time_utc[bool_local] = local_to_utc(time_local, df[tz_col].values[bool_local])
+        else: # time_utc stays NaT
+            print('No local time or time zone column, %d rows without UTC time set to NaT'
+                  % bool_local.sum())
+
+    return pd.Series(time_utc, index=df.index)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Long-term trends of the site series: deseasonalised Mann-Kendall test (with
+ties and autocorrelation correction) and Sen slopes, with O(n log n) pair
+counting instead of computing all n^2 pairs
+@author: arifeinberg
+"""
+#%% Import packages
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import stats
+from export_panel import find_site_files
+from site_reconciliation import load_gem_series
+#%% Functions used for trends
+def count_pairs(x):
+    """Count pairs i < j with x[i] < x[j] (n_up) and x[i] > x[j] (n_down)
+
+    Bottom-up merge sort: at each level, elements of each right block are
+    located in the sorted left block with one searchsorted for all blocks.
+
+    Parameters
+    ----------
+    x : array
+         Values in time order
+    """
+    n = len(x)
+    ranks = np.unique(x, return_inverse=True)[1].astype(np.int64).ravel()
+    K = int(ranks.max()) + 1 if n > 0 else 1
+    pos = np.arange(n)
+    vals = ranks # values sorted within blocks of width w
+    n_up, n_down = 0, 0
+    w = 1
+    while w < n:
+        block = pos // w
+        bool_right = (block % 2) == 1
+        pair = block // 2
+        keys = pair * K + vals # sorted: by pair, then within block
+        keys_left = keys[~bool_right]
+        keys_right = keys[bool_right]
+        left_start = pair[bool_right] * w # all left blocks before are full
+        n_less = np.searchsorted(keys_left, keys_right, side='left') - left_start
+        n_less_eq = np.searchsorted(keys_left, keys_right, side='right') - left_start
+        n_up += int(n_less.sum())
+        n_down += int((w - n_less_eq).sum())
+        vals = np.sort(keys) % K # merge blocks of each pair
+        w *= 2
+    return n_up, n_down
+
+def tie_sizes(x):
+    """Return sizes of groups of tied values"""
+    counts = np.unique(x, return_counts=True)[1]
+    return counts[counts > 1]
+
+def autocorr_fft(x, max_lag):
+    """Autocorrelation of a series for lags 1..max_lag, using FFT
+
+    Parameters
+    ----------
+    x : array
+         Values
+    max_lag : int
+         Largest lag
+    """
+    x = np.asarray(x, dtype=float) - np.mean(x)
+    n = len(x)
+    n_fft = 1 << int(np.ceil(np.log2(2 * n)))
+    f = np.fft.rfft(x, n_fft)
+    acov = np.fft.irfft(f * np.conj(f), n_fft)[:max_lag + 1]
+    if acov[0] == 0.:
+        return np.zeros(max_lag)
+    return acov[1:] / acov[0]
+
+def mann_kendall(t, x, autocorr=True, max_lag=None, alpha_acf=0.05, slope=None):
+    """Mann-Kendall trend test, with ties and autocorrelation correction
+
+    The variance is corrected for ties, and (if autocorr) for serial
+    correlation with the effective sample size of Hamed and Rao (1998),
+    from the significant autocorrelations of the ranks of the detrended series.
+
+    Parameters
+    ----------
+    t : array
+         Times (float, e.g. years), increasing
+    x : array
+         Values
+    autocorr : bool
+         Correct the variance for autocorrelation
+    max_lag : int
+         Largest lag of autocorrelation used (default: all)
+    alpha_acf : float
+         Significance level for autocorrelations to be used
+    slope : float
+         Sen slope for detrending (computed if not given)
+    """
+    n = len(x)
+    n_up, n_down = count_pairs(x)
+    S = n_up - n_down
+    ties = tie_sizes(x)
+    var_S = (n * (n - 1) * (2 * n + 5) - np.sum(ties * (ties - 1) * (2 * ties + 5))) / 18.
+
+    ratio = 1.
+    if autocorr and n > 3:
+        if slope is None:
+            slope, _ = sen_slope(t, x)
+        resid = x - slope * t
+        max_lag = n - 1 if max_lag is None else min(max_lag, n - 1)
+        rho = autocorr_fft(stats.rankdata(resid), max_lag)
+        rho[np.abs(rho) <= stats.norm.ppf(1 - alpha_acf / 2) / np.sqrt(n)] = 0. # only significant
+        k = np.arange(1, max_lag + 1)
+        ratio = 1 + 2. / (n * (n - 1) * (n - 2)) * np.sum((n - k) * (n - k - 1) * (n - k - 2) * rho)
+        ratio = max(ratio, 1e-6)
+    var_S = var_S * ratio
+
+    if S > 0:
+        z = (S - 1) / np.sqrt(var_S)
+    elif S < 0:
+        z = (S + 1) / np.sqrt(var_S)
+    else:
+        z = 0.
+    p = 2 * stats.norm.sf(abs(z))
+    return {'S': S, 'var_S': var_S, 'z': z, 'p': p, 'n_eff_ratio': 1. / ratio}
+
+def count_slopes_le(t, x, b):
+    """Count pairs i < j with slope (x[j] - x[i]) / (t[j] - t[i]) <= b"""
+    n_up, _ = count_pairs(x - b * t)
+    n = len(x)
+    return n * (n - 1) // 2 - n_up
+
+def kth_slope(t, x, k, lo, hi):
+    """k-th smallest pairwise slope (0-based) in (lo, hi], by bisection on the slope
+
+    Bisection continues until lo and hi are adjacent floats.
+    """
+    while True:
+        mid = 0.5 * (lo + hi)
+        if (mid <= lo) or (mid >= hi):
+            return hi
+        if count_slopes_le(t, x, mid) >= k + 1:
+            hi = mid
+        else:
+            lo = mid
+
+def slope_bracket(t, x, k, n_sample=20000, seed=0):
+    """Bracket (lo, hi] of the k-th pairwise slope, from a random sample of pairs
+
+    Falls back to the range of all slopes if the sample bracket misses.
+    """
+    n = len(x)
+    n_pairs = n * (n - 1) // 2
+    # all slopes are within range of values / shortest time step
+    bound = (x.max() - x.min()) / np.min(np.diff(t)) + 1e-12
+    rng = np.random.default_rng(seed)
+    i, j = rng.integers(0, n, n_sample), rng.integers(0, n, n_sample)
+    i, j = np.minimum(i, j)[i != j], np.maximum(i, j)[i != j]
+    if len(i) == 0:
+        return -bound, bound
+    slopes = (x[j] - x[i]) / (t[j] - t[i])
+    q = (k + 0.5) / n_pairs
+    dq = 5. / np.sqrt(len(slopes)) # wide enough to almost always contain the k-th slope
+    lo, hi = np.quantile(slopes, [max(q - dq, 0.), min(q + dq, 1.)])
+    lo = np.nextafter(lo, -np.inf)
+    if (count_slopes_le(t, x, lo) >= k + 1) or (count_slopes_le(t, x, hi) < k + 1):
+        return -bound, bound
+    return lo, hi
+
+def sen_slope(t, x):
+    """Sen slope (median of pairwise slopes) and intercept, in O(n log n) per step
+
+    The median is found by bisection on the slope, where the number of
+    slopes below a value b is the number of discordant pairs of x - b*t.
+    A random sample of pairs gives the starting bracket.
+
+    Parameters
+    ----------
+    t : array
+         Times (float, e.g. years), strictly increasing
+    x : array
+         Values
+    """
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    if n < 2:
+        return np.nan, np.nan
+    n_pairs = n * (n - 1) // 2
+    k = n_pairs // 2
+    slope = kth_slope(t, x, k, *slope_bracket(t, x, k))
+    if n_pairs % 2 == 0: # even number of slopes, mean of two middle ones
+        slope = 0.5 * (slope + kth_slope(t, x, k - 1, *slope_bracket(t, x, k - 1)))
+    intercept = np.median(x - slope * t)
+    return slope, intercept
+
+def deseasonalise(series):
+    """Subtract the mean of each calendar month from a series
+
+    Parameters
+    ----------
+    series : Series
+         Values with datetime index
+    """
+    month = pd.DatetimeIndex(series.index).month
+    return series - series.groupby(month).transform('mean')
+
+def get_trend(series, deseason=True, autocorr=True, max_lag=None):
+    """Mann-Kendall test and Sen slope (units per year) of one series
+
+    Parameters
+    ----------
+    series : Series
+         Values with datetime index
+    deseason : bool
+         Remove the mean seasonal cycle first
+    autocorr : bool
+         Correct the Mann-Kendall variance for autocorrelation
+    max_lag : int
+         Largest lag of autocorrelation used (default: all)
+    """
+    series = series.dropna().sort_index()
+    series = series[~series.index.duplicated()]
+    if len(series) < 10:
+        return {'n': len(series)}
+    if deseason:
+        series = deseasonalise(series)
+    t = (pd.DatetimeIndex(series.index) - pd.Timestamp('2000-01-01')).total_seconds().values \
+        / (365.25 * 86400.) # years since 2000
+    x = series.values.astype(float)
+    result = {'n': len(x), 'start': series.index[0], 'end': series.index[-1]}
+    slope, intercept = sen_slope(t, x)
+    result.update(mann_kendall(t, x, autocorr, max_lag, slope=slope))
+    result['sen_slope'], result['intercept_2000'] = slope, intercept
+    return result
+
+def trends_all(series_dict, n_workers=None, deseason=True, autocorr=True, max_lag=None):
+    """Trends of all sites, in parallel processes
+
+    Parameters
+    ----------
+    series_dict : dict
+         Site -> Series with datetime index
+    n_workers : int
+         Number of processes (default: number of CPUs)
+    deseason : bool
+         Remove the mean seasonal cycle first
+    autocorr : bool
+         Correct the Mann-Kendall variance for autocorrelation
+    max_lag : int
+         Largest lag of autocorrelation used (default: all)
+    """
+    sites = list(series_dict)
+    n = len(sites)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        results = list(executor.map(get_trend, [series_dict[s] for s in sites],
+                                    [deseason] * n, [autocorr] * n, [max_lag] * n))
+    return pd.DataFrame(results, index=pd.Index(sites, name='site'))
+
+#%% Compute trends of all outputted sites
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Trends of the outputted site series')
+    parser.add_argument('--do', default='../misc_Data/') # directory of outputted files, change to your path
+    parser.add_argument('--fo', default='../misc_Data/trends_TGM.csv')
+    parser.add_argument('--res', default='d')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-lag', type=int, default=None)
+    args = parser.parse_args()
+
+    site_files = find_site_files(args.do, args.res)
+    series_dict = {site: load_gem_series(fn) for site, fn in site_files.items()}
+    df_trend = trends_all(series_dict, args.workers, max_lag=args.max_lag)
+    df_trend.to_csv(args.fo)
+    print(df_trend[['n', 'sen_slope', 'p']])
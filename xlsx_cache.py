@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+Read columns of Excel workbooks with a streaming reader, and cache the result
+in a binary file that is reused until the workbook changes
+@author: arifeinberg
+"""
+#%% Import packages
+import hashlib
+import json
+import os
+import pandas as pd
+#%% Functions used for reading workbooks
+def hash_file(fn):
+    """Return the sha256 hash of a file
+
+    Parameters
+    ----------
+    fn : string
+         Filename
+    """
+    sha = hashlib.sha256()
+    with open(fn, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def read_xlsx_columns(fn, columns, sheet=None):
+    """Read selected columns of a sheet with the read-only (streaming) reader
+
+    Parameters
+    ----------
+    fn : string
+         File name of workbook
+    columns : list
+         Column names (in first row of sheet) to read
+    sheet : string
+         Sheet name (default: first sheet)
+    """
+    from openpyxl import load_workbook # only needed when cache is out of date
+
+    wb = load_workbook(fn, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet is not None else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = list(next(rows))
+        missing = [c for c in columns if c not in header]
+        if len(missing) > 0:
+            raise KeyError('Columns not found in ' + fn + ': ' + str(missing))
+        inds = [header.index(c) for c in columns]
+
+        data = {c: [] for c in columns}
+        for row in rows:
+            if all((i >= len(row)) or (row[i] is None) for i in inds): # skip empty rows
+                continue
+            for c, i in zip(columns, inds):
+                data[c].append(row[i] if i < len(row) else None)
+    finally:
+        wb.close()
+    return pd.DataFrame(data, columns=columns)
+
+def write_cache(df, fn_cache):
+    """Write DataFrame to parquet, or to pickle if no parquet engine is installed
+    or the columns can't be converted (e.g. text such as '<DL' in a numeric column)
+
+    Parameters
+    ----------
+    df : DataFrame
+         Data to cache
+    fn_cache : string
+         File name of cache, without extension
+    """
+    errors = (ImportError,) # no pyarrow/fastparquet
+    try:
+        import pyarrow
+        errors += (pyarrow.ArrowException,) # mixed types in a column
+    except ImportError:
+        pass
+    try:
+        df.to_parquet(fn_cache + '.parquet', index=False)
+        return fn_cache + '.parquet'
+    except errors:
+        if os.path.exists(fn_cache + '.parquet'): # remove partly written file
+            os.remove(fn_cache + '.parquet')
+        df.to_pickle(fn_cache + '.pkl')
+        return fn_cache + '.pkl'
+
+def read_cache(fn_cache):
+    """Read a cache file written by write_cache
+
+    Parameters
+    ----------
+    fn_cache : string
+         File name of cache, with extension
+    """
+    if fn_cache.endswith('.parquet'):
+        return pd.read_parquet(fn_cache)
+    return pd.read_pickle(fn_cache)
+
+def read_xlsx_cached(fn, columns, sheet=None, dn_cache=None):
+    """Read columns of a workbook, using the cache if the workbook is unchanged
+
+    Parameters
+    ----------
+    fn : string
+         File name of workbook
+    columns : list
+         Column names (in first row of sheet) to read
+    sheet : string
+         Sheet name (default: first sheet)
+    dn_cache : string
+         Directory for cache files (default: same directory as workbook)
+    """
+    if dn_cache is None:
+        dn_cache = os.path.dirname(fn)
+    fn_cache = os.path.join(dn_cache, os.path.basename(fn) + '.cache')
+    fn_meta = fn_cache + '.json'
+
+    # check whether cache was made from the same workbook and columns
+    wb_hash = hash_file(fn)
+    if os.path.exists(fn_meta):
+        with open(fn_meta, 'r') as f:
+            meta = json.load(f)
+        if (meta['hash'] == wb_hash) and (meta['columns'] == list(columns)) and \
+           (meta['sheet'] == sheet) and os.path.exists(meta['cache']):
+            return read_cache(meta['cache'])
+
+    print('Reading workbook and updating cache: ' + fn)
+    df = read_xlsx_columns(fn, columns, sheet)
+    fn_data = write_cache(df, fn_cache)
+    with open(fn_meta, 'w') as f:
+        json.dump({'hash': wb_hash, 'columns': list(columns), 'sheet': sheet,
+                   'cache': fn_data}, f)
+    return df